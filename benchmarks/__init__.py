@@ -0,0 +1,4 @@
+"""Microbenchmarks for the assignment primitives in pinassign.
+
+Run with python -m benchmarks from the repository root.
+"""
@@ -0,0 +1,79 @@
+import argparse
+import json
+import platform
+import sys
+
+from .suite import LIFECYCLE_LIMIT, PRIMITIVES, compare, run_suite
+
+DEFAULT_SIZES = ['10x2', '100x10', '300x40', '2000x100']
+DEFAULT_COMPLETIONS = [0.0, 0.5, 0.9]
+
+
+def parse_size(s):
+    players, sep, machines = s.partition('x')
+    try:
+        return (int(players), int(machines))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Invalid size: {} (expected PLAYERSxMACHINES)'.format(s))
+
+
+def print_result(key, result):
+    print('{:<50} {:>14,.0f} ops/s {:>12,.1f} KiB'.format(
+        key, result['ops_per_sec'] or 0, result['peak_kib']))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    names = [name for name, _ in PRIMITIVES] + ['lifecycle']
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Benchmark the pinassign assignment primitives.')
+    parser.add_argument('-s', '--size', dest='sizes', action='append',
+                        type=parse_size,
+                        help='Tournament size as PLAYERSxMACHINES '
+                             '(repeatable, default: {})'.format(
+                                 ' '.join(DEFAULT_SIZES)))
+    parser.add_argument('-c', '--completion', dest='completions',
+                        action='append', type=float,
+                        help='Fraction of scores registered before timing '
+                             '(repeatable)')
+    parser.add_argument('-b', '--bench', dest='names', action='append',
+                        choices=names, help='Only run these benchmarks')
+    parser.add_argument('-r', '--rounds', type=int, default=3,
+                        help='Timed rounds per benchmark')
+    parser.add_argument('--lifecycle-limit', type=int,
+                        default=LIFECYCLE_LIMIT,
+                        help='Only run the full game lifecycle for sizes '
+                             'with at most this many games (default: '
+                             '{})'.format(LIFECYCLE_LIMIT))
+    parser.add_argument('--save', metavar='FILE',
+                        help='Save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='Compare the results with a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline '
+                             '(default: 0.2)')
+    args = parser.parse_args(argv)
+    sizes = args.sizes or [parse_size(s) for s in DEFAULT_SIZES]
+    completions = args.completions or DEFAULT_COMPLETIONS
+    results = run_suite(sizes, completions, args.rounds, args.names,
+                        args.lifecycle_limit, print_result)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'results': results}, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(baseline, results, args.tolerance)
+        for key, old, new in regressions:
+            print('REGRESSION {}: {:,.0f} -> {:,.0f} ops/s ({:+.0%})'.format(
+                key, old, new, new / old - 1))
+        if regressions:
+            return 1
+        print('No regressions against {}'.format(args.compare))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Load test for the pinassign HTTP service.
+
+Starts a server in a separate process (or uses the one given with
+--connect), creates a number of games and plays them all at once over
+keep-alive connections, one client per game. Every client submits the
+score of its oldest assignment as soon as the previous request has been
+answered, optionally limited to a number of scores per second overall.
+The latency of every score submission is recorded, and the throughput and
+latency percentiles are reported at the end.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from pinassign.montecarlo import DEFAULT_PERCENTILES, percentile
+
+from .tournaments import machine_name, player_name
+
+
+class Client:
+    """Sends JSON requests over one keep-alive HTTP connection."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, method, path, data=None):
+        body = b'' if data is None else json.dumps(data).encode('utf-8')
+        self.writer.write(
+            '{} {} HTTP/1.1\r\nHost: localhost\r\n'
+            'Content-Type: application/json\r\nContent-Length: {}\r\n'
+            '\r\n'.format(method, path, len(body)).encode('latin-1') + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, sep, value = line.decode('latin-1').partition(':')
+            if key.strip().lower() == 'content-length':
+                length = int(value)
+        result = json.loads((await self.reader.readexactly(length)).decode())
+        if status >= 400:
+            raise RuntimeError('{} {} failed with {}: {}'.format(
+                method, path, status, result.get('error')))
+        return result
+
+    def close(self):
+        self.writer.close()
+
+
+class RateLimiter:
+    """Spaces out events so that at most rate of them happen per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = time.perf_counter()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.perf_counter()
+        self.next_time = max(self.next_time + self.interval, now)
+        if self.next_time > now:
+            await asyncio.sleep(self.next_time - now)
+
+
+async def setup_game(client, name, player_count, machine_count, seed):
+    r = random.Random(seed)
+    await client.request('PUT', '/games/{}'.format(name))
+    for i in range(machine_count):
+        await client.request('POST', '/games/{}/machines'.format(name), {
+            'name': machine_name(i), 'expected_time': r.randint(2, 12)})
+    for i in range(player_count):
+        await client.request('POST', '/games/{}/players'.format(name),
+                             {'name': player_name(i)})
+
+
+async def play_game(client, name, limiter, latencies, max_scores):
+    result = await client.request('POST', '/games/{}/start'.format(name))
+    playing = collections.deque(result['assignments'])
+    submitted = 0
+    while playing and (max_scores is None or submitted < max_scores):
+        assignment = playing.popleft()
+        await limiter.wait()
+        start = time.perf_counter()
+        result = await client.request(
+            'POST', '/games/{}/scores'.format(name), assignment)
+        latencies.append(time.perf_counter() - start)
+        submitted += 1
+        playing.extend(result['assignments'])
+
+
+async def run_load(host, port, games, player_count, machine_count, rate,
+                   max_scores):
+    clients = [await Client.connect(host, port) for _ in range(games)]
+    names = ['loadtest-{}'.format(i) for i in range(games)]
+    try:
+        existing = {game['name']
+                    for game in await clients[0].request('GET', '/games')}
+        for name in names:
+            if name in existing:
+                await clients[0].request('DELETE', '/games/{}'.format(name))
+        await asyncio.gather(*[
+            setup_game(client, name, player_count, machine_count, i)
+            for i, (client, name) in enumerate(zip(clients, names))])
+        limiter = RateLimiter(rate)
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            play_game(client, name, limiter, latencies, max_scores)
+            for client, name in zip(clients, names)])
+        elapsed = time.perf_counter() - start
+    finally:
+        for client in clients:
+            client.close()
+    return latencies, elapsed
+
+
+def free_port(host):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def start_server(host):
+    port = free_port(host)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'pinassign.server', '--host', host,
+         '--port', str(port)], stdout=subprocess.PIPE)
+    process.stdout.readline()
+    return process, port
+
+
+def parse_address(s):
+    host, sep, port = s.rpartition(':')
+    try:
+        return (host or '127.0.0.1', int(port))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Invalid address: {} (expected HOST:PORT)'.format(s))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.loadtest',
+        description='Measure the score submission latency of the pinassign '
+                    'HTTP service.')
+    parser.add_argument('--connect', metavar='HOST:PORT', type=parse_address,
+                        help='Use a running server instead of starting one')
+    parser.add_argument('-g', '--games', type=int, default=8,
+                        help='Number of games played at once (default: 8)')
+    parser.add_argument('-p', '--players', type=int, default=100,
+                        help='Players per game (default: 100)')
+    parser.add_argument('-m', '--machines', type=int, default=20,
+                        help='Machines per game (default: 20)')
+    parser.add_argument('--rate', type=float,
+                        help='Scores per second over all games (default: '
+                             'as fast as possible)')
+    parser.add_argument('-n', '--scores', type=int,
+                        help='Scores submitted per game (default: until the '
+                             'game is finished)')
+    args = parser.parse_args(argv)
+    process = None
+    if args.connect is None:
+        process, port = start_server('127.0.0.1')
+        host = '127.0.0.1'
+    else:
+        host, port = args.connect
+    try:
+        latencies, elapsed = asyncio.run(run_load(
+            host, port, args.games, args.players, args.machines, args.rate,
+            args.scores))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    latencies.sort()
+    print('Scores submitted: {}'.format(len(latencies)))
+    print('Throughput: {:.0f} scores/s'.format(len(latencies) / elapsed))
+    for q in DEFAULT_PERCENTILES:
+        print('p{}: {:.2f} ms'.format(q, percentile(latencies, q) * 1000))
+    print('max: {:.2f} ms'.format(latencies[-1] * 1000))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
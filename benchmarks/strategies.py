@@ -0,0 +1,76 @@
+"""Compares the makespan of the assignment strategies.
+
+Simulates random tournaments with a few machines of widely varying
+expected times, and at most two players more than there are machines.
+With many more players than machines, the longest machine sets the
+makespan and every strategy reaches it, so those tournaments do not tell
+the strategies apart. Every game takes the expected time of its machine.
+The mean makespan of every strategy is shown next to the mean lower bound,
+the longest of the total time of all machines and the time the longest
+machine needs for every player.
+"""
+import argparse
+import random
+import sys
+
+from pinassign.core import STRATEGIES, Machine, Player
+from pinassign.simulation import simulate
+
+
+def random_tournaments(count, seed):
+    r = random.Random(seed)
+    tournaments = []
+    for _ in range(count):
+        machine_count = r.randint(3, 10)
+        expected_times = [r.randint(2, 30) for _ in range(machine_count)]
+        tournaments.append((expected_times,
+                            r.randint(2, machine_count + 2)))
+    return tournaments
+
+
+def makespan(expected_times, player_count, strategy, seed):
+    machines = [Machine('M{}'.format(i), t)
+                for i, t in enumerate(expected_times)]
+    players = [Player('P{}'.format(i)) for i in range(player_count)]
+    return simulate(machines, players, random.Random(seed),
+                    strategy=STRATEGIES[strategy]).makespan
+
+
+def lower_bound(expected_times, player_count):
+    return max(sum(expected_times), max(expected_times) * player_count)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.strategies',
+        description='Compare the makespan of the assignment strategies on '
+                    'random tournaments with few players.')
+    parser.add_argument('-n', '--tournaments', type=int, default=80,
+                        help='Number of random tournaments')
+    parser.add_argument('-r', '--runs', type=int, default=20,
+                        help='Simulated runs of every tournament')
+    parser.add_argument('-S', '--strategy', dest='strategies',
+                        action='append', choices=sorted(STRATEGIES),
+                        help='Strategy to compare (repeatable, default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    strategies = args.strategies or sorted(STRATEGIES)
+    tournaments = random_tournaments(args.tournaments, args.seed)
+    means = dict.fromkeys(strategies, 0)
+    for expected_times, player_count in tournaments:
+        for strategy in strategies:
+            means[strategy] += sum(
+                makespan(expected_times, player_count, strategy, seed)
+                for seed in range(args.runs)) / args.runs / len(tournaments)
+    bound = sum(lower_bound(*t) for t in tournaments) / len(tournaments)
+    print('{} tournaments of 3 to 10 machines, {} runs each'.format(
+        len(tournaments), args.runs))
+    print('Lower bound: {:.1f}'.format(bound))
+    for strategy in strategies:
+        print('{}: mean makespan {:.1f} ({:+.1%} over the lower bound)'.format(
+            strategy, means[strategy], means[strategy] / bound - 1))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""Multithreaded stress test for pinassign.threadsafe.ThreadSafeGame.
+
+Plays a whole tournament with several scorekeeper threads sharing one game.
+Each of them takes the next game being played from a shared queue,
+registers its score and puts the assignments it gets back on the queue.
+Some of the time a scorekeeper instead takes an idle player out of the
+rotation and brings them back, as a station fixing a ready state would, and
+then asks for new assignments. Reader threads keep checking the published
+views at the same time.
+
+Afterwards the numbered change feed of the game is replayed to check that
+no machine or player was ever given two games at once and that nobody was
+assigned a title twice. With --unsafe, a plain Game is used instead, to
+show what the lock prevents.
+"""
+import argparse
+import queue
+import random
+import sys
+import threading
+import time
+
+from pinassign.game import Game, GameError
+from pinassign.threadsafe import ThreadSafeGame
+
+from .tournaments import machine_name, player_name
+
+
+class Counters:
+    """Counts shared by the threads, behind a lock of their own."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {'scores': 0, 'toggles': 0, 'reads': 0, 'errors': 0,
+                       'inconsistent views': 0}
+        self.messages = []
+
+    def add(self, key, n=1, message=None):
+        with self._lock:
+            self.values[key] += n
+            if message is not None and len(self.messages) < 10:
+                self.messages.append(message)
+
+
+def new_game(cls, player_count, machine_count, seed, quota=None):
+    r = random.Random(seed)
+    # The feed must hold every change for the audit at the end.
+    game = cls(random.Random(seed),
+               feed_size=4 * player_count * machine_count + 1024,
+               quota=quota)
+    game.add_machines([(machine_name(i), r.randint(2, 12))
+                       for i in range(machine_count)])
+    game.add_players([player_name(i) for i in range(player_count)])
+    return game
+
+
+def scorekeeper(game, games, counters, total, toggle_rate, seed, stop):
+    r = random.Random(seed)
+    while not stop.is_set() and counters.values['scores'] < total:
+        try:
+            m, p = games.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        try:
+            if r.random() < toggle_rate:
+                toggle_idle_player(game, games, counters, r)
+            for assigned in game.add_score(m, p):
+                games.put((assigned[0].name, assigned[1].name))
+            counters.add('scores')
+        except (GameError, RuntimeError, KeyError, ValueError) as e:
+            counters.add('errors', message='{} on {}: {!r}'.format(p, m, e))
+
+
+def toggle_idle_player(game, games, counters, r):
+    if isinstance(game, ThreadSafeGame):
+        idle = [p.name for p in game.view().players.values() if p.ready]
+    else:
+        idle = [p.name for p in game.players if p.ready]
+    if not idle:
+        return
+    name = r.choice(idle)
+    try:
+        game.set_player_ready(name, False)
+    except GameError:
+        # Assigned by another scorekeeper in the meantime.
+        return
+    game.set_player_ready(name, True)
+    for m, p in game.assign():
+        games.put((m.name, p.name))
+    counters.add('toggles')
+
+
+def reader(game, counters, stop):
+    while not stop.is_set():
+        view = game.view()
+        players = set(view.assignments.values())
+        problems = []
+        if len(players) != len(view.assignments):
+            problems.append('a player on two machines')
+        for m, p in view.assignments.items():
+            if view.machines[m].ready or view.players[p].ready:
+                problems.append('{} on {} is marked ready'.format(p, m))
+        if problems:
+            counters.add('inconsistent views', message='view {}: {}'.format(
+                view.seq, ', '.join(problems)))
+        counters.add('reads')
+
+
+def audit(game):
+    """Replays the change feed, returning the double assignments found."""
+    titles = {m.name: m.title for m in game.machines}
+    machines = {}
+    players = {}
+    held = set()
+    played = set()
+    problems = []
+    for change in game.feed.since(0) or []:
+        if change.op == 'assignment':
+            m, p = change.args
+            if m in machines:
+                problems.append('{} given {} while playing {}'.format(
+                    m, p, machines[m]))
+            if p in players or p in held:
+                problems.append('{} given {} while busy'.format(p, m))
+            if (titles[m], p) in played:
+                problems.append('{} given {} twice'.format(p, titles[m]))
+            machines[m] = p
+            players[p] = m
+            played.add((titles[m], p))
+        elif change.op == 'add_score':
+            m, p = change.args
+            if machines.get(m) == p:
+                del machines[m]
+            if players.get(p) == m:
+                del players[p]
+        elif change.op == 'set_player_ready':
+            p, ready = change.args
+            if ready:
+                held.discard(p)
+            else:
+                held.add(p)
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.stress',
+        description='Check a game shared by several threads for double '
+                    'assignments and measure its throughput.')
+    parser.add_argument('-t', '--threads', type=int, default=8,
+                        help='Number of scorekeeper threads')
+    parser.add_argument('-r', '--readers', type=int, default=2,
+                        help='Number of threads reading views')
+    parser.add_argument('-p', '--players', type=int, default=300,
+                        help='Players in the tournament')
+    parser.add_argument('-m', '--machines', type=int, default=40,
+                        help='Machines in the tournament')
+    parser.add_argument('-k', '--quota', type=int, metavar='K',
+                        help='Every player only plays K of the machines')
+    parser.add_argument('--toggle-rate', type=float, default=0.05,
+                        help='Fraction of scores preceded by taking an idle '
+                             'player out and back in')
+    parser.add_argument('--switch-interval', type=float, default=1e-5,
+                        help='Thread switch interval in seconds; small '
+                             'values interleave the threads more often')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='Give up after this many seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--unsafe', action='store_true',
+                        help='Use a plain Game without the lock')
+    args = parser.parse_args(argv)
+
+    cls = Game if args.unsafe else ThreadSafeGame
+    game = new_game(cls, args.players, args.machines, args.seed, args.quota)
+    total = args.players * min(args.quota or args.machines, args.machines)
+    games = queue.Queue()
+    for m, p in game.start():
+        games.put((m.name, p.name))
+    counters = Counters()
+    stop = threading.Event()
+    threads = [threading.Thread(
+        target=scorekeeper,
+        args=(game, games, counters, total, args.toggle_rate,
+              args.seed + i, stop))
+        for i in range(args.threads)]
+    if not args.unsafe:
+        threads += [threading.Thread(target=reader,
+                                     args=(game, counters, stop))
+                    for _ in range(args.readers)]
+    sys.setswitchinterval(args.switch_interval)
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    deadline = start + args.timeout
+    while counters.values['scores'] < total and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    problems = audit(game)
+    values = counters.values
+    print('{} with {} scorekeepers and {} readers, {}x{}'.format(
+        cls.__name__, args.threads, 0 if args.unsafe else args.readers,
+        args.players, args.machines))
+    print('Scores: {} of {} in {:.2f}s ({:,.0f}/s)'.format(
+        values['scores'], total, elapsed, values['scores'] / elapsed))
+    print('Ready toggles: {}'.format(values['toggles']))
+    if not args.unsafe:
+        print('View reads: {} ({:,.0f}/s)'.format(
+            values['reads'], values['reads'] / elapsed))
+    print('Errors: {}'.format(values['errors']))
+    print('Inconsistent views: {}'.format(values['inconsistent views']))
+    print('Double assignments: {}'.format(len(problems)))
+    for message in counters.messages + problems[:10]:
+        print('  ' + message)
+    ok = (values['scores'] == total and not values['errors'] and
+          not values['inconsistent views'] and not problems)
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
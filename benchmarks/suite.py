@@ -0,0 +1,173 @@
+import copy
+import gc
+import random
+import time
+import tracemalloc
+
+from pinassign import core
+
+from .tournaments import new_game, run_to_completion, synthetic_tournament
+
+LOOKUPS = 10000
+LIFECYCLE_LIMIT = 20000
+
+
+def prepare_state(player_count, machine_count, completion, seed=0):
+    return synthetic_tournament(player_count, machine_count, completion, seed)
+
+
+def bench_has_played_machine(state):
+    game, _ = state
+    r = random.Random(0)
+    machines = game.machines
+    players = game.players
+    pairs = [(r.choice(machines), r.choice(players)) for _ in range(LOOKUPS)]
+    scores = game.scores
+
+    def run():
+        for m, p in pairs:
+            core.has_played_machine(m, p, scores)
+        return len(pairs)
+    return run
+
+
+def bench_filter_available_players(state):
+    game, _ = state
+
+    def run():
+        for m in game.machines:
+            list(core.filter_available_players(
+                m, game.players, game.scores, game._queue))
+        return len(game.machines)
+    return run
+
+
+def bench_register_score(state):
+    game, pending = copy.deepcopy(state)
+
+    def run():
+        for _, m, p in pending:
+            core.register_score(
+                game._get_machine(m), game._get_player(p), game.scores,
+                game._queue)
+        return len(pending)
+    return run
+
+
+def bench_add_score(state):
+    game, pending = copy.deepcopy(state)
+
+    def run():
+        for _, m, p in pending:
+            list(game.add_score(m, p))
+        return len(pending)
+    return run
+
+
+def bench_forecast(state):
+    game, _ = state
+
+    def run():
+        game.forecast()
+        return 1
+    return run
+
+
+def bench_lifecycle(player_count, machine_count):
+    def prepare():
+        return new_game(player_count, machine_count)
+
+    def bench(game):
+        def run():
+            run_to_completion(game)
+            return len(game.scores)
+        return run
+    return prepare, bench
+
+
+PRIMITIVES = [
+    ('has_played_machine', bench_has_played_machine),
+    ('filter_available_players', bench_filter_available_players),
+    ('register_score', bench_register_score),
+    ('Game.add_score', bench_add_score),
+    ('Game.forecast', bench_forecast),
+]
+
+
+def measure(prepare, bench, rounds):
+    """Times a benchmark and measures its peak memory.
+
+    The benchmark is prepared anew for every round, and only the run itself
+    is timed. Peak memory is measured by tracemalloc in a separate round so
+    that tracing does not slow down the timed ones.
+    """
+    ops = 0
+    elapsed = 0.0
+    for _ in range(rounds):
+        run = bench(prepare())
+        gc.collect()
+        start = time.perf_counter()
+        ops += run()
+        elapsed += time.perf_counter() - start
+    run = bench(prepare())
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'ops': ops,
+        'seconds': elapsed,
+        'ops_per_sec': ops / elapsed if elapsed else None,
+        'peak_kib': peak / 1024,
+    }
+
+
+def result_key(name, player_count, machine_count, completion=None):
+    if completion is None:
+        return '{}[{}x{}]'.format(name, player_count, machine_count)
+    return '{}[{}x{}@{:.0%}]'.format(
+        name, player_count, machine_count, completion)
+
+
+def run_suite(sizes, completions, rounds=3, names=None,
+              lifecycle_limit=LIFECYCLE_LIMIT, report=None):
+    results = {}
+
+    def record(key, result):
+        results[key] = result
+        if report is not None:
+            report(key, result)
+
+    for player_count, machine_count in sizes:
+        for completion in completions:
+            state = prepare_state(player_count, machine_count, completion)
+            for name, bench in PRIMITIVES:
+                if names and name not in names:
+                    continue
+                key = result_key(name, player_count, machine_count, completion)
+                record(key, measure(lambda: state, bench, rounds))
+        games = player_count * machine_count
+        if games <= lifecycle_limit and (not names or 'lifecycle' in names):
+            prepare, bench = bench_lifecycle(player_count, machine_count)
+            key = result_key('lifecycle', player_count, machine_count)
+            record(key, measure(prepare, bench, 1))
+    return results
+
+
+def compare(baseline, results, tolerance):
+    """Returns the benchmarks whose throughput fell below the baseline.
+
+    Each entry is (key, baseline ops/sec, current ops/sec). A benchmark is a
+    regression when it is slower than the baseline by more than the given
+    fraction.
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        old = baseline.get(key)
+        if not old or not old['ops_per_sec'] or not result['ops_per_sec']:
+            continue
+        if result['ops_per_sec'] < old['ops_per_sec'] * (1 - tolerance):
+            regressions.append(
+                (key, old['ops_per_sec'], result['ops_per_sec']))
+    return regressions
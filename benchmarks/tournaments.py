@@ -0,0 +1,53 @@
+import heapq
+import random
+
+from pinassign.game import Game
+
+
+def machine_name(i):
+    return 'M{}'.format(i)
+
+
+def player_name(i):
+    return 'P{}'.format(i)
+
+
+def new_game(player_count, machine_count, seed=0):
+    r = random.Random(seed)
+    game = Game(random.Random(seed))
+    for i in range(machine_count):
+        game.add_machine(machine_name(i), r.randint(2, 12))
+    for i in range(player_count):
+        game.add_player(player_name(i))
+    return game
+
+
+def play(game, pending, time, assignments):
+    for m, p in assignments:
+        heapq.heappush(pending, (time + m.expected_time, m.name, p.name))
+
+
+def synthetic_tournament(player_count, machine_count, completion, seed=0):
+    """Builds a started game where the given fraction of scores is registered.
+
+    Games are played in order of their expected finish times, as they would
+    be at a real event. Returns the game and the pairings that are currently
+    being played, as (finish time, machine name, player name) tuples.
+    """
+    game = new_game(player_count, machine_count, seed)
+    target = int(completion * player_count * machine_count)
+    pending = []
+    play(game, pending, 0, game.start())
+    while pending and len(game.scores) < target:
+        time, m, p = heapq.heappop(pending)
+        play(game, pending, time, game.add_score(m, p))
+    return game, pending
+
+
+def run_to_completion(game):
+    pending = []
+    play(game, pending, 0, game.start())
+    while pending:
+        time, m, p = heapq.heappop(pending)
+        play(game, pending, time, game.add_score(m, p))
+    return game
@@ -0,0 +1,135 @@
+import csv
+import json
+
+from .game import GameError
+
+
+class LoadError(GameError):
+    pass
+
+
+def _read_rows(path, fields, optional=()):
+    """Reads the rows of a JSON or CSV file as lists of the given fields.
+
+    Files ending with .json must hold a list, where every item is either an
+    object with the fields as keys, a list of values in the order of the
+    fields or, if there is only one field, a plain value. Other files are
+    read as CSV, where a first row that holds the field names is skipped.
+
+    The optional fields come after the others and may be left out, in which
+    case they are None.
+    """
+    try:
+        with open(path, newline='') as f:
+            if path.lower().endswith('.json'):
+                return _json_rows(json.load(f), fields, optional)
+            return _csv_rows(csv.reader(f), fields, optional)
+    except (OSError, ValueError) as e:
+        raise LoadError('Cannot read {}: {}'.format(path, e))
+
+
+def _json_rows(data, fields, optional=()):
+    if not isinstance(data, list):
+        raise LoadError('Expected a list')
+    rows = []
+    for idx, item in enumerate(data):
+        if isinstance(item, dict):
+            row = [item.get(field) for field in fields]
+            row += [item.get(field) for field in optional]
+        elif isinstance(item, list):
+            row = item + [None] * (len(fields) + len(optional) - len(item))
+        elif len(fields) == 1:
+            row = [item] + [None] * len(optional)
+        else:
+            row = None
+        if (row is None or len(row) != len(fields) + len(optional) or
+                None in row[:len(fields)]):
+            raise LoadError('Item {} must have the fields {}'.format(
+                idx + 1, ', '.join(fields)))
+        rows.append(row)
+    return rows
+
+
+def _csv_rows(reader, fields, optional=()):
+    names = list(fields) + list(optional)
+    rows = []
+    for idx, row in enumerate(reader):
+        row = [value.strip() for value in row]
+        if not any(row):
+            continue
+        if not len(fields) <= len(row) <= len(names):
+            raise LoadError('Line {} must have the fields {}'.format(
+                idx + 1, ', '.join(fields)))
+        if idx == 0 and [value.lower() for value in row] == names[:len(row)]:
+            continue
+        rows.append(row + [None] * (len(names) - len(row)))
+    return rows
+
+
+def load_machines(path):
+    """Returns the machines in a file, in the form add_machines takes.
+
+    Every machine is a (name, expected time) pair, or a (name, expected time,
+    copies) triple if an optional number of copies above 1 is given.
+    """
+    machines = []
+    for name, expected_time, copies in _read_rows(
+            path, ('name', 'expected_time'), ('copies',)):
+        if isinstance(expected_time, str):
+            try:
+                expected_time = int(expected_time)
+            except ValueError:
+                pass
+        if (not isinstance(expected_time, (int, float)) or
+                isinstance(expected_time, bool)):
+            raise LoadError(
+                'Invalid expected time for {}: {} (must be a number)'.format(
+                    name, expected_time))
+        if copies in (None, ''):
+            copies = 1
+        elif isinstance(copies, str) and copies.isdigit():
+            copies = int(copies)
+        if (not isinstance(copies, int) or isinstance(copies, bool) or
+                copies < 1):
+            raise LoadError(
+                'Invalid number of copies for {}: {} (must be a positive '
+                'integer)'.format(name, copies))
+        if copies == 1:
+            machines.append((name, expected_time))
+        else:
+            machines.append((name, expected_time, copies))
+    return machines
+
+
+def load_players(path):
+    """Returns the names of the players in a file."""
+    return [name for name, in _read_rows(path, ('name',))]
+
+
+def load_scores(path):
+    """Returns the (machine name, player name) pairs of the scores in a file.
+
+    Scores are given as player and machine, in the same order as for the
+    addscore command.
+    """
+    return [(machine, player)
+            for player, machine in _read_rows(path, ('player', 'machine'))]
+
+
+def load_durations(path):
+    """Returns the recorded play times in a file, as lists keyed by machine.
+
+    Every row gives a machine name and how long one game on it took.
+    """
+    durations = {}
+    for machine, duration in _read_rows(path, ('machine', 'duration')):
+        try:
+            duration = float(duration)
+        except (TypeError, ValueError):
+            raise LoadError('Invalid duration for {}: {}'.format(
+                machine, duration))
+        if duration <= 0:
+            raise LoadError('Invalid duration for {}: {}'.format(
+                machine, duration))
+        durations.setdefault(machine, []).append(duration)
+    return durations
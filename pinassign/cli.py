@@ -1,8 +1,11 @@
+import argparse
 import cmd
-from distutils.util import strtobool
-
-import tabulate
+import io
+import sys
+import time
 
+from . import bulk, instrumentation, journal
+from .estimation import TimeEstimator
 from .game import *
 
 INTRO = """Welcome to the PinAssign command line interface.
@@ -38,11 +41,17 @@ You may now add or remove machines. You will have to use the start command again
 
 class PinAssignCmd(cmd.Cmd):
 
-    def __init__(self):
+    def __init__(self, journal_path=None, adaptive=False,
+                 player_speeds=False):
         super().__init__()
         self.prompt = 'Command (? for help): '
         self.intro = INTRO
-        self.game = Game()
+        self.journal_path = journal_path
+        self.adaptive = adaptive or player_speeds
+        self.player_speeds = player_speeds
+        self.auto_confirm = False
+        self.show_tables = True
+        self.game = self._open_game()
 
     def do_machines(self, s):
         """Display a list of machines. This command may be used at any time."""
@@ -53,9 +62,10 @@ class PinAssignCmd(cmd.Cmd):
         else:
             print('Machines:')
             sorted_machines = sorted(machines, key=lambda m: m.name)
-            table = [['Name', 'Ready', 'Expected Time']] + \
-                [[m.name, m.ready, m.expected_time] for m in sorted_machines]
-            print(tabulate.tabulate(table))
+            table = [['Name', 'Title', 'Ready', 'Expected Time']] + \
+                [[m.name, m.title, m.ready, m.expected_time]
+                 for m in sorted_machines]
+            self._print_table(table)
 
     def do_players(self, s):
         """Display a list of players. This command may be used at any time."""
@@ -68,7 +78,7 @@ class PinAssignCmd(cmd.Cmd):
             table = [['Name', 'Ready', 'Expected Time Spent']] + \
                 [[p.name, p.ready, p.expected_time_spent]
                     for p in sorted_players]
-            print(tabulate.tabulate(table))
+            self._print_table(table)
 
     def do_scores(self, s):
         """Display a list of scores.
@@ -83,16 +93,23 @@ This command may be used at any time, but will never give any results if the gam
                 scores, key=lambda s: (s.machine.name, s.player.name))
             table = [['Machine', 'Player']] + \
                 [[s.machine.name, s.player.name] for s in sorted_scores]
-            print(tabulate.tabulate(table))
+            self._print_table(table)
 
     def do_addmachine(self, s):
-        """Adds a machine to the game. Syntax: addmachine MACHINENAME EXPECTEDTIME.
+        """Adds a machine to the game. Syntax: addmachine MACHINENAME EXPECTEDTIME [xCOPIES].
 
 The MACHINENAME may contain any symbols. The EXPECTEDTIME must be an integer greater than zero.
 
+With xCOPIES, for instance x2, a bank of that many copies of the same game is added. The copies are named after the MACHINENAME with a number, as in "Medieval Madness #2". Any copy can serve a player who has not played the game, and nobody plays it twice. Scores may be given for any copy, or for the MACHINENAME itself.
+
 Each machine name must be unique.
 
 Machines may not be added after the game has been started with the start command."""
+        copies = 1
+        parts = s.rsplit(' ', 1)
+        if len(parts) == 2 and parts[1][:1] == 'x' and parts[1][1:].isdigit():
+            copies = int(parts[1][1:])
+            s = parts[0]
         last_space_idx = s.rfind(' ')
         if last_space_idx == -1:
             print('Invalid addmachine syntax. Example: "addmachine Medieval Madness 5"')
@@ -105,14 +122,15 @@ Machines may not be added after the game has been started with the start command
             print('Invalid expected time: {} (must be integer)'.format(value))
             return
         try:
-            self.game.add_machine(name, expected_time)
+            self.game.add_machine(name, expected_time, copies)
         except MachineError as e:
             print('Invalid addmachine command: {}'.format(e))
         except GameError as e:
             print('Cannot add machine: {}'.format(e))
         else:
-            print('Machine {} added with expected time {}'.format(
-                name, expected_time))
+            print('Machine {} added with expected time {}{}'.format(
+                name, expected_time,
+                ' and {} copies'.format(copies) if copies > 1 else ''))
 
     def do_addplayer(self, s):
         """Adds a player to the game. Syntax: addplayer PLAYERNAME.
@@ -129,6 +147,40 @@ Each player name must be unique."""
         else:
             print('Player {} added'.format(s))
 
+    def do_loadmachines(self, s):
+        """Adds all machines listed in a file. Syntax: loadmachines FILE.
+
+A file ending with .json must hold a list of objects with "name" and "expected_time", and optionally "copies" for a bank of copies of the same game. Any other file is read as CSV with the name, the expected time and optionally the number of copies on each line, optionally with a header line.
+
+Either all the machines are added, or none of them if any is invalid. Machines may not be added after the game has been started with the start command."""
+        try:
+            machines = bulk.load_machines(s)
+            self.game.add_machines(machines)
+        except bulk.LoadError as e:
+            print(e)
+        except MachineError as e:
+            print('Invalid machine in {}: {}'.format(s, e))
+        except GameError as e:
+            print('Cannot add machines: {}'.format(e))
+        else:
+            print('{} machines added'.format(len(machines)))
+
+    def do_loadplayers(self, s):
+        """Adds all players listed in a file. Syntax: loadplayers FILE.
+
+A file ending with .json must hold a list of player names. Any other file is read as CSV with a player name on each line, optionally with a "name" header line.
+
+Either all the players are added, or none of them if any is invalid."""
+        try:
+            names = bulk.load_players(s)
+            self.game.add_players(names)
+        except bulk.LoadError as e:
+            print(e)
+        except PlayerError as e:
+            print('Invalid player in {}: {}'.format(s, e))
+        else:
+            print('{} players added'.format(len(names)))
+
     def do_removemachine(self, s):
         """Removes a machine from the game. Syntax: removemachine MACHINENAME.
 
@@ -193,6 +245,33 @@ If a player has not played the recommended machine, you may need to manually fix
             if self.game.is_finished():
                 print(GAME_FINISHED)
 
+    def do_addscores(self, s):
+        """Registers several scores at once. Syntax: addscores PLAYERNAME MACHINENAME, PLAYERNAME MACHINENAME, ...
+
+Use this to catch up on scores that were not registered as they happened. Either all the scores are registered, or none of them if any is invalid. New assignments are only made once all the scores have been registered.
+
+See also the loadscores command."""
+        pairs = [self._parse_player_and_machine(part.strip())
+                 for part in s.split(',')]
+        if not s or any(not player or not machine
+                        for player, machine in pairs):
+            print('Invalid addscores syntax. Example: addscores MGB Firepower, ABC Taxi')
+            return
+        self._add_scores([(machine, player) for player, machine in pairs])
+
+    def do_loadscores(self, s):
+        """Registers all scores listed in a file. Syntax: loadscores FILE.
+
+A file ending with .json must hold a list of objects with "player" and "machine". Any other file is read as CSV with the player name and the machine name on each line, optionally with a header line.
+
+Either all the scores are registered, or none of them if any is invalid. New assignments are only made once all the scores have been registered."""
+        try:
+            scores = bulk.load_scores(s)
+        except bulk.LoadError as e:
+            print(e)
+        else:
+            self._add_scores(scores)
+
     def do_removescore(self, s):
         """Removes a score for a player/machine. Syntax: removescore PLAYERNAME MACHINENAME.
 
@@ -240,7 +319,10 @@ This will remove all machines, players and scores from the running game.
 
 To reset only the scores, use the resetscores command instead."""
         if self._get_confirmation('Are you sure you want to reset the game?'):
-            self.game = Game()
+            self._close_journal()
+            if self.journal_path is not None:
+                journal.remove(self.journal_path)
+            self.game = self._open_game()
             print(GAME_RESET)
 
     def do_resetscores(self, s):
@@ -334,6 +416,137 @@ You can also use this command if the machine is temporarily out of order."""
         else:
             print('Machine {} has been marked as busy'.format(s))
 
+    def do_strategy(self, s):
+        """Shows or changes the assignment strategy. Syntax: strategy [NAME].
+
+Without a name, the current strategy is shown. The available strategies are:
+
+greedy: Each ready machine in turn gets a random player among the ready players with the lowest expected time spent. This is the default.
+matching: All ready machines are assigned together, giving the longest machines to the players with the most expected work remaining.
+remaining: Each ready machine in turn gets a random player among the ready players with the most expected work remaining on the machines they have not played, breaking ties by the lowest expected time spent. This only differs from greedy with a quota (see the quota command), or after scores have been removed or reset, since otherwise the player with the most work remaining is the one with the lowest expected time spent.
+
+The strategy may be changed at any time. It applies to all assignments made after the change."""
+        if not s:
+            print('The current assignment strategy is {}'.format(
+                self.game.strategy))
+            return
+        try:
+            self.game.set_strategy(s)
+        except GameError as e:
+            print('Cannot change strategy: {}'.format(e))
+        else:
+            print('Assignment strategy changed to {}'.format(s))
+
+    def do_quota(self, s):
+        """Shows or changes how many machines every player plays. Syntax: quota [K|all].
+
+Without an argument, the current quota is shown. With a number K, every player only has to play K machines, and the game is finished when everyone has played that many. Copies of the same title count as one machine. The players are spread evenly over the machines, so every machine gets about the same number of scores. With all, everyone plays every machine again, which is the default.
+
+The quota can only be changed before the game is started."""
+        if not s:
+            if self.game.quota is None:
+                print('Every player plays every machine')
+            else:
+                print('Every player plays {} machines'.format(self.game.quota))
+            return
+        if s == 'all':
+            quota = None
+        else:
+            try:
+                quota = int(s)
+            except ValueError:
+                print('Cannot change quota: {} is not a number'.format(s))
+                return
+        try:
+            self.game.set_quota(quota)
+        except GameError as e:
+            print('Cannot change quota: {}'.format(e))
+        else:
+            if quota is None:
+                print('Every player now plays every machine')
+            else:
+                print('Every player now plays {} machines'.format(quota))
+
+    def do_forecast(self, s):
+        """Forecasts when the game will be finished.
+
+Shows a lower bound on the time left, and a projection made by simulating the rest of the game with the current strategy, assuming every machine takes its expected time. The matching strategy is simulated with the greedy rule, since solving the matching at every step would take too long. The projected time left is also given for each player.
+
+This command may only be used while the game is running."""
+        try:
+            result = self.game.forecast()
+        except GameError as e:
+            print('Cannot forecast: {}'.format(e))
+            return
+        print('Games in progress: {}'.format(result.in_progress))
+        print('Games left to start: {}'.format(result.remaining_games))
+        print('Time left is at least: {:.1f}'.format(result.lower_bound))
+        print('Projected time left: {:.1f}{}'.format(
+            result.makespan, '' if result.exact else ' (estimated)'))
+        table = [['Player', 'Projected Time Left']] + \
+            [[name, '{:.1f}'.format(time) if time else 'finished']
+             for name, time in sorted(result.finish_times.items())]
+        self._print_table(table)
+
+    def do_plan(self, s):
+        """Plans the whole tournament in advance. Syntax: plan [FILE].
+
+Builds a complete timeline for the current machines and players, assuming every machine takes its expected time, and compares its makespan with a lower bound and with the current assignment strategy. If a file is given, the timeline is written to it, as JSON if the name ends with .json and as CSV otherwise.
+
+The scores of a running game are not taken into account."""
+        from . import planner
+        try:
+            result = planner.plan_game(self.game)
+        except GameError as e:
+            print('Cannot plan: {}'.format(e))
+            return
+        planner.print_summary(result)
+        if s:
+            try:
+                planner.export(result, s)
+            except OSError as e:
+                print('Cannot write {}: {}'.format(s, e))
+            else:
+                print('Timeline written to {}'.format(s))
+
+    def do_stats(self, s):
+        """Shows how much time the assignment engine spends. Syntax: stats [on|off|reset].
+
+Without an argument, shows the number of calls, the median (p50) and 99th percentile (p99) latency in microseconds, and the mean and largest number of candidates or assignments per call, for the main functions of the assignment engine and every game command.
+
+Use "stats on" to start measuring (or start the program with --stats), "stats off" to stop, and "stats reset" to clear the statistics. Measuring has a small cost on every command; when it is off it costs nothing."""
+        if s == 'on':
+            instrumentation.enable()
+            print('Statistics are now being gathered')
+            return
+        elif s == 'off':
+            instrumentation.disable()
+            print('Statistics are no longer being gathered')
+            return
+        elif s == 'reset':
+            instrumentation.reset()
+            print('Statistics have been reset')
+            return
+        elif s:
+            print('Invalid stats syntax. Use stats, stats on, stats off or stats reset')
+            return
+        stats = self.game.stats()
+        if not stats:
+            if instrumentation.is_enabled():
+                print('No calls have been measured yet')
+            else:
+                print('No statistics have been gathered. Use "stats on" to start.')
+            return
+        table = [['Function', 'Calls', 'p50 (us)', 'p99 (us)', 'Mean Size',
+                  'Max Size']] + \
+            [[name, stat['calls'], '{:.1f}'.format(stat['p50_us']),
+              '{:.1f}'.format(stat['p99_us']),
+              '' if stat['mean_size'] is None else
+              '{:.1f}'.format(stat['mean_size']),
+              '' if stat['max_size'] is None else stat['max_size']]
+             for name, stat in stats.items()]
+        self._print_table(table)
+
     def do_exit(self, s):
         """Exits the program."""
         return self._get_confirmation('Are you sure you want to exit?')
@@ -342,12 +555,78 @@ You can also use this command if the machine is temporarily out of order."""
         """Exits the program."""
         return self.do_exit(s)
 
+    def run_script(self, lines):
+        """Runs commands from lines of text, without asking for confirmation.
+
+        Blank lines and lines starting with # are skipped, and the script
+        stops early at an exit or quit command. Returns the number of times
+        each command was run and the total time spent on it in seconds, as
+        a dict of [count, seconds] lists.
+        """
+        timings = {}
+        self.auto_confirm = True
+        self.preloop()
+        try:
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                command = line.split(None, 1)[0]
+                start = time.perf_counter()
+                stop = self.onecmd(line)
+                timing = timings.setdefault(command, [0, 0.0])
+                timing[0] += 1
+                timing[1] += time.perf_counter() - start
+                if stop:
+                    break
+        finally:
+            self.postloop()
+        return timings
+
+    def postloop(self):
+        self._close_journal()
+
+    def _open_game(self):
+        estimator = None
+        if self.adaptive:
+            estimator = TimeEstimator(
+                player_alpha=0.2 if self.player_speeds else None)
+        if self.journal_path is None:
+            return Game(estimator=estimator)
+        return journal.open_game(self.journal_path, estimator=estimator)
+
+    def _close_journal(self):
+        if self.game.journal is not None:
+            self.game.journal.close()
+
+    def _add_scores(self, scores):
+        try:
+            new_assignments = self.game.add_scores(scores)
+        except (GameError, InvalidMachineError, InvalidPlayerError) as e:
+            print('Cannot add scores: {}'.format(e))
+        else:
+            print('{} scores added'.format(len(scores)))
+            self._print_assignments(new_assignments)
+            if self.game.is_finished():
+                print(GAME_FINISHED)
+
     def _print_assignments(self, assignments):
         for idx, (machine, player) in enumerate(assignments):
             print('{}. {} should now play {}'.format(
                 idx + 1, player.name, machine.name))
 
+    def _print_table(self, table):
+        if not self.show_tables:
+            print('({} rows not shown)'.format(len(table) - 1))
+            return
+        import tabulate
+        print(tabulate.tabulate(table))
+
     def _get_confirmation(self, msg):
+        if self.auto_confirm:
+            print('{} (y/n): y'.format(msg))
+            return True
+        from distutils.util import strtobool
         return strtobool(input('{} (y/n): '.format(msg)))
 
     def _parse_player_and_machine(self, s):
@@ -359,8 +638,83 @@ You can also use this command if the machine is temporarily out of order."""
         return (player_name, machine_name)
 
 
-def run_cli():
-    PinAssignCmd().cmdloop()
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Assign players to machines in a pinball tournament.')
+    parser.add_argument('--journal', metavar='FILE',
+                        help='Record the game in FILE, and recover the game '
+                             'from it if it already exists')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='Learn the expected time of each machine from '
+                             'how long the games actually take')
+    parser.add_argument('--player-speeds', action='store_true',
+                        help='Also learn how fast each player is, and give '
+                             'slower players machines earlier (implies '
+                             '--adaptive)')
+    parser.add_argument('--stats', action='store_true',
+                        help='Gather call statistics from the start (see '
+                             'the stats command)')
+    parser.add_argument('--script', metavar='FILE',
+                        help='Run the commands in FILE (- for standard '
+                             'input) without asking for confirmation, then '
+                             'exit')
+    parser.add_argument('--tables', action='store_true',
+                        help='Show tables when running a script (they are '
+                             'left out by default)')
+    args = parser.parse_args(argv)
+    if args.stats:
+        instrumentation.enable()
+    try:
+        cli = PinAssignCmd(args.journal, args.adaptive, args.player_speeds)
+    except journal.JournalError as e:
+        parser.exit(1, 'Cannot recover game: {}\n'.format(e))
+    if args.script is not None:
+        return run_script(cli, args.script, args.tables)
+    if args.journal is not None and (cli.game.machines or cli.game.players):
+        cli.intro = 'Recovered game from {} ({} machines, {} players, {} scores)'.format(
+            args.journal, len(cli.game.machines), len(cli.game.players),
+            len(cli.game.scores))
+    cli.cmdloop()
+
+
+def run_script(cli, path, show_tables=False):
+    """Runs a script of commands and prints a timing summary to stderr.
+
+    The output of the commands is buffered and written in large blocks
+    instead of line by line.
+    """
+    if path == '-':
+        script = sys.stdin
+    else:
+        try:
+            script = open(path)
+        except OSError as e:
+            sys.exit('Cannot read script: {}'.format(e))
+    cli.show_tables = show_tables
+    stdout = sys.stdout
+    buffered = hasattr(stdout, 'buffer')
+    if buffered:
+        stdout.flush()
+        sys.stdout = cli.stdout = io.TextIOWrapper(
+            stdout.buffer, encoding=stdout.encoding, line_buffering=False)
+    start = time.perf_counter()
+    try:
+        timings = cli.run_script(script)
+    finally:
+        if script is not sys.stdin:
+            script.close()
+        if buffered:
+            sys.stdout.flush()
+            sys.stdout.detach()
+            sys.stdout = cli.stdout = stdout
+    elapsed = time.perf_counter() - start
+    count = sum(n for n, _ in timings.values())
+    print('Ran {} commands in {:.3f} s ({:.0f} commands/s)'.format(
+        count, elapsed, count / elapsed if elapsed else 0), file=sys.stderr)
+    for command, (n, seconds) in sorted(
+            timings.items(), key=lambda item: -item[1][1]):
+        print('  {:<16} {:>8} calls {:>10.3f} s {:>10.1f} us/call'.format(
+            command, n, seconds, seconds / n * 1e6), file=sys.stderr)
 
 if __name__ == '__main__':
     run_cli()
@@ -1,16 +1,37 @@
+import array
+import bisect
 import itertools as it
 
+from . import matching
+
+# Sums of expected times are rounded to this many decimals. Learned expected
+# times are floats, and adding the same times in another order can give sums
+# that differ in the last bit, which would break ties that should hold.
+TIME_DIGITS = 9
+
 
 class Machine:
+    """A physical machine.
+
+    Machines with the same title are copies of the same game. A player who
+    has played one of them has played them all.
+    """
+
+    __slots__ = ('id', 'name', 'expected_time', 'ready', 'title')
 
-    def __init__(self, name, expected_time):
+    def __init__(self, name, expected_time, id=None, title=None):
+        self.id = id
         self.name = name
         self.expected_time = expected_time
         self.ready = True
+        self.title = name if title is None else title
 
     def __eq__(self, other):
         return other is not None and self.name == other.name
 
+    def __hash__(self):
+        return hash(self.name)
+
     def __str__(self):
         return 'Machine {}'.format(self.name)
 
@@ -18,9 +39,33 @@ class Machine:
         return 'Machine({}, {})'.format(self.name, self.expected_time)
 
 
+def round_time(t):
+    """Rounds a sum of expected times to TIME_DIGITS decimals."""
+    return round(t, TIME_DIGITS)
+
+
+def copy_name(title, number):
+    """Returns the name of a numbered copy in a bank of machines."""
+    return '{} #{}'.format(title, number)
+
+
+def machine_bank(title, expected_time, copies=1):
+    """Returns the machines of a bank of copies of the same title.
+
+    A single copy is named after the title, and more are numbered.
+    """
+    if copies == 1:
+        return [Machine(title, expected_time)]
+    return [Machine(copy_name(title, n), expected_time, title=title)
+            for n in range(1, copies + 1)]
+
+
 class Player:
 
-    def __init__(self, name):
+    __slots__ = ('id', 'name', 'expected_time_spent', 'ready')
+
+    def __init__(self, name, id=None):
+        self.id = id
         self.name = name
         self.expected_time_spent = 0
         self.ready = True
@@ -28,6 +73,9 @@ class Player:
     def __eq__(self, other):
         return other is not None and self.name == other.name
 
+    def __hash__(self):
+        return hash(self.name)
+
     def __str__(self):
         return 'Player {}'.format(self.name)
 
@@ -37,13 +85,18 @@ class Player:
 
 class Score:
 
+    __slots__ = ('machine', 'player')
+
     def __init__(self, machine, player):
         self.machine = machine
         self.player = player
 
     def __eq__(self, other):
-        return other is not None and
-            self.machine == other.machine and self.player == other.player
+        return (other is not None and
+                self.machine == other.machine and self.player == other.player)
+
+    def __hash__(self):
+        return hash((self.machine, self.player))
 
     def __str__(self):
         return '{} played {}'.format(self.player, self.machine)
@@ -52,6 +105,736 @@ class Score:
         return 'Score({}, {})'.format(repr(self.machine), repr(self.player))
 
 
+class ScoreIndex:
+    """Container for the registered scores of a game.
+
+    The scores are stored as two columns of machine and player ids, and
+    Score objects are only created when iterating. Alongside the columns this
+    keeps a played matrix in the form of one bitset per player, indexed by
+    machine id, and the set of players who still need each machine. The
+    number of players who have played every machine is kept up to date as
+    scores are added and removed, so completion checks never have to look at
+    the scores themselves. So is the expected time every player has left on
+    the machines they have not played.
+
+    Machines and players are identified by their id. Any machine or player
+    that is added without one is given the next free id.
+
+    Copies of the same title share their set of players, and a score on any
+    copy sets the played bit of every copy, so the rest of the engine can
+    treat them as separate machines that can never be played twice.
+
+    With a quota, every player only needs that many titles (or all of them,
+    if there are fewer). The sets of players who still need each machine are
+    then not kept, since nearly every player would be in nearly every one of
+    them. Instead, the number of titles each player has played, the number
+    of scores on each title and the players who still need games are
+    counted. To spread the scores evenly over the titles, a title that has
+    its share of the scores (the games needed divided by the number of
+    titles, rounded up) is only offered to players who could not reach the
+    quota without it.
+    """
+
+    def __init__(self, machines=(), players=(), quota=None):
+        self._machine_column = array.array('I')
+        self._player_column = array.array('I')
+        self._machines = {}
+        self._players = {}
+        self._next_machine_id = 0
+        self._next_player_id = 0
+        self._full_mask = 0
+        self._copies = {}
+        self._played = {}
+        self._unplayed = {}
+        self._active_players = set()
+        self._finished_count = 0
+        self._total_time = 0
+        self._remaining = {}
+        self._quota = quota
+        self._title_bits = 0
+        self._played_titles = {}
+        self._plays = {}
+        self._needing = set()
+        self._target = 0
+        self._cap = 0
+        self._capped = 0
+        self._shortest = 0
+        self._epoch = 0
+        self._allowed_masks = {}
+        for machine in machines:
+            self.add_machine(machine)
+        for player in players:
+            self.add_player(player)
+
+    def __iter__(self):
+        machines = self._machines
+        players = self._players
+        for machine_id, player_id in zip(self._machine_column,
+                                         self._player_column):
+            yield Score(machines[machine_id], players[player_id])
+
+    def __len__(self):
+        return len(self._machine_column)
+
+    def __contains__(self, score):
+        return self.has_played(score.machine, score.player)
+
+    def copy(self, machines, players):
+        """Returns an index with the same played matrix but no score rows.
+
+        The given machines and players take the place of the ones with the
+        same ids, so that a projection can change their state without
+        touching the originals.
+        """
+        index = ScoreIndex()
+        index._machines = {m.id: m for m in machines}
+        index._players = {p.id: p for p in players}
+        index._next_machine_id = self._next_machine_id
+        index._next_player_id = self._next_player_id
+        index._full_mask = self._full_mask
+        index._copies = dict(self._copies)
+        index._played = dict(self._played)
+        copied = {}
+        for machine_id, unplayed in self._unplayed.items():
+            if id(unplayed) not in copied:
+                copied[id(unplayed)] = set(unplayed)
+            index._unplayed[machine_id] = copied[id(unplayed)]
+        index._active_players = set(self._active_players)
+        index._finished_count = self._finished_count
+        index._total_time = self._total_time
+        index._remaining = dict(self._remaining)
+        index._quota = self._quota
+        index._title_bits = self._title_bits
+        index._played_titles = dict(self._played_titles)
+        index._plays = dict(self._plays)
+        index._needing = set(self._needing)
+        index._target = self._target
+        index._cap = self._cap
+        index._capped = self._capped
+        index._shortest = self._shortest
+        index._epoch = self._epoch
+        index._allowed_masks = dict(self._allowed_masks)
+        return index
+
+    @property
+    def quota(self):
+        """The number of titles every player needs, or None for all."""
+        return self._quota
+
+    @property
+    def epoch(self):
+        """A number that changes whenever players may have become eligible
+        for machines without having played, for instance when the share of a
+        title is reached, so that incremental passes know to start over."""
+        return self._epoch
+
+    def set_quota(self, quota):
+        self._quota = quota
+        self._rebuild()
+
+    def add_machine(self, machine):
+        if machine.id is None:
+            machine.id = self._next_machine_id
+        self._next_machine_id = max(self._next_machine_id, machine.id + 1)
+        self._machines[machine.id] = machine
+        bit = 1 << machine.id
+        self._full_mask |= bit
+        copies = self._copies.get(machine.title, 0)
+        self._copies[machine.title] = copies | bit
+        if copies:
+            if self._quota is None:
+                self._unplayed[machine.id] = self._unplayed[
+                    _lowest_id(copies)]
+            for player_id, played in self._played.items():
+                if played & copies:
+                    self._played[player_id] = played | bit
+        else:
+            self._title_bits |= bit
+            self._plays[machine.title] = 0
+            self._total_time = round_time(
+                self._total_time + machine.expected_time)
+            if self._quota is None:
+                self._unplayed[machine.id] = set(self._active_players)
+                for player_id in self._remaining:
+                    self._remaining[player_id] = round_time(
+                        self._remaining[player_id] + machine.expected_time)
+        if self._quota is None:
+            self._recount_finished()
+        else:
+            self._rebuild()
+
+    def remove_machine(self, machine):
+        """Removes a machine along with the scores registered on it.
+
+        If other copies of the title are left, the players whose score was
+        on the removed copy need the title again.
+        """
+        bit = 1 << machine.id
+        self._full_mask &= ~bit
+        copies = self._copies.pop(machine.title) & ~bit
+        unplayed = self._unplayed.pop(machine.id, set())
+        del self._machines[machine.id]
+        self._title_bits &= ~bit
+        if copies:
+            self._copies[machine.title] = copies
+            self._title_bits |= copies & -copies
+            for player_id, m in zip(self._player_column,
+                                    self._machine_column):
+                if m == machine.id:
+                    self._played[player_id] &= ~copies
+                    self._plays[machine.title] -= 1
+                    if self._quota is not None:
+                        continue
+                    if player_id in self._active_players:
+                        unplayed.add(player_id)
+                    if player_id in self._remaining:
+                        self._remaining[player_id] = round_time(
+                            self._remaining[player_id] + machine.expected_time)
+        else:
+            del self._plays[machine.title]
+            self._total_time = round_time(
+                self._total_time - machine.expected_time)
+            for player_id in self._remaining:
+                if not self._played.get(player_id, 0) & bit:
+                    self._remaining[player_id] = round_time(
+                        self._remaining[player_id] - machine.expected_time)
+        for player_id in self._played:
+            self._played[player_id] &= ~bit
+        rows = [row for row in zip(self._machine_column, self._player_column)
+                if row[0] != machine.id]
+        self._machine_column = array.array('I', (m for m, _ in rows))
+        self._player_column = array.array('I', (p for _, p in rows))
+        if self._quota is None:
+            self._recount_finished()
+        else:
+            self._rebuild()
+
+    def add_player(self, player):
+        if player.id is None:
+            player.id = self._next_player_id
+        self._next_player_id = max(self._next_player_id, player.id + 1)
+        self._players[player.id] = player
+        self._active_players.add(player.id)
+        played = self._played.get(player.id, 0)
+        if self._quota is None:
+            remaining = 0
+            for copies in self._copies.values():
+                machine_id = _lowest_id(copies)
+                if not played >> machine_id & 1:
+                    self._unplayed[machine_id].add(player.id)
+                    remaining += self._machines[machine_id].expected_time
+            self._remaining[player.id] = round_time(remaining)
+        else:
+            titles = self._count_titles(played)
+            self._played_titles[player.id] = titles
+            self._allowed_masks.pop(player.id, None)
+            if titles < self._target:
+                self._needing.add(player.id)
+            self._update_cap()
+        if self._is_player_finished(player.id):
+            self._finished_count += 1
+
+    def remove_player(self, player):
+        if self._is_player_finished(player.id):
+            self._finished_count -= 1
+        self._active_players.discard(player.id)
+        if self._quota is None:
+            for unplayed in self._unplayed.values():
+                unplayed.discard(player.id)
+        else:
+            self._needing.discard(player.id)
+            self._allowed_masks.pop(player.id, None)
+            self._update_cap()
+
+    def has_played(self, machine, player):
+        return bool(self._played.get(player.id, 0) >> machine.id & 1)
+
+    def needs(self, machine, player):
+        """Tells whether the player may be given the machine."""
+        played = self._played.get(player.id, 0)
+        if self._quota is None:
+            return not played >> machine.id & 1
+        if played >> machine.id & 1 or player.id not in self._needing:
+            return False
+        return (not self._capped >> machine.id & 1 or
+                bool(self._allowed(player.id) >> machine.id & 1))
+
+    def eligible(self, machine, players):
+        """Returns the given players who may be given the machine."""
+        bit = 1 << machine.id
+        played = self._played
+        if self._quota is None:
+            return [p for p in players if not played.get(p.id, 0) & bit]
+        if self._capped & bit:
+            return [p for p in players if self._allowed(p.id) & bit]
+        needing = self._needing
+        return [p for p in players
+                if p.id in needing and not played.get(p.id, 0) & bit]
+
+    def needed_mask(self, player):
+        """Returns the bitset of machine ids the player may be given."""
+        if self._quota is None:
+            return self._full_mask & ~self._played.get(player.id, 0)
+        return self._allowed(player.id)
+
+    def needed_games(self, player):
+        """Returns the number of titles the player still has to play."""
+        if self._quota is None:
+            titles = self._count_titles(self._played.get(player.id, 0))
+            return len(self._copies) - titles
+        return max(self._target - self._played_titles.get(player.id, 0), 0)
+
+    def play_count(self, machine):
+        """Returns the number of scores registered on the machine's title."""
+        return self._plays.get(machine.title, 0)
+
+    def remaining_work(self, player):
+        """Returns the expected time of the machines the player has left.
+
+        With a quota, which machines those will be is not known yet, so the
+        shortest expected time is counted for every game left.
+        """
+        if self._quota is not None:
+            return max(self._target - self._played_titles.get(player.id, 0),
+                       0) * self._shortest
+        return self._remaining.get(player.id, 0)
+
+    def set_expected_time(self, machine, expected_time):
+        """Changes the expected time of a machine and all its copies, and the
+        remaining work of the players who have not played it."""
+        change = expected_time - machine.expected_time
+        copies = self._copies.get(machine.title, 1 << machine.id)
+        for m in self._machines.values():
+            if copies >> m.id & 1:
+                m.expected_time = expected_time
+        machine.expected_time = expected_time
+        self._total_time = round_time(self._total_time + change)
+        for player_id in self._remaining:
+            if not self._played.get(player_id, 0) & copies:
+                self._remaining[player_id] = round_time(
+                    self._remaining[player_id] + change)
+        if self._quota is not None:
+            self._update_shortest()
+
+    def played_mask(self, player):
+        """Returns the bitset of machine ids the player has played."""
+        return self._played.get(player.id, 0)
+
+    def unplayed_players(self, machine):
+        """Returns the ids of the players who may be given the machine."""
+        if self._quota is None:
+            return self._unplayed.get(machine.id, ())
+        return set(self._needing_players(machine))
+
+    def is_needed(self, machine):
+        """Tells whether any player may be given the machine."""
+        if self._quota is None:
+            return bool(self._unplayed.get(machine.id))
+        for _ in self._needing_players(machine):
+            return True
+        return False
+
+    def played_players(self, machine):
+        if self._quota is not None:
+            bit = 1 << machine.id
+            return [self._players[player_id]
+                    for player_id in self._active_players
+                    if self._played.get(player_id, 0) & bit]
+        unplayed = self._unplayed.get(machine.id, ())
+        return [self._players[player_id] for player_id in self._active_players
+                if player_id not in unplayed]
+
+    def is_player_finished(self, player):
+        return self._is_player_finished(player.id)
+
+    def is_complete(self):
+        return self._finished_count == len(self._active_players)
+
+    def append(self, score):
+        machine_id, player_id = score.machine.id, score.player.id
+        was_finished = self._is_player_finished(player_id)
+        self._machine_column.append(machine_id)
+        self._player_column.append(player_id)
+        title = score.machine.title
+        copies = self._copies.get(title, 1 << machine_id)
+        self._played[player_id] = self._played.get(player_id, 0) | copies
+        plays = self._plays[title] = self._plays.get(title, 0) + 1
+        if self._quota is not None:
+            titles = self._played_titles.get(player_id, 0) + 1
+            self._played_titles[player_id] = titles
+            self._allowed_masks.pop(player_id, None)
+            if titles >= self._target:
+                self._needing.discard(player_id)
+            if plays >= self._cap and not self._capped & copies:
+                self._capped |= copies
+                self._new_epoch()
+        elif machine_id in self._unplayed:
+            self._unplayed[machine_id].discard(player_id)
+            if player_id in self._remaining:
+                self._remaining[player_id] = round_time(
+                    self._remaining[player_id] - score.machine.expected_time)
+        if not was_finished and self._is_player_finished(player_id):
+            self._finished_count += 1
+
+    def remove(self, score):
+        machine_id, player_id = score.machine.id, score.player.id
+        copies = self._copies.get(score.machine.title, 1 << machine_id)
+        for row, (m, p) in enumerate(zip(self._machine_column,
+                                          self._player_column)):
+            if copies >> m & 1 and p == player_id:
+                break
+        else:
+            raise ValueError('{} is not registered'.format(score))
+        was_finished = self._is_player_finished(player_id)
+        del self._machine_column[row]
+        del self._player_column[row]
+        self._played[player_id] &= ~copies
+        title = score.machine.title
+        self._plays[title] -= 1
+        if self._quota is not None:
+            self._played_titles[player_id] -= 1
+            self._allowed_masks.pop(player_id, None)
+            if player_id in self._active_players and (
+                    self._played_titles[player_id] < self._target):
+                self._needing.add(player_id)
+            if self._plays[title] < self._cap and self._capped & copies:
+                self._capped &= ~copies
+                self._new_epoch()
+        elif (machine_id in self._unplayed and
+                player_id in self._active_players):
+            self._unplayed[machine_id].add(player_id)
+        if machine_id in self._unplayed and player_id in self._remaining:
+            self._remaining[player_id] = round_time(
+                self._remaining[player_id] + score.machine.expected_time)
+        if was_finished and not self._is_player_finished(player_id):
+            self._finished_count -= 1
+
+    def clear(self):
+        del self._machine_column[:]
+        del self._player_column[:]
+        self._played.clear()
+        if self._quota is not None:
+            self._rebuild()
+            return
+        self._plays = dict.fromkeys(self._plays, 0)
+        for unplayed in self._unplayed.values():
+            unplayed.update(self._active_players)
+        for player_id in self._remaining:
+            self._remaining[player_id] = self._total_time
+        self._recount_finished()
+
+    def _is_player_finished(self, player_id):
+        if self._quota is not None:
+            return (player_id in self._active_players and
+                    self._played_titles.get(player_id, 0) >= self._target)
+        played = self._played.get(player_id, 0)
+        return (player_id in self._active_players and
+                (played & self._full_mask) == self._full_mask)
+
+    def _required(self):
+        if self._quota is None:
+            return len(self._copies)
+        return min(self._quota, len(self._copies))
+
+    def _count_titles(self, mask):
+        return bin(mask & self._title_bits).count('1')
+
+    def _new_epoch(self):
+        self._epoch += 1
+        self._allowed_masks.clear()
+
+    def _allowed(self, player_id):
+        mask = self._allowed_masks.get(player_id)
+        if mask is None:
+            mask = self._allowed_masks[player_id] = self._find_allowed(
+                player_id)
+        return mask
+
+    def _find_allowed(self, player_id):
+        if player_id not in self._needing:
+            return 0
+        unplayed = self._full_mask & ~self._played.get(player_id, 0)
+        if not unplayed & self._capped:
+            return unplayed
+        below_share = unplayed & ~self._capped
+        needed = self._target - self._played_titles.get(player_id, 0)
+        if self._count_titles(below_share) >= needed:
+            return below_share
+        return unplayed
+
+    def _needing_players(self, machine):
+        bit = 1 << machine.id
+        played = self._played
+        if not self._capped & bit:
+            return (player_id for player_id in self._needing
+                    if not played.get(player_id, 0) & bit)
+        return (player_id for player_id in self._needing
+                if self._allowed(player_id) & bit)
+
+    def _update_cap(self):
+        titles = len(self._copies)
+        cap = 0
+        if titles:
+            cap = -(-len(self._active_players) * self._target // titles)
+        capped = 0
+        for title, copies in self._copies.items():
+            if self._plays.get(title, 0) >= cap:
+                capped |= copies
+        if cap != self._cap or capped != self._capped:
+            self._cap = cap
+            self._capped = capped
+            self._new_epoch()
+
+    def _update_shortest(self):
+        self._shortest = min(
+            (self._machines[_lowest_id(copies)].expected_time
+             for copies in self._copies.values()), default=0)
+
+    def _rebuild(self):
+        """Works out everything that follows from the played bitsets."""
+        self._title_bits = 0
+        for copies in self._copies.values():
+            self._title_bits |= copies & -copies
+        self._plays = dict.fromkeys(self._copies, 0)
+        for machine_id in self._machine_column:
+            self._plays[self._machines[machine_id].title] += 1
+        if self._quota is None:
+            self._unplayed = {}
+            for copies in self._copies.values():
+                unplayed = {player_id for player_id in self._active_players
+                            if not self._played.get(player_id, 0) & copies}
+                for machine_id in self._machines:
+                    if copies >> machine_id & 1:
+                        self._unplayed[machine_id] = unplayed
+            self._remaining = {
+                player_id: round_time(sum(
+                    self._machines[_lowest_id(copies)].expected_time
+                    for copies in self._copies.values()
+                    if not self._played.get(player_id, 0) & copies))
+                for player_id in self._players}
+            self._played_titles = {}
+            self._needing = set()
+        else:
+            self._unplayed = {}
+            self._remaining = {}
+            self._played_titles = {
+                player_id: self._count_titles(played)
+                for player_id, played in self._played.items()}
+            self._target = self._required()
+            self._needing = {
+                player_id for player_id in self._active_players
+                if self._played_titles.get(player_id, 0) < self._target}
+            self._update_shortest()
+            self._update_cap()
+        self._new_epoch()
+        self._recount_finished()
+
+    def _recount_finished(self):
+        self._finished_count = sum(
+            1 for player_id in self._active_players
+            if self._is_player_finished(player_id))
+
+
+def _lowest_id(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+class PlayerQueue:
+    """Ready players bucketed by expected time spent.
+
+    The buckets are visited in order of increasing expected time spent, so
+    the lowest group of eligible players for a machine can be found without
+    sorting every ready player. When fewer players still need the machine
+    than there are ready players, those players are looked at instead. Players
+    are kept in the order they were added, which makes the tie groups
+    identical to those of a full sort.
+
+    Players are ranked by their expected time spent, or by the given key
+    function.
+
+    Once track_machines has been called, the queue also keeps the ready
+    machines, and remembers the machines and players that have become ready
+    since the last assignment pass. After a pass, no ready machine has a
+    ready player who still needs it, so the next pass only has to look at
+    machines that are dirty themselves or that a dirty player still needs.
+    """
+
+    def __init__(self, players=(), key=None):
+        self._key = key
+        self._buckets = {}
+        self._keys = []
+        self._bucket_of = {}
+        self._order = {}
+        self._next_order = 0
+        self._machines = None
+        self._positions = None
+        self._ready_machines = 0
+        self._dirty_machines = set()
+        self._dirty_players = set()
+        self._epoch = None
+        for player in players:
+            self.add(player)
+
+    @property
+    def tracks_machines(self):
+        return self._machines is not None
+
+    def __len__(self):
+        return len(self._bucket_of)
+
+    def add(self, player):
+        self._order[player.id] = self._next_order
+        self._next_order += 1
+        self.update(player)
+
+    def remove(self, player):
+        self._discard(player)
+        del self._order[player.id]
+
+    def update(self, player):
+        was_ready = self._discard(player)
+        if player.ready:
+            if not was_ready:
+                self._dirty_players.add(player.id)
+            if self._key is None:
+                ets = player.expected_time_spent
+            else:
+                ets = self._key(player)
+            bucket = self._buckets.get(ets)
+            if bucket is None:
+                bucket = self._buckets[ets] = {}
+                bisect.insort(self._keys, ets)
+            bucket[player.id] = player
+            self._bucket_of[player.id] = ets
+
+    def lowest_available(self, machine, scores):
+        # With a quota the players who may be given the machine are not kept,
+        # and working them out takes longer than walking the buckets.
+        unplayed = None
+        if scores.quota is None:
+            unplayed = scores.unplayed_players(machine)
+        if unplayed is not None and len(unplayed) < len(self._bucket_of):
+            group = self._lowest_among(unplayed)
+        else:
+            group = self._lowest_unplayed(machine, scores)
+        group.sort(key=lambda p: self._order[p.id])
+        return group
+
+    def best_available(self, machine, scores, key):
+        """Returns the ready players who still need the machine and have the
+        lowest value of key, in the order they were added."""
+        best = None
+        group = []
+        for player_id in scores.unplayed_players(machine):
+            ets = self._bucket_of.get(player_id)
+            if ets is None:
+                continue
+            player = self._buckets[ets][player_id]
+            value = key(player)
+            if best is None or value < best:
+                best = value
+                group = [player]
+            elif value == best:
+                group.append(player)
+        group.sort(key=lambda p: self._order[p.id])
+        return group
+
+    def _lowest_among(self, player_ids):
+        lowest = None
+        group = []
+        for player_id in player_ids:
+            ets = self._bucket_of.get(player_id)
+            if ets is None or (lowest is not None and ets > lowest):
+                continue
+            if lowest is None or ets < lowest:
+                lowest = ets
+                group = []
+            group.append(self._buckets[ets][player_id])
+        return group
+
+    def _lowest_unplayed(self, machine, scores):
+        for ets in self._keys:
+            group = scores.eligible(machine, self._buckets[ets].values())
+            if group:
+                return group
+        return []
+
+    def track_machines(self, machines):
+        """Starts keeping track of the ready machines.
+
+        Assignment passes visit machines in the order they are given here.
+        Every ready machine starts out dirty, so the next pass is a full one.
+        """
+        self._machines = {m.id: m for m in machines}
+        self._positions = {m.id: idx for idx, m in enumerate(machines)}
+        self._ready_machines = 0
+        self._dirty_machines = set()
+        for m in machines:
+            self.update_machine(m)
+
+    def update_machine(self, machine):
+        bit = 1 << machine.id
+        if not machine.ready:
+            self._ready_machines &= ~bit
+        elif not self._ready_machines & bit:
+            self._ready_machines |= bit
+            self._dirty_machines.add(machine.id)
+
+    def touch_machine(self, machine):
+        """Marks a machine as dirty, for instance after removing a score."""
+        self._dirty_machines.add(machine.id)
+
+    def touch(self, player):
+        """Marks a player as dirty, for instance after removing a score."""
+        self._dirty_players.add(player.id)
+
+    def dirty_machines(self, scores):
+        """Returns the ready machines the next pass has to look at, in order.
+
+        These are the dirty machines that are ready, and the ready machines
+        that some ready dirty player may be given. If the scores say that
+        players may have become eligible for other machines in the meantime,
+        every ready machine is returned.
+        """
+        ready = self._ready_machines
+        if scores.epoch != self._epoch:
+            self._epoch = scores.epoch
+            self._dirty_machines.update(self._machines)
+        candidates = 0
+        for machine_id in self._dirty_machines:
+            candidates |= 1 << machine_id
+        candidates &= ready
+        for player_id in self._dirty_players:
+            ets = self._bucket_of.get(player_id)
+            if ets is not None:
+                player = self._buckets[ets][player_id]
+                candidates |= ready & scores.needed_mask(player)
+        machines = []
+        while candidates:
+            low = candidates & -candidates
+            machine = self._machines.get(low.bit_length() - 1)
+            if machine is not None:
+                machines.append(machine)
+            candidates ^= low
+        machines.sort(key=lambda m: self._positions[m.id])
+        return machines
+
+    def clear_dirty(self):
+        self._dirty_machines.clear()
+        self._dirty_players.clear()
+
+    def _discard(self, player):
+        ets = self._bucket_of.pop(player.id, None)
+        if ets is None:
+            return False
+        bucket = self._buckets[ets]
+        del bucket[player.id]
+        if not bucket:
+            del self._buckets[ets]
+            del self._keys[bisect.bisect_left(self._keys, ets)]
+        return True
+
+
 def pick_player(players, r):
     l = list(players)
     if not l:
@@ -60,19 +843,18 @@ def pick_player(players, r):
 
 
 def has_played_machine(machine, player, scores):
-    return any(s for s in scores if s.machine == machine and
-               s.player == player)
+    return scores.has_played(machine, player)
 
 
 def is_everyone_finished(machines, players, scores):
-    return all(has_played_machine(m, p, scores)
-               for m in machines for p in players)
+    return scores.is_complete()
 
 
-def filter_available_players(machine, players, scores):
+def filter_available_players(machine, players, scores, queue=None):
+    if queue is not None:
+        return queue.lowest_available(machine, scores)
     all_available = (
-        p for p in players if p.ready and not has_played_machine(
-            machine, p, scores))
+        p for p in players if p.ready and scores.needs(machine, p))
     q = sorted(all_available, key=lambda p: p.expected_time_spent)
     if not q:
         return ()
@@ -84,31 +866,189 @@ def filter_available_machines(machines):
     return (m for m in machines if m.ready)
 
 
-def register_score(machine, player, scores):
-    score = Score(machine, player)
-    if score in scores:
-        msg = '{} has already been registered on {}'.format(player, machine)
+def register_score(machine, player, scores, queue=None):
+    if scores.has_played(machine, player):
+        msg = 'Score for {} on {} already exists'.format(
+            player.name, machine.name)
         raise ValueError(msg)
     machine.ready = True
     player.ready = True
-    player.expected_time_spent += machine.expected_time
-    scores.append(score)
+    player.expected_time_spent = round_time(
+        player.expected_time_spent + machine.expected_time)
+    scores.append(Score(machine, player))
+    if queue is not None:
+        queue.update_machine(machine)
+        queue.update(player)
+
 
+def register_scores(pairs, scores, queue=None):
+    """Registers the scores of a batch of (machine, player) pairs.
 
-def assign_player(machine, player):
+    Nothing is registered if any of the pairs already has a score, or if a
+    pair appears twice. Every player is moved in the queue only once, however
+    many of the scores are theirs.
+    """
+    seen = set()
+    for machine, player in pairs:
+        key = (machine.id, player.id)
+        if key in seen or scores.has_played(machine, player):
+            msg = 'Score for {} on {} already exists'.format(
+                player.name, machine.name)
+            raise ValueError(msg)
+        seen.add(key)
+    changed = {}
+    for machine, player in pairs:
+        machine.ready = True
+        player.ready = True
+        player.expected_time_spent = round_time(
+            player.expected_time_spent + machine.expected_time)
+        scores.append(Score(machine, player))
+        changed[player.id] = player
+        if queue is not None:
+            queue.update_machine(machine)
+    if queue is not None:
+        for player in changed.values():
+            queue.update(player)
+
+
+def assign_player(machine, player, queue=None):
     machine.ready = False
     player.ready = False
+    if queue is not None:
+        queue.update_machine(machine)
+        queue.update(player)
 
 
-def assign_players(machines, players, scores, r):
-    for m in filter_available_machines(machines):
-        available_players = filter_available_players(m, players, scores)
+def assign_players(machines, players, scores, r, queue=None):
+    """Gives every ready machine in turn a player, as described in README.
+
+    When the queue keeps track of the machines, only the machines that can
+    have gotten an eligible player since the last pass are visited. The
+    other ready machines would get no player anyway, so the assignments are
+    the same as those of a pass over every machine.
+    """
+    incremental = queue is not None and queue.tracks_machines
+    if incremental:
+        candidates = queue.dirty_machines(scores)
+    else:
+        candidates = filter_available_machines(machines)
+    for m in candidates:
+        available_players = filter_available_players(
+            m, players, scores, queue)
         p = pick_player(available_players, r)
         if p is not None:
-            assign_player(m, p)
+            assign_player(m, p, queue)
             yield (m, p)
+    if incremental:
+        queue.clear_dirty()
+
+
+def remaining_work(player, machines, scores):
+    return scores.remaining_work(player)
+
+
+def filter_remaining_players(machine, players, scores, queue=None):
+    """Returns the ready players who still need the machine and have the
+    most expected work remaining, breaking ties by the lowest expected time
+    spent."""
+    def key(p):
+        return (-scores.remaining_work(p), p.expected_time_spent)
+    if queue is not None:
+        return queue.best_available(machine, scores, key)
+    available = [p for p in players if p.ready and scores.needs(machine, p)]
+    if not available:
+        return ()
+    best = min(key(p) for p in available)
+    return [p for p in available if key(p) == best]
+
+
+def assign_players_remaining(machines, players, scores, r, queue=None):
+    """Gives every ready machine in turn the player with the most work left.
+
+    Works like assign_players, but ranks the eligible players by the
+    expected time of the machines they have not played yet, so players with
+    long machines left are not held up until the end. Expected time spent
+    only breaks ties.
+
+    When every player plays every machine, the work left is the total
+    expected time minus the expected time spent, so the choices are the same
+    as assign_players makes. They differ with a quota, and once scores have
+    been removed or reset.
+    """
+    incremental = queue is not None and queue.tracks_machines
+    if incremental:
+        candidates = queue.dirty_machines(scores)
+    else:
+        candidates = filter_available_machines(machines)
+    for m in candidates:
+        available_players = filter_remaining_players(
+            m, players, scores, queue)
+        p = pick_player(available_players, r)
+        if p is not None:
+            assign_player(m, p, queue)
+            yield (m, p)
+    if incremental:
+        queue.clear_dirty()
+
+
+def matching_cost(machine, player, remaining):
+    return -remaining * machine.expected_time
+
+
+def assign_players_matching(machines, players, scores, r, queue=None,
+                            cost=matching_cost):
+    """Assigns all ready machines at once as a min-cost bipartite matching.
+
+    Instead of giving each ready machine in turn the best player left, every
+    ready machine and every ready player who still needs one of them is
+    considered together. As many machines as possible are assigned, and among
+    those matchings the one with the lowest total cost is chosen. The default
+    cost gives the longest machines to the players with the most expected
+    work remaining, so nobody is left with only long machines at the end.
+    Ready players are shuffled first so that ties are broken at random.
+    """
+    ready_machines = list(filter_available_machines(machines))
+    ready_players = [p for p in players if p.ready and any(
+        scores.needs(m, p) for m in ready_machines)]
+    if not ready_machines or not ready_players:
+        return
+    r.shuffle(ready_players)
+    remaining = {p.id: remaining_work(p, machines, scores)
+                 for p in ready_players}
+    rows = []
+    for m in ready_machines:
+        row = [cost(m, p, remaining[p.id])
+               if scores.needs(m, p) else None
+               for p in ready_players]
+        rows.append(row)
+    finite = [c for row in rows for c in row if c is not None]
+    spread = max(finite) - min(finite) + 1
+    unassigned = max(finite) + spread * len(ready_machines)
+    ineligible = unassigned + spread * len(ready_machines)
+    costs = [[ineligible if c is None else c for c in row] +
+             [unassigned] * len(ready_machines) for row in rows]
+    for m, column in zip(ready_machines,
+                         matching.min_cost_assignment(costs)):
+        if column < len(ready_players):
+            p = ready_players[column]
+            assign_player(m, p, queue)
+            yield (m, p)
+
+
+STRATEGIES = {
+    'greedy': assign_players,
+    'matching': assign_players_matching,
+    'remaining': assign_players_remaining,
+}
+
+
+def player_finished_machine(machine, player, machines, players, scores, r,
+                            queue=None, assign=assign_players):
+    register_score(machine, player, scores, queue)
+    return assign(machines, players, scores, r, queue)
 
 
-def player_finished_machine(machine, player, machines, players, scores, r):
-    register_score(machine, player, scores)
-    return assign_players(machines, players, scores, r)
+def players_finished_machines(pairs, machines, players, scores, r,
+                              queue=None, assign=assign_players):
+    register_scores(pairs, scores, queue)
+    return assign(machines, players, scores, r, queue)
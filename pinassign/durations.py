@@ -0,0 +1,192 @@
+import math
+
+
+class Fixed:
+    """Every game takes exactly the expected time."""
+
+    def __init__(self, mean=None):
+        self.mean = mean
+
+    def sample(self, mean, count, r, rng=None):
+        return [mean if self.mean is None else self.mean] * count
+
+    def __repr__(self):
+        return 'Fixed()'
+
+
+class LogNormal:
+    """Lognormal play times with the given coefficient of variation.
+
+    The mean is the expected time of the machine, unless a mean is given.
+    """
+
+    def __init__(self, cv, mean=None):
+        self.cv = cv
+        self.mean = mean
+
+    def sample(self, mean, count, r, rng=None):
+        mean = mean if self.mean is None else self.mean
+        sigma = math.sqrt(math.log(1 + self.cv ** 2))
+        mu = math.log(mean) - sigma ** 2 / 2
+        if rng is not None:
+            return rng.lognormal(mu, sigma, count).tolist()
+        return [r.lognormvariate(mu, sigma) for _ in range(count)]
+
+    def __repr__(self):
+        return 'LogNormal({})'.format(self.cv)
+
+
+class Gamma:
+    """Gamma distributed play times with the given coefficient of variation.
+
+    The mean is the expected time of the machine, unless a mean is given.
+    """
+
+    def __init__(self, cv, mean=None):
+        self.cv = cv
+        self.mean = mean
+
+    def sample(self, mean, count, r, rng=None):
+        mean = mean if self.mean is None else self.mean
+        shape = 1 / self.cv ** 2
+        scale = mean / shape
+        if rng is not None:
+            return rng.gamma(shape, scale, count).tolist()
+        return [r.gammavariate(shape, scale) for _ in range(count)]
+
+    def __repr__(self):
+        return 'Gamma({})'.format(self.cv)
+
+
+class Empirical:
+    """Play times drawn from recorded durations.
+
+    With relative set, the recorded durations only give the shape of the
+    distribution, and are scaled so that their mean is the expected time of
+    the machine. This lets durations recorded on a few machines stand in for
+    machines without any.
+    """
+
+    def __init__(self, durations, relative=False):
+        if not durations:
+            raise ValueError('There must be at least one recorded duration')
+        self.durations = list(durations)
+        self.relative = relative
+        self.mean = sum(self.durations) / len(self.durations)
+
+    def sample(self, mean, count, r, rng=None):
+        scale = mean / self.mean if self.relative else 1
+        durations = self.durations
+        if rng is not None:
+            import numpy as np
+            idx = rng.integers(0, len(durations), count)
+            return (np.asarray(durations)[idx] * scale).tolist()
+        return [d * scale for d in r.choices(durations, k=count)]
+
+    def __repr__(self):
+        return 'Empirical({} durations{})'.format(
+            len(self.durations), ', relative' if self.relative else '')
+
+
+def _mean_and_cv(durations):
+    if len(durations) < 2:
+        raise ValueError('At least two recorded durations are needed')
+    mean = sum(durations) / len(durations)
+    variance = sum((d - mean) ** 2 for d in durations) / (len(durations) - 1)
+    return mean, math.sqrt(variance) / mean
+
+
+def fit_lognormal(durations):
+    """Returns the lognormal distribution with the mean and variation of the
+    recorded durations, or a fixed time if they are all the same."""
+    mean, cv = _mean_and_cv(durations)
+    return LogNormal(cv, mean) if cv else Fixed(mean)
+
+
+def fit_gamma(durations):
+    """Returns the gamma distribution with the mean and variation of the
+    recorded durations, or a fixed time if they are all the same."""
+    mean, cv = _mean_and_cv(durations)
+    return Gamma(cv, mean) if cv else Fixed(mean)
+
+
+FITS = {
+    'lognormal': fit_lognormal,
+    'gamma': fit_gamma,
+    'empirical': Empirical,
+}
+
+
+class DurationModel:
+    """Describes how long each player takes on each machine.
+
+    Machines use their own distribution from the machines dict, keyed by
+    title, or the default distribution. Every player's times are multiplied
+    by their factor, taken from player_factors or, failing that, drawn once
+    per tournament from a lognormal distribution with mean 1 and the given
+    player_cv. A player_cv of 0 makes every player equally fast.
+    """
+
+    def __init__(self, default=None, machines=None, player_factors=None,
+                 player_cv=0):
+        self.default = Fixed() if default is None else default
+        self.machines = dict(machines or {})
+        self.player_factors = dict(player_factors or {})
+        self.player_cv = player_cv
+
+    def draw(self, machines, players, r):
+        """Draws the play time of every player on every machine up front.
+
+        Every player plays every machine once, so each machine's times are
+        drawn in a single call. With NumPy installed, the draws are made with
+        array operations from a NumPy generator seeded from r. The draws then
+        differ from the ones made without NumPy, so the same seed gives other
+        play times, with the same distribution, depending on whether NumPy is
+        installed. Returns a duration function for simulate().
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            rng = None
+        else:
+            rng = np.random.default_rng(r.getrandbits(64))
+        factors = [1.0] * len(players)
+        if self.player_cv:
+            factors = LogNormal(self.player_cv).sample(
+                1.0, len(players), r, rng)
+        for idx, p in enumerate(players):
+            factors[idx] = self.player_factors.get(p.name, factors[idx])
+        column = {p.name: idx for idx, p in enumerate(players)}
+        table = {}
+        for m in machines:
+            distribution = self.machines.get(m.title, self.default)
+            times = distribution.sample(m.expected_time, len(players), r, rng)
+            table[m.name] = [t * f for t, f in zip(times, factors)]
+
+        def duration(machine, player):
+            return table[machine.name][column[player.name]]
+        return duration
+
+    def __repr__(self):
+        parts = [repr(self.default)]
+        if self.machines:
+            parts.append('{} machines fitted'.format(len(self.machines)))
+        if self.player_cv:
+            parts.append('player cv {}'.format(self.player_cv))
+        return ', '.join(parts)
+
+
+def parse_distribution(s):
+    """Parses fixed, lognormal:CV or gamma:CV."""
+    name, sep, value = s.partition(':')
+    if name == 'fixed' and not sep:
+        return Fixed()
+    constructors = {'lognormal': LogNormal, 'gamma': Gamma}
+    if name not in constructors or not sep:
+        raise ValueError(
+            'Invalid distribution: {} (expected fixed, lognormal:CV or '
+            'gamma:CV)'.format(s))
+    cv = float(value)
+    if cv <= 0:
+        raise ValueError('The coefficient of variation must be positive')
+    return constructors[name](cv)
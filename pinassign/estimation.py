@@ -0,0 +1,81 @@
+class Ewma:
+    """Exponentially weighted moving average of a stream of values."""
+
+    __slots__ = ('value', 'alpha', 'count')
+
+    def __init__(self, value, alpha, count=0):
+        self.value = value
+        self.alpha = alpha
+        self.count = count
+
+    def update(self, x):
+        self.value += self.alpha * (x - self.value)
+        self.count += 1
+        return self.value
+
+
+class TimeEstimator:
+    """Learns the expected time of machines from observed play durations.
+
+    Each title has a moving average that starts at the expected time given
+    when the machine was added, and that is shared by all copies of the
+    title. When player_alpha is given, every player also gets a speed
+    factor, the moving average of how long they take compared to the current
+    estimate for the machine. Observed durations are divided by the player's
+    factor before they update the machine, so slow and fast players do not
+    skew the machine estimates. Every observation costs O(1).
+    """
+
+    def __init__(self, alpha=0.2, player_alpha=None):
+        self.alpha = alpha
+        self.player_alpha = player_alpha
+        self._titles = {}
+        self._players = {}
+
+    @property
+    def learns_player_speeds(self):
+        return self.player_alpha is not None
+
+    def machine_time(self, machine):
+        estimate = self._titles.get(machine.title)
+        return machine.expected_time if estimate is None else estimate.value
+
+    def player_factor(self, player):
+        estimate = self._players.get(player.id)
+        return 1.0 if estimate is None else estimate.value
+
+    def observe(self, machine, player, duration):
+        """Adds an observed duration and returns the new machine estimate."""
+        estimate = self._titles.get(machine.title)
+        if estimate is None:
+            estimate = self._titles[machine.title] = Ewma(
+                machine.expected_time, self.alpha)
+        estimate.update(duration / self.player_factor(player))
+        if self.player_alpha is not None:
+            factor = self._players.get(player.id)
+            if factor is None:
+                factor = self._players[player.id] = Ewma(
+                    1.0, self.player_alpha)
+            factor.update(duration / estimate.value)
+        return estimate.value
+
+    def state(self):
+        return {
+            'alpha': self.alpha,
+            'player_alpha': self.player_alpha,
+            'titles': [[title, e.value, e.count]
+                       for title, e in self._titles.items()],
+            'players': [[player_id, e.value, e.count]
+                        for player_id, e in self._players.items()],
+        }
+
+    @classmethod
+    def from_state(cls, data):
+        """Restores an estimator from state()."""
+        estimator = cls(data['alpha'], data['player_alpha'])
+        for title, value, count in data['titles']:
+            estimator._titles[title] = Ewma(value, estimator.alpha, count)
+        for player_id, value, count in data['players']:
+            estimator._players[player_id] = Ewma(
+                value, estimator.player_alpha, count)
+        return estimator
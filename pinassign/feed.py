@@ -0,0 +1,49 @@
+import collections
+import itertools as it
+
+DEFAULT_SIZE = 1024
+
+Change = collections.namedtuple('Change', ['seq', 'op', 'args'])
+
+
+class ChangeFeed:
+    """A numbered stream of the changes made to a game.
+
+    Every change gets the next sequence number, starting from 1, and is kept
+    in a ring buffer holding the latest size changes. Changes are given as
+    the name of the operation and its arguments, in the same form as in the
+    journal, with one 'assignment' change per assigned (machine, player).
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self._changes = collections.deque(maxlen=size)
+        self._seq = 0
+
+    @property
+    def seq(self):
+        """The sequence number of the latest change, or 0 if there is none."""
+        return self._seq
+
+    def publish(self, op, args):
+        self._seq += 1
+        self._changes.append(Change(self._seq, op, args))
+        return self._seq
+
+    def since(self, seq):
+        """Returns the changes made after the given sequence number.
+
+        Returns None if some of those changes have already been dropped from
+        the buffer, or if seq is ahead of the feed, for instance because the
+        game has been recovered since. The subscriber must then start over
+        from a snapshot of the game.
+        """
+        if seq > self._seq or seq < 0:
+            return None
+        count = self._seq - seq
+        if count > len(self._changes):
+            return None
+        # The latest changes are the ones asked for most often, so they are
+        # taken from the end of the buffer.
+        changes = list(it.islice(reversed(self._changes), count))
+        changes.reverse()
+        return changes
@@ -0,0 +1,291 @@
+import argparse
+import collections
+import concurrent.futures
+import itertools as it
+import random
+import time
+
+from .core import STRATEGIES, Machine, Player, machine_bank
+from .game import *
+from .montecarlo import parse_machine_spec
+from .simulation import simulate
+
+FlightStatus = collections.namedtuple(
+    'FlightStatus', ['name', 'machines', 'players', 'scores', 'games',
+                     'running', 'finished'])
+
+FlightSimulation = collections.namedtuple(
+    'FlightSimulation', ['makespan', 'games', 'seconds'])
+
+FlightsResult = collections.namedtuple(
+    'FlightsResult', ['makespan', 'flights', 'games', 'cpu_seconds',
+                      'wall_seconds'])
+
+
+class FlightError(GameError):
+    pass
+
+
+class Flights:
+    """A tournament split into flights that each play their own machines.
+
+    Every flight is an independent Game with its own players and machines,
+    so assigning players after a score only looks at the players of one
+    flight. Machine and player names are unique across all flights, and
+    scores and ready changes are routed to the flight that owns them.
+    """
+
+    def __init__(self, r=None, strategy='greedy'):
+        if strategy not in STRATEGIES:
+            raise GameError('Unknown assignment strategy {}'.format(strategy))
+        self.r = random.Random() if r is None else r
+        self.strategy = strategy
+        self._flights = collections.OrderedDict()
+        self._machine_flights = {}
+        self._player_flights = {}
+
+    @property
+    def flights(self):
+        return self._flights
+
+    def add_flight(self, name):
+        if not name:
+            raise FlightError('The flight must have a name')
+        elif name in self._flights:
+            raise FlightError('The flight {} already exists'.format(name))
+        self._flights[name] = Game(
+            random.Random(self.r.getrandbits(64)), strategy=self.strategy)
+
+    def remove_flight(self, name):
+        game = self._get_flight(name)
+        if game.is_running:
+            raise FlightError(
+                'The flight {} has already been started'.format(name))
+        for m in game.machines:
+            self._machine_flights.pop(m.name, None)
+            self._machine_flights.pop(m.title, None)
+        for p in game.players:
+            del self._player_flights[p.name]
+        del self._flights[name]
+
+    def flight_of_machine(self, name):
+        flight = self._machine_flights.get(name)
+        if flight is None:
+            raise UnknownMachineError('Machine {} not recognized'.format(name))
+        return flight
+
+    def flight_of_player(self, name):
+        flight = self._player_flights.get(name)
+        if flight is None:
+            raise UnknownPlayerError('Player {} not recognized'.format(name))
+        return flight
+
+    def add_machine(self, flight, name, expected_time, copies=1):
+        """Adds a machine, or a bank of copies of the same title, to a flight.
+
+        Both the title and the names of the copies are routed to the flight.
+        """
+        game = self._get_flight(flight)
+        names = [name]
+        if isinstance(copies, int) and copies > 1:
+            names += [m.name
+                      for m in machine_bank(name, expected_time, copies)]
+        for n in names:
+            if n in self._machine_flights:
+                raise DuplicateMachineError(
+                    'The machine {} already exists in flight {}'.format(
+                        n, self._machine_flights[n]))
+        game.add_machine(name, expected_time, copies)
+        for n in names:
+            self._machine_flights[n] = flight
+
+    def remove_machine(self, name):
+        """Removes a machine. The title of a bank removes every copy."""
+        game = self._flights[self.flight_of_machine(name)]
+        removed = ([m for m in game.machines if m.name == name] or
+                   [m for m in game.machines if m.title == name])
+        game.remove_machine(name)
+        for m in removed:
+            self._machine_flights.pop(m.name, None)
+            if m.title not in game.banks:
+                self._machine_flights.pop(m.title, None)
+
+    def add_player(self, flight, name):
+        if name in self._player_flights:
+            raise DuplicatePlayerError(
+                'The player {} already exists in flight {}'.format(
+                    name, self._player_flights[name]))
+        self._get_flight(flight).add_player(name)
+        self._player_flights[name] = flight
+
+    def remove_player(self, name):
+        self._flights[self.flight_of_player(name)].remove_player(name)
+        del self._player_flights[name]
+
+    def start(self):
+        """Starts every flight and returns the assignments of all of them.
+
+        Every flight is checked first, so either all of them are started or
+        none are.
+        """
+        if not self._flights:
+            raise FlightError('There must be at least one flight')
+        for name, game in self._flights.items():
+            if game.is_running:
+                raise FlightError(
+                    'The flight {} has already been started'.format(name))
+            elif not game.machines or not game.players:
+                raise FlightError(
+                    'The flight {} must have at least one machine and one '
+                    'player'.format(name))
+        return list(it.chain.from_iterable(
+            game.start() for game in self._flights.values()))
+
+    def assign(self):
+        return list(it.chain.from_iterable(
+            game.assign() for game in self._flights.values()
+            if game.is_running))
+
+    def add_score(self, machine_name, player_name):
+        return self._flights[self._route(machine_name, player_name)].add_score(
+            machine_name, player_name)
+
+    def remove_score(self, machine_name, player_name):
+        self._flights[self._route(machine_name, player_name)].remove_score(
+            machine_name, player_name)
+
+    def set_machine_ready(self, machine_name, ready):
+        self._flights[self.flight_of_machine(machine_name)].set_machine_ready(
+            machine_name, ready)
+
+    def set_player_ready(self, player_name, ready):
+        self._flights[self.flight_of_player(player_name)].set_player_ready(
+            player_name, ready)
+
+    def is_finished(self):
+        return all(game.is_running and game.is_finished()
+                   for game in self._flights.values())
+
+    def status(self):
+        """Returns the status of every flight and of the whole tournament.
+
+        The last entry sums up all flights, with None as its name.
+        """
+        statuses = [
+            FlightStatus(name, len(game.machines), len(game.players),
+                         len(game.scores),
+                         len(game.banks) * len(game.players),
+                         game.is_running,
+                         game.is_running and game.is_finished())
+            for name, game in self._flights.items()]
+        total = FlightStatus(
+            None, *[sum(s[i] for s in statuses) for i in range(1, 5)],
+            running=any(s.running for s in statuses),
+            finished=bool(statuses) and all(s.finished for s in statuses))
+        return statuses + [total]
+
+    def _get_flight(self, name):
+        game = self._flights.get(name)
+        if game is None:
+            raise FlightError('Flight {} not recognized'.format(name))
+        return game
+
+    def _route(self, machine_name, player_name):
+        machine_flight = self.flight_of_machine(machine_name)
+        player_flight = self.flight_of_player(player_name)
+        if machine_flight != player_flight:
+            raise FlightError(
+                'Player {} is in flight {}, but machine {} is in flight '
+                '{}'.format(player_name, player_flight, machine_name,
+                            machine_flight))
+        return machine_flight
+
+
+def _simulate_flight(machine_specs, player_names, seed, strategy):
+    start = time.process_time()
+    result = simulate([Machine(name, t) for name, t in machine_specs],
+                      [Player(name) for name in player_names],
+                      random.Random(seed), strategy=STRATEGIES[strategy])
+    return FlightSimulation(result.makespan, len(result.trace),
+                            time.process_time() - start)
+
+
+def simulate_flights(flights, workers=1, seed=0, strategy='greedy'):
+    """Simulates every flight of a tournament until it is finished.
+
+    flights is a sequence of (machine specs, player names) pairs, where the
+    machine specs are (name, expected time) pairs. With more than one worker,
+    the flights are simulated in parallel in separate processes. Every flight
+    gets its own seed derived from the base seed, so the results do not
+    depend on the number of workers. The makespan of the tournament is the
+    makespan of the slowest flight.
+    """
+    flights = [([(name, t) for name, t in machine_specs], list(player_names))
+               for machine_specs, player_names in flights]
+    seeds = random.Random(seed)
+    jobs = [(machine_specs, player_names, seeds.getrandbits(64), strategy)
+            for machine_specs, player_names in flights]
+    start = time.perf_counter()
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_simulate_flight, *zip(*jobs)))
+    else:
+        results = [_simulate_flight(*job) for job in jobs]
+    return FlightsResult(
+        max((r.makespan for r in results), default=0), results,
+        sum(r.games for r in results), sum(r.seconds for r in results),
+        time.perf_counter() - start)
+
+
+def split(items, count):
+    """Deals items out round-robin into count groups."""
+    return [items[i::count] for i in range(count)]
+
+
+def run_flights(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Simulate a tournament split into flights, and compare '
+                    'it with a single game over everyone.')
+    parser.add_argument('-m', '--machine', dest='machines', action='append',
+                        type=parse_machine_spec,
+                        help='A machine as NAME=EXPECTEDTIME (repeatable, '
+                             'default: 40 machines of 2 to 12 minutes)')
+    parser.add_argument('-p', '--players', type=int, default=300,
+                        help='Number of players (default: 300)')
+    parser.add_argument('-f', '--flights', type=int, default=4,
+                        help='Number of flights; machines and players are '
+                             'dealt out evenly between them (default: 4)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of worker processes')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='Seed for the simulation')
+    parser.add_argument('-S', '--strategy', choices=sorted(STRATEGIES),
+                        default='greedy', help='Assignment strategy')
+    args = parser.parse_args(argv)
+    machines = args.machines
+    if machines is None:
+        r = random.Random(args.seed)
+        machines = [('M{}'.format(i), r.randint(2, 12)) for i in range(40)]
+    players = ['P{}'.format(i) for i in range(args.players)]
+    if not 0 < args.flights <= min(len(machines), len(players)):
+        parser.error('Every flight needs at least one machine and one player')
+    flights = list(zip(split(machines, args.flights),
+                       split(players, args.flights)))
+    result = simulate_flights(flights, args.workers, args.seed, args.strategy)
+    flat = simulate_flights([(machines, players)], 1, args.seed,
+                            args.strategy)
+    for idx, ((machine_specs, player_names), flight) in enumerate(
+            zip(flights, result.flights)):
+        print('Flight {}: {} machines, {} players, makespan {:.1f}, '
+              '{} games in {:.3f} s'.format(
+                  idx + 1, len(machine_specs), len(player_names),
+                  flight.makespan, flight.games, flight.seconds))
+    for label, r in (('Flights', result), ('Single game', flat)):
+        print('{}: makespan {:.1f}, {} games, {:.3f} s CPU ({:.1f} us per '
+              'game), {:.3f} s wall'.format(
+                  label, r.makespan, r.games, r.cpu_seconds,
+                  r.cpu_seconds / r.games * 1e6 if r.games else 0,
+                  r.wall_seconds))
+
+if __name__ == '__main__':
+    run_flights()
@@ -0,0 +1,184 @@
+import collections
+import random
+
+from . import core
+from .simulation import AssignedEvent, FinishedEvent, simulate
+
+Forecast = collections.namedtuple(
+    'Forecast', ['lower_bound', 'makespan', 'finish_times',
+                 'remaining_games', 'in_progress', 'exact'])
+
+DEFAULT_HORIZON = 500
+
+# Strategies too slow to run at every step of a projection, and the ones
+# simulated in their place.
+PROJECTION_STRATEGIES = {'matching': 'greedy'}
+
+
+def current_games(game, now):
+    """Returns the games being played as (machine, player, elapsed) tuples.
+
+    Only assignments whose machine and player are both still busy, and where
+    the player has not registered a score on the machine, are included.
+    """
+    machines = {m.id: m for m in game.machines}
+    players = {p.id: p for p in game.players}
+    games = []
+    for (machine_id, player_id), start in game.started.items():
+        m = machines.get(machine_id)
+        p = players.get(player_id)
+        if (m is None or p is None or m.ready or p.ready or
+                game.scores.has_played(m, p)):
+            continue
+        games.append((m, p, max(now - start, 0)))
+    return games
+
+
+def remaining_times(machines, players, scores, games):
+    """Returns the time each machine and each player is still needed.
+
+    Both are returned as dicts keyed by id. A machine is needed for the rest of
+    the game in progress on it and for every player who has still not played
+    it, and a player for the rest of their game in progress and for every
+    machine they have still not played. The work left on a title is shared
+    by its copies, so each copy is needed for at least an even share of it.
+
+    With a quota, it is not known which machines the players will play, so
+    every game a player still needs is counted at the shortest expected
+    time, and the total is shared by all machines.
+    """
+    remaining_machine = {m.id: 0 for m in machines}
+    remaining_player = {p.id: 0 for p in players}
+    for m, p, elapsed in games:
+        left = max(m.expected_time - elapsed, 0)
+        remaining_machine[m.id] = left
+        remaining_player[p.id] = left
+    if scores.quota is not None:
+        shortest = min((m.expected_time for m in machines), default=0)
+        busy = {p.id for _, p, _ in games}
+        work = sum(remaining_machine.values())
+        for p in players:
+            need = max(scores.needed_games(p) - (p.id in busy), 0)
+            remaining_player[p.id] += need * shortest
+            work += need * shortest
+        for m in machines:
+            remaining_machine[m.id] = max(remaining_machine[m.id],
+                                          work / len(machines))
+        return remaining_machine, remaining_player
+    playing = {(m.title, p.id) for m, p, _ in games}
+    banks = collections.OrderedDict()
+    for m in machines:
+        banks.setdefault(m.title, []).append(m)
+    for copies in banks.values():
+        m = copies[0]
+        work = sum(remaining_machine[c.id] for c in copies)
+        for player_id in scores.unplayed_players(m):
+            if (m.title, player_id) in playing:
+                continue
+            work += m.expected_time
+            remaining_player[player_id] += m.expected_time
+        if len(copies) == 1:
+            remaining_machine[m.id] = work
+            continue
+        for c in copies:
+            remaining_machine[c.id] = max(remaining_machine[c.id],
+                                          work / len(copies))
+    return remaining_machine, remaining_player
+
+
+def lower_bound(machines, players, scores, games):
+    """Returns a lower bound on the time left until everyone is finished.
+
+    No machine can finish before it has served every player who still needs
+    it, and no player can finish before playing every machine they still
+    need, in both cases after the game in progress is done.
+    """
+    remaining_machine, remaining_player = remaining_times(
+        machines, players, scores, games)
+    return max(max(remaining_machine.values(), default=0),
+               max(remaining_player.values(), default=0))
+
+
+class _PendingGames:
+    """Simulation sink that keeps track of the games being played."""
+
+    def __init__(self, busy):
+        self.games = {(m.id, p.id): (m, p, start) for m, p, start, _ in busy}
+
+    def handle(self, event):
+        if type(event) is AssignedEvent:
+            self.games[event.machine.id, event.player.id] = (
+                event.machine, event.player, event.time)
+        elif type(event) is FinishedEvent:
+            del self.games[event.machine.id, event.player.id]
+
+    def close(self):
+        pass
+
+
+def forecast(game, now=None, seed=0, horizon=DEFAULT_HORIZON):
+    """Forecasts how long the rest of a running game will take.
+
+    Returns the lower bound on the remaining makespan and a projection made by
+    simulating the rest of the game with the game's assignment strategy,
+    assuming every game takes the machine's expected time. Times are given in
+    the same unit as the expected times, counted from now. The projected
+    finish time of players who have already played every machine is 0.
+
+    Simulating a whole tournament takes too long to redo after every score,
+    so only the next horizon games are simulated. From there, the projection
+    is extended with the lower bounds for the state the simulation reached,
+    and exact is False. Pass None as the horizon to simulate to the end.
+
+    The matching strategy solves an assignment problem at every step, which
+    makes a projection of a large game take hundreds of milliseconds, so its
+    games are projected with the greedy strategy instead.
+
+    Machines and players that are marked busy without a game in progress are
+    assumed to be available right away. The game itself is not changed, and
+    its random number generator is not used.
+    """
+    now = game.clock() if now is None else now
+    games = current_games(game, now)
+    machines = {}
+    for original in game.machines:
+        machines[original.id] = core.Machine(
+            original.name, original.expected_time, original.id,
+            original.title)
+    players = {}
+    for original in game.players:
+        p = players[original.id] = core.Player(original.name, original.id)
+        p.expected_time_spent = original.expected_time_spent
+    busy = []
+    for original_m, original_p, elapsed in games:
+        m = machines[original_m.id]
+        p = players[original_p.id]
+        m.ready = p.ready = False
+        busy.append((m, p, -elapsed, max(m.expected_time - elapsed, 0)))
+    machines = list(machines.values())
+    players = list(players.values())
+    scores = game.scores.copy(machines, players)
+    bound = lower_bound(game.machines, game.players, game.scores, games)
+    pending = _PendingGames(busy)
+    strategy = PROJECTION_STRATEGIES.get(game.strategy, game.strategy)
+    result = simulate(machines, players, random.Random(seed),
+                      sinks=[pending], strategy=core.STRATEGIES[strategy],
+                      scores=scores, busy=busy, max_games=horizon)
+    remaining_games = len(result.trace) - len(busy)
+    if result.finished:
+        return Forecast(bound, result.makespan, result.finish_times,
+                        remaining_games, len(busy), True)
+    time = result.makespan
+    pending_games = [(m, p, time - start)
+                     for m, p, start in pending.games.values()]
+    remaining_machine, remaining_player = remaining_times(
+        machines, players, scores, pending_games)
+    finish_times = dict(result.finish_times)
+    for p in players:
+        if remaining_player[p.id]:
+            finish_times[p.name] = time + remaining_player[p.id]
+    makespan = time + max(max(remaining_machine.values(), default=0),
+                          max(remaining_player.values(), default=0))
+    remaining_games += sum(scores.needed_games(p) for p in players)
+    return Forecast(bound, makespan, finish_times, remaining_games,
+                    len(busy), False)
@@ -1,6 +1,8 @@
 import random
+import time
 
-import .core
+from . import core, feed, forecast, instrumentation
+from .estimation import TimeEstimator
 
 
 class GameError(Exception):
@@ -43,16 +45,88 @@ class DuplicateScoreError(GameError):
     pass
 
 
+class UnknownScoreError(GameError):
+    pass
+
+
+def minutes():
+    return time.time() / 60
+
+
 class Game:
 
-    def __init__(self, r=random.Random()):
-        self.r = r
+    def __init__(self, r=None, journal=None, strategy='greedy',
+                 estimator=None, clock=minutes, feed_size=feed.DEFAULT_SIZE,
+                 quota=None):
+        if strategy not in core.STRATEGIES:
+            raise GameError('Unknown assignment strategy {}'.format(strategy))
+        self._check_quota(quota)
+        self.r = random.Random() if r is None else r
+        self.clock = clock
+        self._strategy = strategy
+        self._estimator = estimator
+        self._journal = None
+        self._feed = feed.ChangeFeed(feed_size)
         self._machines = []
         self._players = []
-        self._scores = []
+        self._scores = core.ScoreIndex(quota=quota)
+        self._queue = core.PlayerQueue(key=self._priority_key())
+        self._started = {}
         self._machine_dict = {}
+        self._banks = {}
         self._player_dict = {}
+        self._machine_ids = {}
+        self._player_ids = {}
         self._is_running = False
+        if journal is not None:
+            self.set_journal(journal)
+
+    @classmethod
+    def from_snapshot(cls, data, r=None, clock=minutes):
+        estimator = None
+        if data['estimator'] is not None:
+            estimator = TimeEstimator.from_state(data['estimator'])
+        game = cls(r, estimator=estimator, clock=clock, quota=data['quota'])
+        version, state, gauss = data['rng']
+        game.r.setstate((version, tuple(state), gauss))
+        game._machine_ids = dict(data['machine_ids'])
+        game._player_ids = dict(data['player_ids'])
+        for machine_id, name, expected_time, ready, title in data['machines']:
+            machine = core.Machine(name, expected_time, machine_id, title)
+            machine.ready = ready
+            game._machines.append(machine)
+            game._machine_dict[name] = machine
+            game._banks.setdefault(machine.title, []).append(machine)
+            game._scores.add_machine(machine)
+        known_players = {}
+        for player_id, name, expected_time_spent, ready in data['players']:
+            player = core.Player(name, player_id)
+            player.expected_time_spent = expected_time_spent
+            player.ready = ready
+            game._players.append(player)
+            game._player_dict[name] = player
+            game._scores.add_player(player)
+            game._queue.add(player)
+            known_players[player_id] = player
+        machines = {m.id: m for m in game._machines}
+        names = {player_id: name
+                 for name, player_id in game._player_ids.items()}
+        for machine_id, player_id in data['scores']:
+            player = known_players.get(player_id)
+            if player is None:
+                player = core.Player(names[player_id], player_id)
+                game._scores.add_player(player)
+                game._scores.remove_player(player)
+                known_players[player_id] = player
+            game._scores.append(core.Score(machines[machine_id], player))
+        game._is_running = data['running']
+        if game._is_running:
+            game._queue.track_machines(game._machines)
+        game._strategy = data['strategy']
+        game._started = {
+            (machine_id, player_id): t
+            for machine_id, player_id, t in data['started']}
+        return game
 
     @property
     def machines(self):
@@ -70,41 +144,110 @@ class Game:
     def is_running(self):
         return self._is_running
 
-    def add_machine(self, name, expected_time):
+    @property
+    def strategy(self):
+        return self._strategy
+
+    @property
+    def quota(self):
+        """The number of machines every player has to play, or None for all.
+
+        Copies of the same title count as one machine.
+        """
+        return self._scores.quota
+
+    @property
+    def estimator(self):
+        return self._estimator
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def banks(self):
+        """The machines of every title, keyed by title."""
+        return self._banks
+
+    def add_machine(self, name, expected_time, copies=1):
+        """Adds a machine, or a bank of copies of the same title.
+
+        With more than one copy, the copies are named after the title with a
+        number, and any of them can serve a player who needs the title.
+        """
         self._fail_if_running()
-        if not name:
-            raise InvalidMachineError('The machine must have a name')
-        elif expected_time <= 0:
-            raise InvalidMachineError(
-                'The expected time of the machine cannot be zero or negative')
-        elif self._get_machine(name) is not None:
-            raise DuplicateMachineError(
-                'The machine {} already exists'.format(name))
-        machine = pinassign.Machine(name, expected_time)
-        self._machines.append(machine)
-        self._machine_dict[name] = machine
+        self._check_new_machine(name, expected_time, copies)
+        self._add_machine(name, expected_time, copies)
+        if copies == 1:
+            self._record('add_machine', name, expected_time)
+        else:
+            self._record('add_machine', name, expected_time, copies)
+
+    def add_machines(self, machines):
+        """Adds (name, expected time) pairs, or (name, expected time, copies)
+        triples, as machines.
+
+        Every machine is checked before any of them is added, so either all of
+        them are added or none are.
+        """
+        self._fail_if_running()
+        machines = [tuple(machine) for machine in machines]
+        names = set()
+        for machine in machines:
+            self._check_new_machine(*machine)
+            name = machine[0]
+            if name in names:
+                raise DuplicateMachineError(
+                    'The machine {} is given more than once'.format(name))
+            names.add(name)
+        for machine in machines:
+            self._add_machine(*machine)
+        self._record('add_machines', machines)
 
     def remove_machine(self, name):
+        """Removes a machine. The title of a bank removes every copy."""
         self._fail_if_running()
         if not name:
             raise InvalidMachineError('The machine must have a name')
         machine = self._get_machine(name)
-        if not machine:
+        if machine is not None:
+            machines = [machine]
+        elif name in self._banks:
+            machines = list(self._banks[name])
+        else:
             raise UnknownMachineError('Machine {} not recognized'.format(name))
-        self._machines.remove(machine)
-        del self._machine_dict[name]
+        for machine in machines:
+            self._machines.remove(machine)
+            del self._machine_dict[machine.name]
+            bank = self._banks[machine.title]
+            bank.remove(machine)
+            if not bank:
+                del self._banks[machine.title]
+            self._scores.remove_machine(machine)
+        self._record('remove_machine', name)
 
     def add_player(self, name):
-        if not name:
-            raise InvalidPlayerError('The player must have a name')
-        elif ' ' in name:
-            raise InvalidPlayerError('Player names must not contain spaces')
-        elif self._get_player(name) is not None:
-            raise DuplicatePlayerError(
-                'The player {} already exists'.format(name))
-        player = pinassign.Player(name)
-        self._players.append(player)
-        self._player_dict[name] = player
+        self._check_new_player(name)
+        self._add_player(name)
+        self._record('add_player', name)
+
+    def add_players(self, names):
+        """Adds players by name.
+
+        Every name is checked before any player is added, so either all of
+        them are added or none are.
+        """
+        names = list(names)
+        seen = set()
+        for name in names:
+            self._check_new_player(name)
+            if name in seen:
+                raise DuplicatePlayerError(
+                    'The player {} is given more than once'.format(name))
+            seen.add(name)
+        for name in names:
+            self._add_player(name)
+        self._record('add_players', names)
 
     def remove_player(self, name):
         if not name:
@@ -114,45 +257,57 @@ class Game:
             raise UnknownPlayerError('Player {} not recognized'.format(name))
         self._players.remove(player)
         del self._player_dict[name]
+        self._scores.remove_player(player)
+        self._queue.remove(player)
+        self._record('remove_player', name)
 
     def add_score(self, machine_name, player_name):
         self._fail_if_not_running()
-        if not machine_name:
-            raise InvalidMachineError('No machine name given')
-        elif not player_name:
-            raise InvalidPlayerError('No player name given')
-        machine = self._get_machine(machine_name)
-        if not machine:
-            raise UnknownMachineError(
-                'Machine {} not recognized'.format(machine_name))
-        player = self._get_player(player_name)
-        if not player:
-            raise UnknownPlayerError(
-                'Player {} not recognized'.format(player_name))
+        machine, player = self._get_score_pair(machine_name, player_name)
         try:
-            return pinassign.player_finished_machine(
-                machine, player, self._machines, self._players, self._scores, self.r)
+            core.register_score(machine, player, self._scores, self._queue)
         except ValueError as e:
             msg = 'Score for {} on {} already exists'.format(
                 player_name, machine_name)
             raise DuplicateScoreError(msg) from e
+        self._finish_game(machine, player)
+        return self._record_assignments(
+            self._assign_all(), 'add_score', machine.name, player_name)
+
+    def add_scores(self, scores):
+        """Registers a batch of scores given as (machine name, player name).
+
+        The batch is checked before anything is changed, so either all of the
+        scores are registered or none are. The assignments are only made
+        once, after the last score, so they are the ones add_score would
+        have given for the last score if the earlier ones had been registered
+        without assigning anyone in between.
+        """
+        self._fail_if_not_running()
+        pairs = [self._get_score_pair(machine_name, player_name)
+                 for machine_name, player_name in scores]
+        try:
+            core.register_scores(pairs, self._scores, self._queue)
+        except ValueError as e:
+            raise DuplicateScoreError(str(e)) from e
+        for machine, player in pairs:
+            self._finish_game(machine, player)
+        return self._record_assignments(
+            self._assign_all(), 'add_scores',
+            [(machine.name, player.name) for machine, player in pairs])
 
     def remove_score(self, machine_name, player_name):
         self._fail_if_not_running()
-        if not machine_name:
-            raise InvalidMachineError('No machine name given')
-        elif not player_name:
-            raise InvalidPlayerError('No player name given')
-        machine = self._get_machine(machine_name)
-        if not machine:
-            raise UnknownMachineError(
-                'Machine {} not recognized'.format(machine_name))
-        player = self._get_player(player_name)
-        if not player:
-            raise UnknownPlayerError(
-                'Player {} not recognized'.format(player_name))
-        score = pinassign.Score(machine, player)
-        self._scores.remove(score)
+        machine, player = self._get_score_pair(machine_name, player_name)
+        score = core.Score(machine, player)
+        try:
+            self._scores.remove(score)
+        except ValueError as e:
+            msg = 'No score for {} on {}'.format(player_name, machine_name)
+            raise UnknownScoreError(msg) from e
+        self._queue.touch_machine(machine)
+        self._queue.touch(player)
+        self._record('remove_score', machine_name, player_name)
 
     def start(self):
         self._fail_if_running()
@@ -161,21 +316,36 @@ class Game:
         elif not self._players:
             raise GameError('There must be at least one player')
         self._is_running = True
-        return self._assign_all()
+        self._queue.track_machines(self._machines)
+        return self._record_assignments(self._assign_all(), 'start')
 
     def is_finished(self):
         self._fail_if_not_running()
-        return pinassign.is_everyone_finished(
+        return core.is_everyone_finished(
             self._machines, self._players, self._scores)
 
+    def forecast(self, now=None, seed=0, horizon=forecast.DEFAULT_HORIZON):
+        self._fail_if_not_running()
+        return forecast.forecast(self, now, seed, horizon)
+
+    def stats(self):
+        """Returns the call statistics gathered by the instrumentation.
+
+        The statistics cover every game in the process. They are empty unless
+        instrumentation.enable() has been called.
+        """
+        return instrumentation.snapshot()
+
     def reset_scores(self):
         self._fail_if_not_running()
-        self._scores = []
+        self._scores.clear()
+        self._started.clear()
         self._is_running = False
+        self._record('reset_scores')
 
     def assign(self):
         self._fail_if_not_running()
-        return self._assign_all()
+        return self._record_assignments(self._assign_all(), 'assign')
 
     def set_machine_ready(self, machine_name, ready):
         self._fail_if_not_running()
@@ -191,6 +361,8 @@ class Game:
                 'Machine {} is already {}'.format(
                     machine_name, desc))
         machine.ready = ready
+        self._queue.update_machine(machine)
+        self._record('set_machine_ready', machine_name, ready)
 
     def set_player_ready(self, player_name, ready):
         self._fail_if_not_running()
@@ -206,6 +378,74 @@ class Game:
                 'Player {} is already {}'.format(
                     player_name, desc))
         player.ready = ready
+        self._queue.update(player)
+        self._record('set_player_ready', player_name, ready)
+
+    def set_quota(self, quota):
+        """Makes every player play only the given number of machines.
+
+        Pass None to have everyone play every machine again. The quota can
+        only be changed before the game is started.
+        """
+        self._fail_if_running()
+        self._check_quota(quota)
+        self._scores.set_quota(quota)
+        self._record('set_quota', quota)
+
+    def set_strategy(self, strategy):
+        if strategy not in core.STRATEGIES:
+            raise GameError('Unknown assignment strategy {}'.format(strategy))
+        self._strategy = strategy
+        self._record('set_strategy', strategy)
+
+    @property
+    def journal(self):
+        return self._journal
+
+    @property
+    def feed(self):
+        """The numbered stream of changes made to the game.
+
+        Display boards can take a snapshot together with feed.seq, and from
+        then on only fetch the changes since the last one they saw.
+        """
+        return self._feed
+
+    def set_journal(self, journal):
+        """Starts writing every change of the game to the given journal.
+
+        A snapshot of the current state is written first, so the journal only
+        ever needs to hold the changes made after it. Pass None to stop
+        journaling.
+        """
+        self._journal = journal
+        if journal is not None:
+            journal.snapshot(self)
+
+    def snapshot(self):
+        return {
+            'machines': [[m.id, m.name, m.expected_time, m.ready, m.title]
+                         for m in self._machines],
+            'players': [[p.id, p.name, p.expected_time_spent, p.ready]
+                        for p in self._players],
+            'machine_ids': self._machine_ids,
+            'player_ids': self._player_ids,
+            'scores': [[s.machine.id, s.player.id] for s in self._scores],
+            'running': self._is_running,
+            'strategy': self._strategy,
+            'quota': self._scores.quota,
+            'started': [[machine_id, player_id, t]
+                        for (machine_id, player_id), t
+                        in self._started.items()],
+            'estimator': (None if self._estimator is None
+                          else self._estimator.state()),
+            'rng': self.r.getstate(),
+        }
+
+    def _check_quota(self, quota):
+        if quota is not None and (not isinstance(quota, int) or
+                                  isinstance(quota, bool) or quota < 1):
+            raise GameError('The quota must be a positive number of machines')
 
     def _fail_if_running(self):
         if self._is_running:
@@ -215,10 +455,127 @@ class Game:
         if not self._is_running:
             raise GameError('The game has not been started')
 
+    def _record(self, op, *args):
+        if self._journal is not None:
+            self._journal.record(self, op, args)
+        self._feed.publish(op, args)
+
+    def _record_assignments(self, assignments, op, *args):
+        assignments = list(assignments)
+        self._record(op, *args)
+        for m, p in assignments:
+            self._feed.publish('assignment', (m.name, p.name))
+        return assignments
+
     def _assign_all(self):
         assert self._is_running
-        return pinassign.assign_players(
-            self._machines, self._players, self._scores, self.r)
+        return self._stamp(core.STRATEGIES[self._strategy](
+            self._machines, self._players, self._scores, self.r, self._queue))
+
+    def _stamp(self, assignments):
+        for m, p in assignments:
+            self._started[(m.id, p.id)] = self.clock()
+            yield (m, p)
+
+    def _priority_key(self):
+        if self._estimator is None or not self._estimator.learns_player_speeds:
+            return None
+        estimator = self._estimator
+        return lambda p: p.expected_time_spent / estimator.player_factor(p)
+
+    def _observe(self, machine, player, duration):
+        old = machine.expected_time
+        new = core.round_time(
+            self._estimator.observe(machine, player, duration))
+        if new != old:
+            self._scores.set_expected_time(machine, new)
+            for p in self._scores.played_players(machine):
+                p.expected_time_spent = core.round_time(
+                    p.expected_time_spent + new - old)
+                self._queue.update(p)
+
+    def _check_new_machine(self, name, expected_time, copies=1):
+        if not name:
+            raise InvalidMachineError('The machine must have a name')
+        elif expected_time <= 0:
+            raise InvalidMachineError(
+                'The expected time of the machine cannot be zero or negative')
+        elif (not isinstance(copies, int) or isinstance(copies, bool) or
+                copies < 1):
+            raise InvalidMachineError(
+                'The number of copies must be a positive integer')
+        elif self._get_machine(name) is not None or name in self._banks:
+            raise DuplicateMachineError(
+                'The machine {} already exists'.format(name))
+        for machine in core.machine_bank(name, expected_time, copies):
+            if self._get_machine(machine.name) is not None:
+                raise DuplicateMachineError(
+                    'The machine {} already exists'.format(machine.name))
+
+    def _add_machine(self, name, expected_time, copies=1):
+        expected_time = core.round_time(expected_time)
+        for machine in core.machine_bank(name, expected_time, copies):
+            machine.id = self._get_id(self._machine_ids, machine.name)
+            self._machines.append(machine)
+            self._machine_dict[machine.name] = machine
+            self._banks.setdefault(machine.title, []).append(machine)
+            self._scores.add_machine(machine)
+
+    def _check_new_player(self, name):
+        if not name:
+            raise InvalidPlayerError('The player must have a name')
+        elif ' ' in name:
+            raise InvalidPlayerError('Player names must not contain spaces')
+        elif self._get_player(name) is not None:
+            raise DuplicatePlayerError(
+                'The player {} already exists'.format(name))
+
+    def _add_player(self, name):
+        player = core.Player(name, self._get_id(self._player_ids, name))
+        self._players.append(player)
+        self._player_dict[name] = player
+        self._scores.add_player(player)
+        self._queue.add(player)
+
+    def _get_score_pair(self, machine_name, player_name):
+        """Looks up the machine and player of a score.
+
+        The machine may be given as any copy of its title, or as the title
+        itself. If the player was assigned to a copy of it, that copy is
+        used, so it is freed even when the score names another one. A title
+        otherwise stands for its first ready copy.
+        """
+        if not machine_name:
+            raise InvalidMachineError('No machine name given')
+        elif not player_name:
+            raise InvalidPlayerError('No player name given')
+        machine = self._get_machine(machine_name)
+        if not machine and machine_name in self._banks:
+            bank = self._banks[machine_name]
+            machine = next((m for m in bank if m.ready), bank[0])
+        if not machine:
+            raise UnknownMachineError(
+                'Machine {} not recognized'.format(machine_name))
+        player = self._get_player(player_name)
+        if not player:
+            raise UnknownPlayerError(
+                'Player {} not recognized'.format(player_name))
+        if (machine.id, player.id) not in self._started:
+            for copy in self._banks[machine.title]:
+                if (copy.id, player.id) in self._started:
+                    return copy, player
+        return machine, player
+
+    def _finish_game(self, machine, player):
+        """Learns from the duration of a game whose score was registered."""
+        started = self._started.pop((machine.id, player.id), None)
+        if self._estimator is not None and started is not None:
+            duration = self.clock() - started
+            if duration > 0:
+                self._observe(machine, player, duration)
+
+    def _get_id(self, ids, name):
+        return ids.setdefault(name, len(ids))
 
     def _get_machine(self, name):
         return self._machine_dict.get(name, None)
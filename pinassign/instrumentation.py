@@ -0,0 +1,205 @@
+import functools
+import time
+import types
+
+from . import core
+
+CORE_FUNCTIONS = [
+    'assign_players',
+    'filter_available_players',
+    'register_score',
+]
+
+GAME_METHODS = [
+    'add_machine', 'add_machines', 'remove_machine',
+    'add_player', 'add_players', 'remove_player',
+    'add_score', 'add_scores', 'remove_score',
+    'start', 'is_finished', 'forecast', 'reset_scores', 'assign',
+    'set_machine_ready', 'set_player_ready', 'set_strategy', 'set_quota',
+    'snapshot',
+]
+
+# Functions whose result is the set of candidates, which is counted.
+COUNTED_RESULTS = {'filter_available_players'}
+
+
+def _bucket(ns):
+    """Returns the histogram bucket of a duration in nanoseconds.
+
+    Durations below 8 ns get a bucket each. Above that, every power of two is
+    split into four buckets, so a bucket is never wider than a quarter of its
+    lower bound.
+    """
+    bits = ns.bit_length()
+    if bits <= 3:
+        return ns
+    return (bits - 2) * 4 + ((ns >> (bits - 3)) & 3)
+
+
+def _bucket_bounds(idx):
+    if idx < 8:
+        return idx, idx + 1
+    shift = idx // 4 - 1
+    sub = idx % 4
+    return (4 + sub) << shift, (5 + sub) << shift
+
+
+class CallStats:
+    """Call count, latency histogram and result sizes of one function."""
+
+    __slots__ = ('calls', 'total_ns', 'buckets', 'sized_calls', 'total_size',
+                 'max_size')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.buckets = {}
+        self.sized_calls = 0
+        self.total_size = 0
+        self.max_size = 0
+
+    def record(self, ns, size=None):
+        self.calls += 1
+        self.total_ns += ns
+        idx = _bucket(ns)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        if size is not None:
+            self.sized_calls += 1
+            self.total_size += size
+            if size > self.max_size:
+                self.max_size = size
+
+    def percentile(self, q):
+        """Returns the latency below which q percent of the calls fell, in ns.
+
+        The latency is interpolated within the histogram bucket, so it is
+        accurate to within the width of the bucket.
+        """
+        if not self.calls:
+            return None
+        rank = self.calls * q / 100
+        seen = 0
+        for idx in sorted(self.buckets):
+            count = self.buckets[idx]
+            if seen + count >= rank:
+                low, high = _bucket_bounds(idx)
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return _bucket_bounds(max(self.buckets))[1]
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'total_ms': self.total_ns / 1e6,
+            'mean_us': (self.total_ns / self.calls / 1e3 if self.calls
+                        else None),
+            'p50_us': _us(self.percentile(50)),
+            'p99_us': _us(self.percentile(99)),
+            'mean_size': (self.total_size / self.sized_calls
+                          if self.sized_calls else None),
+            'max_size': self.max_size if self.sized_calls else None,
+        }
+
+
+def _us(ns):
+    return None if ns is None else ns / 1e3
+
+
+_stats = {}
+_originals = []
+
+
+def _timed_iteration(stats, ns, items):
+    """Yields the items of a generator, timing the work done to produce them.
+
+    The call is recorded once the generator is exhausted or closed, with the
+    number of items it produced as the size.
+    """
+    count = 0
+    try:
+        while True:
+            start = time.perf_counter_ns()
+            try:
+                item = next(items)
+            except StopIteration:
+                ns += time.perf_counter_ns() - start
+                return
+            ns += time.perf_counter_ns() - start
+            count += 1
+            yield item
+    finally:
+        stats.record(ns, count)
+
+
+def _instrument(name, function, counted):
+    stats = _stats.setdefault(name, CallStats())
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        result = function(*args, **kwargs)
+        if isinstance(result, types.GeneratorType):
+            return _timed_iteration(
+                stats, time.perf_counter_ns() - start, result)
+        if counted:
+            if not isinstance(result, (list, tuple)):
+                result = list(result)
+            stats.record(time.perf_counter_ns() - start, len(result))
+        else:
+            stats.record(time.perf_counter_ns() - start)
+        return result
+    return wrapper
+
+
+def _patch(owner, attr, name, counted=False):
+    original = getattr(owner, attr)
+    _originals.append((owner, attr, original))
+    wrapper = _instrument(name, original, counted)
+    setattr(owner, attr, wrapper)
+    return original, wrapper
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def enable():
+    """Starts timing the assignment engine and the public Game methods.
+
+    The functions are replaced by timed wrappers, so nothing is measured, and
+    nothing costs anything, while instrumentation is off. Statistics are kept
+    for the whole process, across all games, until reset is called.
+    """
+    from .game import Game
+    if is_enabled():
+        return
+    for attr in CORE_FUNCTIONS:
+        original, wrapper = _patch(core, attr, 'core.' + attr,
+                                   attr in COUNTED_RESULTS)
+        for strategy, function in list(core.STRATEGIES.items()):
+            if function is original:
+                _originals.append((core.STRATEGIES, strategy, function))
+                core.STRATEGIES[strategy] = wrapper
+    for attr in GAME_METHODS:
+        _patch(Game, attr, 'Game.' + attr)
+
+
+def disable():
+    """Restores the original functions. The statistics are kept."""
+    while _originals:
+        owner, attr, original = _originals.pop()
+        if isinstance(owner, dict):
+            owner[attr] = original
+        else:
+            setattr(owner, attr, original)
+
+
+def reset():
+    for stats in _stats.values():
+        stats.__init__()
+
+
+def snapshot():
+    """Returns the summary of every instrumented function that was called."""
+    return {name: stats.summary()
+            for name, stats in sorted(_stats.items()) if stats.calls}
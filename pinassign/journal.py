@@ -0,0 +1,155 @@
+import json
+import os
+
+from .game import Game, GameError
+
+SNAPSHOT_SUFFIX = '.snapshot'
+
+
+class JournalError(GameError):
+    pass
+
+
+class Journal:
+    """Append-only log of the changes made to a game.
+
+    Every change is written as one JSON line and flushed right away, so it
+    survives the process dying. The file is only fsynced for every
+    sync_every changes, which bounds what can be lost on power failure
+    without paying for a disk sync per score. Every snapshot_every changes a
+    snapshot of the whole game is written next to the journal and the
+    journal is truncated, so recovery never replays more than that many
+    changes.
+    """
+
+    def __init__(self, path, sync_every=20, snapshot_every=500, seq=0):
+        self.path = path
+        self.snapshot_path = path + SNAPSHOT_SUFFIX
+        self.sync_every = sync_every
+        self.snapshot_every = snapshot_every
+        self._seq = seq
+        self._unsynced = 0
+        self._since_snapshot = 0
+        self._file = open(path, 'a')
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def record(self, game, op, args):
+        self._seq += 1
+        self._file.write(json.dumps(
+            {'seq': self._seq, 'time': game.clock(), 'op': op,
+             'args': list(args)}) + '\n')
+        self._file.flush()
+        self._unsynced += 1
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot(game)
+        elif self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def snapshot(self, game):
+        data = game.snapshot()
+        data['seq'] = self._seq
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._file.truncate(0)
+        self._file.seek(0)
+        self._unsynced = 0
+        self._since_snapshot = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+def load(path):
+    """Returns the latest snapshot and the journal entries made after it.
+
+    The snapshot is None if there is none. A last line that was only partly
+    written before a crash is ignored.
+    """
+    snapshot = None
+    if os.path.exists(path + SNAPSHOT_SUFFIX):
+        with open(path + SNAPSHOT_SUFFIX) as f:
+            snapshot = json.load(f)
+    seq = snapshot['seq'] if snapshot is not None else 0
+    entries = []
+    if os.path.exists(path):
+        with open(path) as f:
+            lines = f.read().split('\n')
+        for idx, line in enumerate(lines):
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                if idx == len(lines) - 1:
+                    break
+                raise JournalError(
+                    'Corrupt journal entry on line {}'.format(idx + 1))
+            if entry['seq'] > seq:
+                entries.append(entry)
+    return snapshot, entries
+
+
+def replay(game, entries):
+    """Applies journal entries to a game.
+
+    While an entry is applied, the game's clock reports the time the entry
+    was recorded, so assignment times and observed durations come out the
+    same as they did originally.
+    """
+    clock = game.clock
+    try:
+        for entry in entries:
+            if 'time' in entry:
+                game.clock = lambda t=entry['time']: t
+            result = getattr(game, entry['op'])(*entry['args'])
+            if result is not None:
+                list(result)
+    finally:
+        game.clock = clock
+
+
+def open_game(path, r=None, sync_every=20, snapshot_every=500,
+              estimator=None):
+    """Opens a journaled game, recovering it if the journal already exists.
+
+    The latest snapshot is loaded and only the journal entries written after
+    it are replayed. The recovered game then continues writing to the same
+    journal. The estimator is only used for new games; a recovered game
+    keeps the estimator it was journaled with.
+    """
+    snapshot, entries = load(path)
+    if snapshot is None and entries:
+        raise JournalError(
+            'The journal {} has no snapshot to replay from'.format(path))
+    if snapshot is None:
+        game = Game(estimator=estimator) if r is None else Game(
+            r, estimator=estimator)
+        seq = 0
+    else:
+        game = Game.from_snapshot(snapshot, r)
+        seq = snapshot['seq']
+    replay(game, entries)
+    if entries:
+        seq = entries[-1]['seq']
+    game.set_journal(Journal(path, sync_every, snapshot_every, seq))
+    return game
+
+
+def remove(path):
+    for p in (path, path + SNAPSHOT_SUFFIX):
+        if os.path.exists(p):
+            os.remove(p)
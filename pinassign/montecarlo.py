@@ -0,0 +1,251 @@
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import random
+
+from . import bulk, durations as duration_models
+from .core import STRATEGIES, Player, machine_bank
+from .simulation import expected_duration, simulate
+
+BatchResult = collections.namedtuple(
+    'BatchResult', ['runs', 'makespans', 'percentiles', 'mean_makespan',
+                    'mean_idle_times', 'idle_percentiles'])
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95, 99)
+
+
+def run_seeds(base_seed, runs):
+    r = random.Random(base_seed)
+    return [r.getrandbits(64) for _ in range(runs)]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return (sorted_values[low] +
+            (sorted_values[high] - sorted_values[low]) * (pos - low))
+
+
+def _run_chunk(machine_specs, player_names, seeds, strategy, durations,
+               copies):
+    makespans = []
+    idle_times = []
+    idle_totals = dict.fromkeys(player_names, 0)
+    for seed in seeds:
+        machines = [m for name, t in machine_specs
+                    for m in machine_bank(name, t, copies.get(name, 1))]
+        players = [Player(name) for name in player_names]
+        r = random.Random(seed)
+        duration = expected_duration
+        if durations is not None:
+            duration = durations.draw(
+                machines, players, random.Random(r.getrandbits(64)))
+        result = simulate(machines, players, r, duration,
+                          strategy=STRATEGIES[strategy])
+        makespans.append(result.makespan)
+        playing = dict.fromkeys(player_names, 0)
+        for a in result.trace:
+            playing[a.player] += a.end - a.start
+        for name in player_names:
+            idle = result.finish_times[name] - playing[name]
+            idle_totals[name] += idle
+            idle_times.append(idle)
+    return makespans, idle_totals, idle_times
+
+
+def _chunks(seq, count):
+    size, extra = divmod(len(seq), count)
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            yield seq[start:end]
+        start = end
+
+
+def run_batch(machine_specs, player_names, runs, workers=1, seed=0,
+              percentiles=DEFAULT_PERCENTILES, strategy='greedy',
+              durations=None, copies=None):
+    """Simulates many independent tournaments and aggregates the outcome.
+
+    machine_specs is a sequence of (name, expected time) pairs. Each run gets
+    its own seed derived from the base seed, so the results do not depend on
+    the number of workers. Runs are split into one chunk per worker, and only
+    the makespans and the idle times are sent back from each chunk.
+
+    durations is a DurationModel for the play times; by default every game
+    takes the expected time of the machine. Besides the makespan, the
+    percentiles of the total time each player spends waiting are given, over
+    all players in all runs.
+
+    copies maps machine names to the number of copies of them, for machines
+    that are banks of more than one copy.
+    """
+    machine_specs = [(name, t) for name, t in machine_specs]
+    copies = dict(copies or {})
+    player_names = list(player_names)
+    chunks = list(_chunks(run_seeds(seed, runs), max(workers, 1)))
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(
+                    _run_chunk, machine_specs, player_names, c, strategy,
+                    durations, copies)
+                for c in chunks]
+            partials = [f.result() for f in futures]
+    else:
+        partials = [_run_chunk(machine_specs, player_names, c, strategy,
+                               durations, copies)
+                    for c in chunks]
+    makespans = []
+    idle_times = []
+    idle_totals = dict.fromkeys(player_names, 0)
+    for chunk_makespans, chunk_idle, chunk_idle_times in partials:
+        makespans.extend(chunk_makespans)
+        idle_times.extend(chunk_idle_times)
+        for name, idle in chunk_idle.items():
+            idle_totals[name] += idle
+    makespans.sort()
+    idle_times.sort()
+    return BatchResult(
+        runs,
+        makespans,
+        collections.OrderedDict(
+            (q, percentile(makespans, q)) for q in percentiles),
+        sum(makespans) / runs if runs else None,
+        {name: idle / runs for name, idle in idle_totals.items()}
+        if runs else {},
+        collections.OrderedDict(
+            (q, percentile(idle_times, q)) for q in percentiles))
+
+
+def parse_machine_spec(s):
+    name, sep, expected_time = s.rpartition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(
+            'Invalid machine: {} (expected NAME=EXPECTEDTIME)'.format(s))
+    try:
+        return (name, float(expected_time))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Invalid expected time: {}'.format(expected_time))
+
+
+def parse_copies_spec(s):
+    name, sep, copies = s.rpartition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(
+            'Invalid copies: {} (expected NAME=COPIES)'.format(s))
+    try:
+        copies = int(copies)
+    except ValueError:
+        copies = 0
+    if copies < 1:
+        raise argparse.ArgumentTypeError(
+            'Invalid number of copies: {}'.format(s))
+    return (name, copies)
+
+
+def parse_distribution(s):
+    try:
+        return duration_models.parse_distribution(s)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def run_montecarlo(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Simulate many tournaments and summarize the makespan.')
+    parser.add_argument('-m', '--machine', dest='machines', action='append',
+                        type=parse_machine_spec, required=True,
+                        help='A machine as NAME=EXPECTEDTIME (repeatable)')
+    parser.add_argument('-p', '--players', type=int, required=True,
+                        help='Number of players')
+    parser.add_argument('-c', '--copies', action='append',
+                        type=parse_copies_spec,
+                        help='Make a machine a bank of copies, as '
+                             'NAME=COPIES (repeatable). Every run is '
+                             'simulated both with and without the copies')
+    parser.add_argument('-n', '--runs', type=int, default=1000,
+                        help='Number of simulated tournaments')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of worker processes')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='Base seed for the simulated tournaments')
+    parser.add_argument('-S', '--strategy', dest='strategies',
+                        action='append', choices=sorted(STRATEGIES),
+                        help='Assignment strategy to simulate (repeatable '
+                             'to compare strategies, default: greedy)')
+    parser.add_argument('-D', '--durations', dest='distributions',
+                        action='append', type=parse_distribution,
+                        help='Play time distribution as fixed, lognormal:CV '
+                             'or gamma:CV, where CV is the coefficient of '
+                             'variation (repeatable to compare models, '
+                             'default: fixed)')
+    parser.add_argument('--player-cv', type=float, default=0,
+                        help='Variation in speed between players, as the '
+                             'coefficient of variation of a lognormal '
+                             'factor per player (default: 0)')
+    parser.add_argument('--recorded', metavar='FILE',
+                        help='CSV or JSON file of recorded play times, as '
+                             'machine and duration, to fit the machines in '
+                             'it to')
+    parser.add_argument('--fit', choices=sorted(duration_models.FITS),
+                        default='empirical',
+                        help='Distribution to fit to the recorded play '
+                             'times (default: empirical)')
+    args = parser.parse_args(argv)
+    player_names = [str(i + 1) for i in range(args.players)]
+    machine_names = {name for name, _ in args.machines}
+    for name, _ in args.copies or []:
+        if name not in machine_names:
+            parser.error('Unknown machine for copies: {}'.format(name))
+    banks = [None]
+    if args.copies:
+        banks.append(dict(args.copies))
+    fitted = {}
+    if args.recorded is not None:
+        try:
+            recorded = bulk.load_durations(args.recorded)
+            fitted = {name: duration_models.FITS[args.fit](durations)
+                      for name, durations in recorded.items()}
+        except (bulk.LoadError, ValueError) as e:
+            parser.exit(1, 'Cannot fit play times: {}\n'.format(e))
+    distributions = args.distributions or [duration_models.Fixed()]
+    models = [
+        duration_models.DurationModel(d, fitted, player_cv=args.player_cv)
+        for d in distributions]
+    for strategy, model, copies in itertools.product(
+            args.strategies or ['greedy'], models, banks):
+        durations = None
+        if model.machines or model.player_cv or not isinstance(
+                model.default, duration_models.Fixed):
+            durations = model
+        result = run_batch(args.machines, player_names, args.runs,
+                           args.workers, args.seed, strategy=strategy,
+                           durations=durations, copies=copies)
+        print('Strategy: {}'.format(strategy))
+        print('Play times: {}'.format(model))
+        if args.copies:
+            print('Copies: {}'.format(', '.join(
+                '{} x{}'.format(name, count)
+                for name, count in sorted(copies.items()))
+                if copies else 'none'))
+        print('Runs: {}'.format(result.runs))
+        print('Mean makespan: {:.2f}'.format(result.mean_makespan))
+        for q, value in result.percentiles.items():
+            print('p{}: {:.2f}'.format(q, value))
+        idle = sorted(result.mean_idle_times.values())
+        print('Mean idle time per player: {:.2f} '
+              '(min {:.2f}, max {:.2f})'.format(
+                  sum(idle) / len(idle), idle[0], idle[-1]))
+        print('Idle time per player: {}'.format(', '.join(
+            'p{} {:.2f}'.format(q, value)
+            for q, value in result.idle_percentiles.items())))
+
+if __name__ == '__main__':
+    run_montecarlo()
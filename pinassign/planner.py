@@ -0,0 +1,297 @@
+import argparse
+import collections
+import csv
+import heapq
+import json
+import random
+import time
+
+from . import forecast
+from .core import STRATEGIES, Machine, Player, ScoreIndex
+from .game import GameError
+from .montecarlo import parse_machine_spec
+from .simulation import Assignment, simulate
+
+Plan = collections.namedtuple(
+    'Plan', ['assignments', 'makespan', 'lower_bound', 'online_makespan',
+             'list_makespan', 'iterations'])
+
+
+def list_schedule(times, player_count, titles=None, quota=None):
+    """Builds a schedule by list scheduling with longest remaining work first.
+
+    Whenever machines are free, they are visited in order of the most work
+    they have left, and each gets the free player with the most work left
+    among those who still need it. Ties go to the lowest index. Returns the
+    order in which each machine is played by the players, as lists of player
+    indices.
+
+    Machines with the same title are copies, and every player plays only
+    one of them. The work left on a title is shared between its copies.
+
+    With a quota, every player only plays that many titles, and the work
+    left on a player is the number of games they still need. A title that
+    has its share of the games (the games needed divided by the number of
+    titles, rounded up) is only given to players who could not reach the
+    quota without it.
+    """
+    machine_count = len(times)
+    titles = list(range(machine_count)) if titles is None else titles
+    banks = {}
+    for m, title in enumerate(titles):
+        banks.setdefault(title, []).append(m)
+    if quota is None:
+        total = sum(times[copies[0]] for copies in banks.values())
+        player_left = [total] * player_count
+        share = player_count
+    else:
+        need = min(quota, len(banks))
+        player_left = [need] * player_count
+        share = -(-player_count * need // len(banks))
+    title_left = {title: times[copies[0]] * share / len(copies)
+                  for title, copies in banks.items()}
+    machine_left = [title_left[title] for title in titles]
+    unplayed_titles = {title: set(range(player_count)) for title in banks}
+    unplayed = [unplayed_titles[title] for title in titles]
+    plays = dict.fromkeys(banks, 0)
+
+    def allowed(p, title):
+        if quota is None or plays[title] < share:
+            return True
+        others = sum(1 for t in banks if t != title and plays[t] < share and
+                     p in unplayed_titles[t])
+        return others < player_left[p]
+
+    player_ready = [True] * player_count
+    free_machines = list(range(machine_count))
+    sequences = [[] for _ in range(machine_count)]
+    pending = []
+    now = 0
+    while True:
+        free_machines.sort(key=lambda m: (-machine_left[m], m))
+        waiting = []
+        for m in free_machines:
+            best = None
+            for p in unplayed[m]:
+                if player_ready[p] and allowed(p, titles[m]) and (
+                        best is None or player_left[p] > player_left[best] or
+                        (player_left[p] == player_left[best] and p < best)):
+                    best = p
+            if best is None:
+                if unplayed[m]:
+                    waiting.append(m)
+                continue
+            unplayed[m].discard(best)
+            player_ready[best] = False
+            plays[titles[m]] += 1
+            if quota is None:
+                player_left[best] -= times[m]
+            else:
+                player_left[best] -= 1
+                if not player_left[best]:
+                    for players in unplayed_titles.values():
+                        players.discard(best)
+            for copy in banks[titles[m]]:
+                machine_left[copy] -= times[m] / len(banks[titles[m]])
+            sequences[m].append(best)
+            heapq.heappush(pending, (now + times[m], m, best))
+        free_machines = waiting
+        if not pending:
+            return sequences
+        now, m, p = heapq.heappop(pending)
+        finished = [(m, p)]
+        while pending and pending[0][0] == now:
+            _, m, p = heapq.heappop(pending)
+            finished.append((m, p))
+        for m, p in finished:
+            player_ready[p] = True
+            if unplayed[m]:
+                free_machines.append(m)
+
+
+def decode(sequences, times, player_count):
+    """Turns the order of players on every machine into a timeline.
+
+    Every machine plays its players in the given order, starting each game
+    as soon as both the machine and the player are free. A player wanted by
+    several machines at once goes to the one that has waited longest.
+    Returns the games as (machine, player, start, end) tuples in order of
+    their start times.
+    """
+    position = [0] * len(sequences)
+    player_busy = [False] * player_count
+    waiting = collections.defaultdict(collections.deque)
+    pending = []
+    games = []
+
+    def start(m, p, now):
+        player_busy[p] = True
+        position[m] += 1
+        end = now + times[m]
+        games.append((m, p, now, end))
+        heapq.heappush(pending, (end, m, p))
+
+    def advance(m, now):
+        if position[m] < len(sequences[m]):
+            p = sequences[m][position[m]]
+            if player_busy[p]:
+                waiting[p].append(m)
+            else:
+                start(m, p, now)
+
+    for m in range(len(sequences)):
+        advance(m, 0)
+    while pending:
+        now, m, p = heapq.heappop(pending)
+        player_busy[p] = False
+        if waiting[p]:
+            start(waiting[p].popleft(), p, now)
+        advance(m, now)
+    return games
+
+
+def _evaluate(games):
+    makespan = 0
+    finish = {}
+    for m, p, start, end in games:
+        makespan = max(makespan, end)
+        finish[p] = max(finish.get(p, 0), end)
+    return makespan, sum(finish.values())
+
+
+def improve(sequences, times, player_count, lower_bound, seconds=2.0,
+            max_iterations=1000, r=None):
+    """Improves a schedule by local search on the order of every machine.
+
+    Every move takes the game that finishes last, or another game of the
+    same player, and plays it earlier on its machine. A move is kept if it
+    lowers the makespan, or keeps it and lowers the sum of the finish times
+    of the players. The search stops when the lower bound is reached, or
+    after the given number of seconds or iterations. Returns the best
+    sequences, their timeline and the number of iterations run.
+    """
+    r = random.Random(0) if r is None else r
+    best = [list(seq) for seq in sequences]
+    games = decode(best, times, player_count)
+    score = _evaluate(games)
+    deadline = time.perf_counter() + seconds
+    iterations = 0
+    while (iterations < max_iterations and score[0] > lower_bound and
+           time.perf_counter() < deadline):
+        iterations += 1
+        last_m, last_p, _, _ = max(games, key=lambda g: g[3])
+        if r.random() < 0.5:
+            m = last_m
+        else:
+            m = r.choice([g[0] for g in games if g[1] == last_p])
+        seq = best[m]
+        idx = seq.index(last_p) if last_p in seq else len(seq) - 1
+        if idx == 0:
+            continue
+        candidate = [list(s) for s in best]
+        moved = candidate[m].pop(idx)
+        candidate[m].insert(r.randrange(idx), moved)
+        candidate_games = decode(candidate, times, player_count)
+        candidate_score = _evaluate(candidate_games)
+        if candidate_score < score:
+            best, games, score = candidate, candidate_games, candidate_score
+    return best, games, iterations
+
+
+def plan(machine_specs, player_names, seconds=2.0, max_iterations=1000,
+         strategy='greedy', seed=0, quota=None):
+    """Builds a complete timeline for a tournament before it starts.
+
+    machine_specs is a sequence of (name, expected time) pairs, or of
+    (name, expected time, title) triples for copies of a title. The schedule
+    is built by list scheduling with longest remaining work first and then
+    improved by local search. Its makespan is compared with the lower bound
+    and with a simulation of the online assignment strategy, assuming every
+    game takes the expected time. With a quota, every player only plays
+    that many titles.
+    """
+    machine_specs = [tuple(spec) for spec in machine_specs]
+    player_names = list(player_names)
+    times = [spec[1] for spec in machine_specs]
+    machines = [Machine(*spec[:2], title=spec[2] if len(spec) > 2 else None)
+                for spec in machine_specs]
+    players = [Player(name) for name in player_names]
+    scores = ScoreIndex(machines, players, quota)
+    bound = forecast.lower_bound(machines, players, scores, [])
+    online = simulate(machines, players, random.Random(seed),
+                      strategy=STRATEGIES[strategy], quota=quota)
+    sequences = list_schedule(times, len(player_names),
+                              [m.title for m in machines], quota)
+    list_makespan = _evaluate(decode(sequences, times, len(player_names)))[0]
+    sequences, games, iterations = improve(
+        sequences, times, len(player_names), bound, seconds, max_iterations,
+        random.Random(seed))
+    assignments = [
+        Assignment(machine_specs[m][0], player_names[p], start, end)
+        for m, p, start, end in sorted(games, key=lambda g: (g[2], g[0]))]
+    return Plan(assignments, _evaluate(games)[0], bound, online.makespan,
+                list_makespan, iterations)
+
+
+def plan_game(game, seconds=2.0, max_iterations=1000, seed=0):
+    """Builds a complete timeline for the machines and players of a game."""
+    if not game.machines or not game.players:
+        raise GameError('There must be at least one machine and one player')
+    return plan([(m.name, m.expected_time, m.title) for m in game.machines],
+                [p.name for p in game.players], seconds, max_iterations,
+                game.strategy, seed, game.quota)
+
+
+def export(plan, path):
+    """Writes the timeline of a plan to a JSON file, or otherwise CSV."""
+    with open(path, 'w', newline='') as f:
+        if path.lower().endswith('.json'):
+            json.dump({'makespan': plan.makespan,
+                       'lower_bound': plan.lower_bound,
+                       'assignments': [a._asdict()
+                                       for a in plan.assignments]},
+                      f, indent=2)
+        else:
+            writer = csv.writer(f)
+            writer.writerow(Assignment._fields)
+            writer.writerows(plan.assignments)
+
+
+def print_summary(plan):
+    print('Games: {}'.format(len(plan.assignments)))
+    print('Lower bound: {:.1f}'.format(plan.lower_bound))
+    print('Planned makespan: {:.1f} (list scheduling {:.1f}, improved in {} '
+          'iterations)'.format(plan.makespan, plan.list_makespan,
+                               plan.iterations))
+    print('Online assignment makespan: {:.1f}'.format(plan.online_makespan))
+
+
+def run_planner(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Plan the complete timeline of a tournament in advance.')
+    parser.add_argument('-m', '--machine', dest='machines', action='append',
+                        type=parse_machine_spec, required=True,
+                        help='A machine as NAME=EXPECTEDTIME (repeatable)')
+    parser.add_argument('-p', '--players', type=int, required=True,
+                        help='Number of players')
+    parser.add_argument('-t', '--seconds', type=float, default=2.0,
+                        help='Time limit for improving the schedule '
+                             '(default: 2)')
+    parser.add_argument('-S', '--strategy', choices=sorted(STRATEGIES),
+                        default='greedy',
+                        help='Online strategy to compare with')
+    parser.add_argument('-k', '--quota', type=int, metavar='K',
+                        help='Every player only plays K of the machines')
+    parser.add_argument('-o', '--output', metavar='FILE', action='append',
+                        help='Write the timeline to FILE, as JSON if it ends '
+                             'with .json and as CSV otherwise (repeatable)')
+    args = parser.parse_args(argv)
+    player_names = [str(i + 1) for i in range(args.players)]
+    result = plan(args.machines, player_names, args.seconds,
+                  strategy=args.strategy, quota=args.quota)
+    print_summary(result)
+    for path in args.output or []:
+        export(result, path)
+
+if __name__ == '__main__':
+    run_planner()
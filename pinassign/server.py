@@ -0,0 +1,444 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import urllib.parse
+
+from . import journal
+from .game import *
+
+JOURNAL_SUFFIX = '.journal'
+
+REASONS = {
+    200: 'OK',
+    201: 'Created',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    409: 'Conflict',
+    411: 'Length Required',
+    500: 'Internal Server Error',
+}
+
+MAX_BODY = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def error_status(e):
+    if isinstance(e, (UnknownMachineError, UnknownPlayerError,
+                      UnknownScoreError)):
+        return 404
+    elif isinstance(e, (DuplicateMachineError, DuplicatePlayerError,
+                        DuplicateScoreError)):
+        return 409
+    return 400
+
+
+def assignment_list(assignments):
+    return [{'machine': m.name, 'player': p.name} for m, p in assignments]
+
+
+def machine_list(game):
+    return [{'name': m.name, 'expected_time': m.expected_time,
+             'ready': m.ready, 'title': m.title} for m in game.machines]
+
+
+def player_list(game):
+    return [{'name': p.name, 'expected_time_spent': p.expected_time_spent,
+             'ready': p.ready} for p in game.players]
+
+
+def current_assignments(game):
+    """Returns the games being played, in the order they were started."""
+    machines = {m.id: m for m in game.machines}
+    players = {p.id: p for p in game.players}
+    playing = []
+    for (machine_id, player_id), start in sorted(
+            game.started.items(), key=lambda item: item[1]):
+        m = machines.get(machine_id)
+        p = players.get(player_id)
+        if (m is None or p is None or m.ready or p.ready or
+                game.scores.has_played(m, p)):
+            continue
+        playing.append({'machine': m.name, 'player': p.name, 'start': start})
+    return playing
+
+
+def game_state(game):
+    """Returns everything a display board shows about a game."""
+    return {
+        'running': game.is_running,
+        'machines': machine_list(game),
+        'players': player_list(game),
+        'scores': [{'machine': s.machine.name, 'player': s.player.name}
+                   for s in game.scores],
+        'assignments': current_assignments(game),
+    }
+
+
+def game_status(name, game):
+    status = {
+        'name': name,
+        'running': game.is_running,
+        'strategy': game.strategy,
+        'quota': game.quota,
+        'machines': len(game.machines),
+        'players': len(game.players),
+        'scores': len(game.scores),
+    }
+    status['finished'] = game.is_running and game.is_finished()
+    return status
+
+
+class GameServer:
+    """Hosts many named games behind a small HTTP/JSON interface.
+
+    Every request is handled on the event loop, and a handler never awaits
+    while it is using a game. Changes to a game are therefore applied one at
+    a time in the order they arrive, and reads always see a game between two
+    changes. Requests for different games, and reads of the same game, are
+    served concurrently with each other; no request waits for another one
+    unless they both change the same game.
+
+    If a journal directory is given, every game is journaled to its own file
+    there and the games found in the directory are recovered on startup.
+    """
+
+    def __init__(self, journal_dir=None):
+        self.journal_dir = journal_dir
+        self.games = {}
+        self.routes = [
+            ('GET', ('games',), self.list_games),
+            ('PUT', ('games', None), self.create_game),
+            ('GET', ('games', None), self.get_game),
+            ('DELETE', ('games', None), self.delete_game),
+            ('GET', ('games', None, 'machines'), self.list_machines),
+            ('POST', ('games', None, 'machines'), self.add_machine),
+            ('DELETE', ('games', None, 'machines', None), self.remove_machine),
+            ('PUT', ('games', None, 'machines', None, 'ready'),
+             self.set_machine_ready),
+            ('GET', ('games', None, 'players'), self.list_players),
+            ('POST', ('games', None, 'players'), self.add_player),
+            ('DELETE', ('games', None, 'players', None), self.remove_player),
+            ('PUT', ('games', None, 'players', None, 'ready'),
+             self.set_player_ready),
+            ('POST', ('games', None, 'scores'), self.add_score),
+            ('DELETE', ('games', None, 'scores', None, None),
+             self.remove_score),
+            ('POST', ('games', None, 'start'), self.start),
+            ('GET', ('games', None, 'assignments'), self.list_assignments),
+            ('POST', ('games', None, 'assignments'), self.assign),
+            ('GET', ('games', None, 'changes', None), self.list_changes),
+        ]
+        if journal_dir is not None:
+            self._recover_games()
+
+    def dispatch(self, method, path, body):
+        """Handles one request and returns the status and the JSON result."""
+        parts = [urllib.parse.unquote(part)
+                 for part in path.split('?', 1)[0].strip('/').split('/')]
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            if len(pattern) != len(parts) or any(
+                    p is not None and p != part
+                    for p, part in zip(pattern, parts)):
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            args = [part for p, part in zip(pattern, parts) if p is None]
+            try:
+                return handler(body, *args)
+            except GameError as e:
+                raise HttpError(error_status(e), str(e))
+            except HttpError:
+                raise
+            except Exception:
+                logger.exception('Failed to handle %s %s', method, path)
+                raise HttpError(500, 'Internal server error')
+        if allowed:
+            raise HttpError(405, 'Method {} not allowed for {}'.format(
+                method, path))
+        raise HttpError(404, 'No such resource: {}'.format(path))
+
+    def close(self):
+        for game in self.games.values():
+            if game.journal is not None:
+                game.journal.close()
+
+    def list_games(self, body):
+        return 200, [game_status(name, game)
+                     for name, game in sorted(self.games.items())]
+
+    def create_game(self, body, name):
+        if name in self.games:
+            raise HttpError(409, 'The game {} already exists'.format(name))
+        # Every game draws its ties from its own generator, so that a game
+        # replayed from its journal makes the same draws as it did live.
+        game = Game(random.Random(),
+                    strategy=self._get_string(body, 'strategy', 'greedy'),
+                    quota=body.get('quota'))
+        if self.journal_dir is not None:
+            game.set_journal(journal.Journal(self._journal_path(name)))
+        self.games[name] = game
+        return 201, game_status(name, game)
+
+    def get_game(self, body, name):
+        return 200, game_status(name, self._get_game(name))
+
+    def delete_game(self, body, name):
+        game = self._get_game(name)
+        del self.games[name]
+        if game.journal is not None:
+            game.journal.close()
+            journal.remove(self._journal_path(name))
+        return 200, {}
+
+    def list_machines(self, body, name):
+        return 200, machine_list(self._get_game(name))
+
+    def add_machine(self, body, name):
+        expected_time = body.get('expected_time')
+        if not isinstance(expected_time, (int, float)):
+            raise HttpError(400, 'The expected time must be a number')
+        self._get_game(name).add_machine(
+            self._get_string(body, 'name'), expected_time,
+            body.get('copies', 1))
+        return 201, {}
+
+    def remove_machine(self, body, name, machine_name):
+        self._get_game(name).remove_machine(machine_name)
+        return 200, {}
+
+    def set_machine_ready(self, body, name, machine_name):
+        self._get_game(name).set_machine_ready(
+            machine_name, self._get_ready(body))
+        return 200, {}
+
+    def list_players(self, body, name):
+        return 200, player_list(self._get_game(name))
+
+    def add_player(self, body, name):
+        self._get_game(name).add_player(self._get_string(body, 'name'))
+        return 201, {}
+
+    def remove_player(self, body, name, player_name):
+        self._get_game(name).remove_player(player_name)
+        return 200, {}
+
+    def set_player_ready(self, body, name, player_name):
+        self._get_game(name).set_player_ready(
+            player_name, self._get_ready(body))
+        return 200, {}
+
+    def add_score(self, body, name):
+        game = self._get_game(name)
+        assignments = game.add_score(self._get_string(body, 'machine'),
+                                     self._get_string(body, 'player'))
+        return 201, {'assignments': assignment_list(assignments),
+                     'finished': game.is_finished()}
+
+    def remove_score(self, body, name, machine_name, player_name):
+        self._get_game(name).remove_score(machine_name, player_name)
+        return 200, {}
+
+    def start(self, body, name):
+        return 200, {'assignments': assignment_list(
+            self._get_game(name).start())}
+
+    def list_assignments(self, body, name):
+        return 200, current_assignments(self._get_game(name))
+
+    def assign(self, body, name):
+        return 200, {'assignments': assignment_list(
+            self._get_game(name).assign())}
+
+    def list_changes(self, body, name, since):
+        """Returns the changes made since the given sequence number.
+
+        If the client has fallen too far behind, the full state of the game
+        is returned instead of the changes. Either way, seq is the number to
+        ask from next time.
+        """
+        game = self._get_game(name)
+        try:
+            since = int(since)
+        except ValueError:
+            raise HttpError(400, 'Invalid sequence number: {}'.format(since))
+        changes = game.feed.since(since)
+        if changes is None:
+            return 200, {'seq': game.feed.seq, 'state': game_state(game)}
+        # The feed may have moved on since, so seq is taken from the changes.
+        return 200, {'seq': changes[-1].seq if changes else since,
+                     'changes': [{'seq': c.seq, 'op': c.op,
+                                  'args': list(c.args)} for c in changes]}
+
+    def _get_game(self, name):
+        game = self.games.get(name)
+        if game is None:
+            raise HttpError(404, 'Game {} not found'.format(name))
+        return game
+
+    def _get_string(self, body, key, default=None):
+        value = body.get(key, default)
+        if value is not None and not isinstance(value, str):
+            raise HttpError(400, '{} must be a string'.format(key))
+        return value
+
+    def _get_ready(self, body):
+        ready = body.get('ready')
+        if not isinstance(ready, bool):
+            raise HttpError(400, 'ready must be true or false')
+        return ready
+
+    def _journal_path(self, name):
+        return os.path.join(
+            self.journal_dir,
+            urllib.parse.quote(name, safe='') + JOURNAL_SUFFIX)
+
+    def _recover_games(self):
+        for filename in sorted(os.listdir(self.journal_dir)):
+            if not filename.endswith(JOURNAL_SUFFIX):
+                continue
+            name = urllib.parse.unquote(filename[:-len(JOURNAL_SUFFIX)])
+            self.games[name] = journal.open_game(
+                os.path.join(self.journal_dir, filename))
+
+
+async def read_request(reader):
+    """Reads one HTTP request and returns its method, path, headers and body.
+
+    Returns None if the connection was closed before a new request started.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, 'Invalid request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, sep, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    length = headers.get('content-length')
+    body = b''
+    if length is not None:
+        try:
+            length = int(length)
+        except ValueError:
+            raise HttpError(400, 'Invalid Content-Length')
+        if length > MAX_BODY:
+            raise HttpError(400, 'Request body too large')
+        body = await reader.readexactly(length)
+    elif 'transfer-encoding' in headers:
+        raise HttpError(411, 'Chunked request bodies are not supported')
+    keep_alive = headers.get('connection', '').lower() != 'close' and (
+        version == 'HTTP/1.1' or
+        headers.get('connection', '').lower() == 'keep-alive')
+    return method, path, body, keep_alive
+
+
+def parse_body(body):
+    if not body:
+        return {}
+    try:
+        data = json.loads(body.decode('utf-8'))
+    except ValueError:
+        raise HttpError(400, 'The request body is not valid JSON')
+    if not isinstance(data, dict):
+        raise HttpError(400, 'The request body must be a JSON object')
+    return data
+
+
+def write_response(writer, status, result, keep_alive):
+    body = json.dumps(result).encode('utf-8')
+    writer.write(
+        'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n'
+        'Content-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+            status, REASONS[status], len(body),
+            'keep-alive' if keep_alive else 'close').encode('latin-1') + body)
+
+
+async def handle_connection(server, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                status, result = server.dispatch(
+                    method, path, parse_body(body))
+            except HttpError as e:
+                status, result = e.status, {'error': str(e)}
+            write_response(writer, status, result, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(server, host, port, ready=None):
+    """Serves the games of a GameServer until cancelled.
+
+    ready is called with the listening socket's address once the server
+    accepts connections.
+    """
+    listener = await asyncio.start_server(
+        lambda reader, writer: handle_connection(server, reader, writer),
+        host, port)
+    if ready is not None:
+        ready(listener.sockets[0].getsockname())
+    try:
+        await listener.serve_forever()
+    finally:
+        listener.close()
+        server.close()
+
+
+def run_server(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve many pinball tournaments over HTTP/JSON.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port to listen on (default: 8080)')
+    parser.add_argument('--journal-dir', metavar='DIR',
+                        help='Journal every game to a file in DIR, and '
+                             'recover the games already journaled there')
+    args = parser.parse_args(argv)
+    if args.journal_dir is not None:
+        os.makedirs(args.journal_dir, exist_ok=True)
+    try:
+        server = GameServer(args.journal_dir)
+    except journal.JournalError as e:
+        parser.exit(1, 'Cannot recover games: {}\n'.format(e))
+
+    def ready(address):
+        print('Serving {} games on http://{}:{}/'.format(
+            len(server.games), address[0], address[1]), flush=True)
+    try:
+        asyncio.run(serve(server, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    run_server()
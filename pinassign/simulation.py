@@ -1,6 +1,18 @@
+import argparse
+import collections
+import heapq
+import json
 import random
+import sys
+
+from .core import *
+
+Assignment = collections.namedtuple(
+    'Assignment', ['machine', 'player', 'start', 'end'])
+
+SimulationResult = collections.namedtuple(
+    'SimulationResult', ['makespan', 'finish_times', 'trace', 'finished'])
 
-from .pinassign import *
 
 def default_machines():
     return [
@@ -17,29 +29,332 @@ def default_players():
         Player('5'),
     ]
 
-def simulate(machines=default_machines(), players=default_players(), r=random.Random()):
-    scores = []
-    current_pairings = []
-    time_taken = 0
-    assigned = assign_players(machines, players, scores, r)
-    for pairing in assigned:
-        current_pairings.append((pairing, time_taken))
-    while not is_everyone_finished(machines, players, scores):
-        print('Time passed: {}'.format(time_taken))
-        if time_taken % 10 == 0:
-            print('Status at {}:'.format(time_taken))
-            print('  Finished machines:')
-            for score in sorted(scores, key=lambda s: (s.machine.name, s.player.name)):
-                print('  - {} has finished {}'.format(score.player, score.machine))
-            print('  Current pairings:')
-            for ((m, p), t) in current_pairings:
-                print('  - {} is playing {} (started at {})'.format(p, m, t))
-        time_taken += 1
-        next_pairings = [((m, p), t) for (m, p), t in current_pairings if m.expected_time > time_taken - t]
-        for (m, p), t in (((m, p), t) for (m, p), t in current_pairings if m.expected_time <= time_taken - t):
-            print('{} finished {} at {} (started at {})'.format(p, m, time_taken, t))
-            new_pairings = player_finished_machine(m, p, machines, players, scores, r)
-            for new_m, new_p in new_pairings:
-                print('{} assigned to {} at {}'.format(new_p, new_m, time_taken))
-                next_pairings.append(((new_m, new_p), time_taken))
-        current_pairings = next_pairings
+def expected_duration(machine, player):
+    return machine.expected_time
+
+
+AssignedEvent = collections.namedtuple(
+    'AssignedEvent', ['time', 'machine', 'player'])
+
+FinishedEvent = collections.namedtuple(
+    'FinishedEvent', ['time', 'machine', 'player', 'start'])
+
+IdleEvent = collections.namedtuple(
+    'IdleEvent', ['time', 'machine', 'player'])
+
+StatusEvent = collections.namedtuple(
+    'StatusEvent', ['time', 'games', 'in_progress'])
+
+DoneEvent = collections.namedtuple('DoneEvent', ['time', 'finished'])
+
+EVENT_KINDS = {
+    AssignedEvent: 'assigned',
+    FinishedEvent: 'finished',
+    IdleEvent: 'idle',
+    StatusEvent: 'status',
+    DoneEvent: 'done',
+}
+
+
+def events(machines=None, players=None, r=None, duration=expected_duration,
+           strategy=assign_players, scores=None, busy=(), max_games=None,
+           status_interval=None, quota=None):
+    """Simulates a tournament, yielding what happens as it happens.
+
+    Instead of advancing a clock one unit at a time, the finish time of every
+    ongoing game is kept in a heap and the simulation jumps straight to the
+    next one, so the running time depends on the number of games rather than
+    on the length of the tournament. The duration function is called with the
+    machine and the player for every assignment and may return fractional
+    times.
+
+    The events are, in order of time:
+
+    - AssignedEvent when a player starts a game;
+    - FinishedEvent when a game is finished;
+    - IdleEvent when a machine or a player is left without a game, although
+      the machine still has players to serve or the player still has
+      machines to play. Either the machine or the player may be None;
+    - StatusEvent every status_interval time units, if given, with the
+      number of finished games and the (machine, player, start time) of the
+      games in progress;
+    - DoneEvent at the end, telling whether everyone has finished.
+
+    Nothing is kept for the events that have been yielded, so the memory
+    used does not grow with the length of the tournament.
+
+    To continue from a tournament in progress, pass the scores registered so
+    far and the games being played as (machine, player, start time, finish
+    time) tuples. The machines and players in those games must already be
+    marked busy. With max_games, the simulation stops after that many games
+    have finished. With a quota, every player only plays that many machines
+    (see ScoreIndex); it is ignored when scores are given.
+    """
+    machines = default_machines() if machines is None else machines
+    players = default_players() if players is None else players
+    r = random.Random() if r is None else r
+    if scores is None:
+        scores = ScoreIndex(machines, players, quota)
+    queue = PlayerQueue(players)
+    queue.track_machines(machines)
+    pending = []
+    for counter, (m, p, start, end) in enumerate(busy):
+        heapq.heappush(pending, (end, counter, m, p, start))
+    counter = len(pending)
+    next_status = status_interval
+
+    def start_games(assigned, time):
+        nonlocal counter
+        for m, p in assigned:
+            end = time + duration(m, p)
+            heapq.heappush(pending, (end, counter, m, p, time))
+            counter += 1
+            yield AssignedEvent(time, m, p)
+
+    time = 0
+    games = 0
+    yield from start_games(strategy(machines, players, scores, r, queue), time)
+    for m in machines:
+        if m.ready and scores.is_needed(m):
+            yield IdleEvent(time, m, None)
+    for p in players:
+        if p.ready and not scores.is_player_finished(p):
+            yield IdleEvent(time, None, p)
+    while pending and not is_everyone_finished(machines, players, scores):
+        if max_games is not None and games >= max_games:
+            break
+        while next_status is not None and next_status < pending[0][0]:
+            yield StatusEvent(next_status, games, tuple(
+                (m, p, start) for _, _, m, p, start in pending))
+            next_status += status_interval
+        time, _, m, p, start = heapq.heappop(pending)
+        games += 1
+        yield FinishedEvent(time, m, p, start)
+        yield from start_games(player_finished_machine(
+            m, p, machines, players, scores, r, queue, strategy), time)
+        idle_machine = m if m.ready and scores.is_needed(m) else None
+        idle_player = (p if p.ready and not scores.is_player_finished(p)
+                       else None)
+        if idle_machine is not None or idle_player is not None:
+            yield IdleEvent(time, idle_machine, idle_player)
+    yield DoneEvent(time, is_everyone_finished(machines, players, scores))
+
+
+class TraceSink:
+    """Collects the finished games and the finish times of the players."""
+
+    def __init__(self, players=()):
+        self.trace = []
+        self.finish_times = {p.name: 0 for p in players}
+        self.makespan = 0
+        self.finished = False
+
+    def handle(self, event):
+        if type(event) is FinishedEvent:
+            self.trace.append(Assignment(
+                event.machine.name, event.player.name, event.start,
+                event.time))
+            self.finish_times[event.player.name] = event.time
+        elif type(event) is DoneEvent:
+            self.makespan = event.time
+            self.finished = event.finished
+
+    def close(self):
+        pass
+
+
+class AggregateSink:
+    """Sums up a simulation without keeping its events.
+
+    Keeps the number of events of each kind, the number of games and the
+    makespan, the number of games played on every machine, and for every
+    machine and player the time spent playing and the time left idle. Idle
+    time runs from an IdleEvent until the machine or player is assigned
+    again, or until the end of the simulation.
+    """
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.games = 0
+        self.makespan = 0
+        self.finished = False
+        self.machine_games = collections.Counter()
+        self.busy_time = collections.Counter()
+        self.idle_time = collections.Counter()
+        self._idle_since = {}
+
+    def handle(self, event):
+        kind = type(event)
+        self.counts[EVENT_KINDS[kind]] += 1
+        if kind is AssignedEvent:
+            for item in (event.machine, event.player):
+                since = self._idle_since.pop(item, None)
+                if since is not None:
+                    self.idle_time[str(item)] += event.time - since
+        elif kind is FinishedEvent:
+            self.games += 1
+            self.machine_games[event.machine.name] += 1
+            duration = event.time - event.start
+            self.busy_time[str(event.machine)] += duration
+            self.busy_time[str(event.player)] += duration
+        elif kind is IdleEvent:
+            for item in (event.machine, event.player):
+                if item is not None:
+                    self._idle_since[item] = event.time
+        elif kind is DoneEvent:
+            self.makespan = event.time
+            self.finished = event.finished
+            for item, since in self._idle_since.items():
+                self.idle_time[str(item)] += event.time - since
+            self._idle_since.clear()
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Writes every event as a line of JSON.
+
+    Machines and players are written by name. The file is written through a
+    buffer of the given size, and is closed by close() if it was opened by
+    the sink.
+    """
+
+    def __init__(self, file, buffer_size=1 << 16):
+        self._owned = isinstance(file, str)
+        if self._owned:
+            file = open(file, 'w', buffering=buffer_size)
+        self.file = file
+
+    def handle(self, event):
+        row = {'event': EVENT_KINDS[type(event)]}
+        for field, value in zip(event._fields, event):
+            if field == 'in_progress':
+                value = [[m.name, p.name, start] for m, p, start in value]
+            elif isinstance(value, (Machine, Player)):
+                value = value.name
+            row[field] = value
+        self.file.write(json.dumps(row))
+        self.file.write('\n')
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class PrintSink:
+    """Prints the progress of a simulation in a human readable form."""
+
+    def __init__(self, file=None):
+        self.file = sys.stdout if file is None else file
+
+    def handle(self, event):
+        kind = type(event)
+        if kind is AssignedEvent:
+            self._print('{} assigned to {} at {}'.format(
+                event.player, event.machine, event.time))
+        elif kind is FinishedEvent:
+            self._print('{} finished {} at {} (started at {})'.format(
+                event.player, event.machine, event.time, event.start))
+        elif kind is IdleEvent:
+            for item in (event.machine, event.player):
+                if item is not None:
+                    self._print('{} is idle at {}'.format(item, event.time))
+        elif kind is StatusEvent:
+            self._print('Status at {}:'.format(event.time))
+            self._print('  Finished games: {}'.format(event.games))
+            self._print('  Current pairings:')
+            for m, p, start in event.in_progress:
+                self._print('  - {} is playing {} (started at {})'.format(
+                    p, m, start))
+        elif kind is DoneEvent:
+            self._print('{} at {}'.format(
+                'Everyone finished' if event.finished else 'Stopped',
+                event.time))
+
+    def _print(self, line):
+        print(line, file=self.file)
+
+    def close(self):
+        self.file.flush()
+
+
+def consume(events, sinks):
+    """Feeds every event to every sink, then closes the sinks."""
+    sinks = list(sinks)
+    try:
+        for event in events:
+            for sink in sinks:
+                sink.handle(event)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+
+def simulate(machines=None, players=None, r=None, duration=expected_duration,
+             sinks=(), strategy=assign_players, scores=None, busy=(),
+             max_games=None, status_interval=None, quota=None):
+    """Simulates a tournament until every player has played every machine.
+
+    Runs events() to the end, feeding every event to the given sinks, and
+    returns the makespan, the finish time of every player and the trace of
+    finished games. See events() for the arguments.
+    """
+    players = default_players() if players is None else players
+    trace = TraceSink(players)
+    consume(events(machines, players, r, duration, strategy, scores, busy,
+                   max_games, status_interval, quota),
+            [trace] + list(sinks))
+    return SimulationResult(
+        trace.makespan, trace.finish_times, trace.trace, trace.finished)
+
+
+def run_simulation(argv=None):
+    from .montecarlo import parse_machine_spec
+    parser = argparse.ArgumentParser(
+        description='Simulate a single tournament and stream its events.')
+    parser.add_argument('-m', '--machine', dest='machines', action='append',
+                        type=parse_machine_spec, required=True,
+                        help='A machine as NAME=EXPECTEDTIME (repeatable)')
+    parser.add_argument('-p', '--players', type=int, required=True,
+                        help='Number of players')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='Seed for the simulation')
+    parser.add_argument('-S', '--strategy', choices=sorted(STRATEGIES),
+                        default='greedy', help='Assignment strategy')
+    parser.add_argument('-k', '--quota', type=int, metavar='K',
+                        help='Every player only plays K of the machines')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='Write every event to FILE as JSON lines')
+    parser.add_argument('--print', dest='print_events', action='store_true',
+                        help='Print every event')
+    parser.add_argument('--status', type=float, metavar='INTERVAL',
+                        help='Report the games in progress every INTERVAL '
+                             'time units')
+    args = parser.parse_args(argv)
+    machines = [Machine(name, t) for name, t in args.machines]
+    players = [Player(str(i + 1)) for i in range(args.players)]
+    summary = AggregateSink()
+    sinks = [summary]
+    if args.output:
+        sinks.append(JsonLinesSink(args.output))
+    if args.print_events:
+        sinks.append(PrintSink())
+    consume(events(machines, players, random.Random(args.seed),
+                   strategy=STRATEGIES[args.strategy],
+                   status_interval=args.status, quota=args.quota),
+            sinks)
+    print('Makespan: {:.1f}, {} games, {} idle events'.format(
+        summary.makespan, summary.games, summary.counts['idle']))
+    idle = [summary.idle_time[str(m)] for m in machines]
+    print('Machine idle time: mean {:.1f}, max {:.1f}'.format(
+        sum(idle) / len(idle), max(idle)))
+    if args.quota is not None:
+        plays = [summary.machine_games[m.name] for m in machines]
+        print('Games per machine: min {}, max {}'.format(
+            min(plays), max(plays)))
+
+if __name__ == '__main__':
+    run_simulation()
@@ -0,0 +1,228 @@
+import collections
+import functools
+import threading
+
+from . import forecast
+from .game import Game
+
+MachineState = collections.namedtuple(
+    'MachineState', ['name', 'title', 'expected_time', 'ready'])
+
+PlayerState = collections.namedtuple(
+    'PlayerState', ['name', 'expected_time_spent', 'ready'])
+
+GameView = collections.namedtuple(
+    'GameView', ['seq', 'running', 'strategy', 'machines', 'players',
+                 'scores', 'assignments', 'finished'])
+
+# Methods that change the game, or read more of it than the view holds.
+LOCKED_METHODS = [
+    'add_machine', 'add_machines', 'remove_machine',
+    'add_player', 'add_players', 'remove_player',
+    'add_score', 'add_scores', 'remove_score',
+    'start', 'forecast', 'reset_scores', 'assign',
+    'set_machine_ready', 'set_player_ready', 'set_strategy', 'set_quota',
+    'set_journal', 'snapshot',
+]
+
+# Changes that only touch the machines and players they name. Anything else
+# makes the view be built again from the whole game.
+_INCREMENTAL = frozenset([
+    'add_player', 'add_players', 'remove_player', 'add_score', 'add_scores',
+    'assignment', 'set_machine_ready', 'set_player_ready', 'assign',
+    'set_strategy',
+])
+
+
+def _locked(name):
+    @functools.wraps(getattr(Game, name))
+    def method(self, *args, **kwargs):
+        with self._lock:
+            self._depth += 1
+            try:
+                # Looked up on every call, so that instrumentation still
+                # sees the calls when it is enabled later on.
+                return getattr(Game, name)(self, *args, **kwargs)
+            except Exception:
+                # The call may have changed the game before failing.
+                self._view_seq = None
+                raise
+            finally:
+                self._depth -= 1
+                if not self._depth and self._view_seq != self._feed.seq:
+                    self._publish()
+    return method
+
+
+class LockedFeed:
+    """The change feed of a game, read under the game's lock.
+
+    Changes are published while the lock is held, so since() never sees
+    the buffer in the middle of a change.
+    """
+
+    def __init__(self, feed, lock):
+        self._feed = feed
+        self._lock = lock
+
+    @property
+    def seq(self):
+        return self._feed.seq
+
+    def since(self, seq):
+        with self._lock:
+            return self._feed.since(seq)
+
+
+class ThreadSafeGame(Game):
+    """A game that can be shared by several threads.
+
+    Every call that changes the game holds a lock for its whole duration, so
+    scorekeepers at different stations can register scores and fix ready
+    states at the same time without two of them being given the same
+    machine or player. Assignments are always returned as lists, computed
+    before the lock is released.
+
+    Reads should go through view(), which returns an immutable snapshot of
+    the game published after the latest change. It never waits for the
+    lock. The machines, players and scores properties give the live objects
+    and are only safe to use while no other thread changes the game. The
+    feed takes the lock to read its changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.RLock()
+        self._view = None
+        self._view_seq = None
+        self._depth = 0
+        super().__init__(*args, **kwargs)
+        self._publish()
+
+    @classmethod
+    def from_snapshot(cls, *args, **kwargs):
+        game = super().from_snapshot(*args, **kwargs)
+        game._view_seq = None
+        game._publish()
+        return game
+
+    @property
+    def lock(self):
+        """The lock held by every change, for reading several live objects."""
+        return self._lock
+
+    @property
+    def feed(self):
+        return LockedFeed(self._feed, self._lock)
+
+    def view(self):
+        """Returns the latest published GameView.
+
+        machines and players map names to MachineState and PlayerState
+        tuples, scores is the number of scores, and assignments maps the name
+        of every machine being played to the name of the player it was last
+        given, in the order the games were started. finished is None until
+        the game is started. The dicts belong to the view and must not be
+        changed.
+        """
+        return self._view
+
+    def is_finished(self):
+        if not self._view.running:
+            self._fail_if_not_running()
+        return self._view.finished
+
+    def _publish(self):
+        changes = (None if self._view_seq is None
+                   else self._feed.since(self._view_seq))
+        if (changes is None or self._estimator is not None or
+                any(c.op not in _INCREMENTAL for c in changes)):
+            self._rebuild()
+        else:
+            for change in changes:
+                self._apply(change)
+        self._view_seq = self._feed.seq
+        running = self._is_running
+        self._view = GameView(
+            self._view_seq, running, self._strategy,
+            dict(self._machine_rows), dict(self._player_rows),
+            len(self._scores), dict(self._playing),
+            super().is_finished() if running else None)
+
+    def _rebuild(self):
+        self._machine_rows = {}
+        for m in self._machines:
+            self._update_machine(m.name)
+        self._player_rows = {}
+        for p in self._players:
+            self._update_player(p.name)
+        self._rebuild_assignments()
+
+    def _rebuild_assignments(self):
+        self._playing = {}
+        self._playing_players = {}
+        started = sorted(forecast.current_games(self, 0),
+                         key=lambda g: self._started[g[0].id, g[1].id])
+        for m, p, _ in started:
+            self._play(m.name, p.name)
+
+    def _apply(self, change):
+        op, args = change.op, change.args
+        if op in ('add_player', 'remove_player'):
+            self._update_player(args[0])
+        elif op == 'add_players':
+            for name in args[0]:
+                self._update_player(name)
+        elif op in ('add_score', 'add_scores'):
+            pairs = [args] if op == 'add_score' else args[0]
+            for machine_name, player_name in pairs:
+                self._update_machine(machine_name)
+                self._update_player(player_name)
+                self._release(machine_name, player_name)
+        elif op == 'assignment':
+            machine_name, player_name = args
+            self._update_machine(machine_name)
+            self._update_player(player_name)
+            self._play(machine_name, player_name)
+        elif op == 'set_machine_ready':
+            self._update_machine(args[0])
+            self._rebuild_assignments()
+        elif op == 'set_player_ready':
+            self._update_player(args[0])
+            self._rebuild_assignments()
+        if op == 'remove_player':
+            self._rebuild_assignments()
+
+    def _play(self, machine_name, player_name):
+        self._release(machine_name, player_name)
+        self._playing[machine_name] = player_name
+        self._playing_players[player_name] = machine_name
+
+    def _release(self, machine_name, player_name):
+        """Drops the games of a machine and a player that are now free."""
+        player = self._playing.pop(machine_name, None)
+        if player is not None:
+            del self._playing_players[player]
+        machine = self._playing_players.pop(player_name, None)
+        if machine is not None:
+            del self._playing[machine]
+
+    def _update_machine(self, name):
+        m = self._get_machine(name)
+        if m is None:
+            self._machine_rows.pop(name, None)
+        else:
+            self._machine_rows[name] = MachineState(
+                m.name, m.title, m.expected_time, m.ready)
+
+    def _update_player(self, name):
+        p = self._get_player(name)
+        if p is None:
+            self._player_rows.pop(name, None)
+        else:
+            self._player_rows[name] = PlayerState(
+                p.name, p.expected_time_spent, p.ready)
+
+
+for _name in LOCKED_METHODS:
+    setattr(ThreadSafeGame, _name, _locked(_name))
+del _name
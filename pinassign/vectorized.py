@@ -0,0 +1,189 @@
+import argparse
+import collections
+import math
+import random
+
+import numpy as np
+
+from . import montecarlo
+from .core import Machine, Player
+from .simulation import simulate
+
+VectorizedResult = collections.namedtuple(
+    'VectorizedResult', ['makespans', 'finish_times'])
+
+Comparison = collections.namedtuple(
+    'Comparison', ['reference', 'vectorized', 'makespan_test',
+                   'first_player_test'])
+
+
+def simulate_batch(expected_times, player_count, runs, seed=0):
+    """Simulates many tournaments at once with array operations.
+
+    The state of every tournament is held in arrays with the run as the first
+    axis: the played matrix (runs, machines, players), the expected time spent
+    (runs, players) and the time each machine is busy until (runs, machines).
+    Every step finishes the next game of each unfinished run and then walks
+    the machines in order, giving each ready machine a random player among
+    the ready players with the lowest expected time spent who have not played
+    it. This is the same rule as core.assign_players, applied to all runs in
+    the batch at the same time.
+    """
+    times = np.asarray(expected_times, dtype=float)
+    machine_count = len(times)
+    rng = np.random.default_rng(seed)
+    rows = np.arange(runs)
+    played = np.zeros((runs, machine_count, player_count), dtype=bool)
+    ets = np.zeros((runs, player_count))
+    busy_until = np.full((runs, machine_count), np.inf)
+    started = np.zeros((runs, machine_count), dtype=np.int64)
+    playing = np.full((runs, machine_count), -1, dtype=np.int64)
+    machine_ready = np.ones((runs, machine_count), dtype=bool)
+    player_ready = np.ones((runs, player_count), dtype=bool)
+    clock = np.zeros(runs)
+    finish_times = np.zeros((runs, player_count))
+    counter = 0
+
+    def assign(active):
+        nonlocal counter
+        for m in range(machine_count):
+            open_runs = active & machine_ready[:, m]
+            if not open_runs.any():
+                continue
+            candidates = player_ready & ~played[:, m, :]
+            candidates &= open_runs[:, None]
+            keyed = np.where(candidates, ets, np.inf)
+            lowest = keyed.min(axis=1)
+            ties = candidates & (keyed == lowest[:, None])
+            found = ties.any(axis=1)
+            if not found.any():
+                continue
+            noise = np.where(ties, rng.random(ties.shape), -1.0)
+            chosen = noise.argmax(axis=1)
+            hit = rows[found]
+            p = chosen[found]
+            machine_ready[hit, m] = False
+            player_ready[hit, p] = False
+            playing[hit, m] = p
+            busy_until[hit, m] = clock[hit] + times[m]
+            started[hit, m] = counter
+            counter += 1
+
+    done = np.zeros(runs, dtype=bool) if machine_count and player_count \
+        else np.ones(runs, dtype=bool)
+    assign(~done)
+    while not done.all():
+        next_time = busy_until.min(axis=1)
+        stuck = ~done & np.isinf(next_time)
+        done |= stuck
+        active = ~done
+        if not active.any():
+            break
+        first = np.where(busy_until == next_time[:, None], started,
+                         np.iinfo(np.int64).max).argmin(axis=1)
+        hit = rows[active]
+        m = first[active]
+        p = playing[hit, m]
+        clock[hit] = next_time[hit]
+        played[hit, m, p] = True
+        ets[hit, p] += times[m]
+        finish_times[hit, p] = clock[hit]
+        machine_ready[hit, m] = True
+        player_ready[hit, p] = True
+        playing[hit, m] = -1
+        busy_until[hit, m] = np.inf
+        done |= played.reshape(runs, -1).all(axis=1)
+        assign(~done)
+    return VectorizedResult(clock, finish_times)
+
+
+def ks_2samp(a, b):
+    a = np.sort(np.asarray(a, dtype=float))
+    b = np.sort(np.asarray(b, dtype=float))
+    values = np.concatenate([a, b])
+    cdf_a = np.searchsorted(a, values, side='right') / len(a)
+    cdf_b = np.searchsorted(b, values, side='right') / len(b)
+    statistic = float(np.abs(cdf_a - cdf_b).max())
+    n = len(a) * len(b) / (len(a) + len(b))
+    lam = (math.sqrt(n) + 0.12 + 0.11 / math.sqrt(n)) * statistic
+    if lam == 0:
+        return statistic, 1.0
+    p_value = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * lam * lam)
+                      for k in range(1, 101))
+    return statistic, min(max(p_value, 0.0), 1.0)
+
+
+def reference_batch(machine_specs, player_count, runs, seed=0):
+    makespans = np.zeros(runs)
+    finish_times = np.zeros((runs, player_count))
+    for i, run_seed in enumerate(montecarlo.run_seeds(seed, runs)):
+        machines = [Machine(name, t) for name, t in machine_specs]
+        players = [Player(str(j + 1)) for j in range(player_count)]
+        result = simulate(machines, players, random.Random(run_seed))
+        makespans[i] = result.makespan
+        finish_times[i] = [result.finish_times[p.name] for p in players]
+    return VectorizedResult(makespans, finish_times)
+
+
+def compare_with_reference(machine_specs, player_count, runs, seed=0):
+    """Compares the vectorized mode with the reference implementation.
+
+    Both implementations simulate the same configuration the given number of
+    times. Players start out identical, so the random tie-breaking only
+    decides which player ends up with which schedule; the makespan is often
+    the same in every run. The finish time of the first player is compared as
+    well to check that ties are broken uniformly. Both samples are compared
+    with a two-sample Kolmogorov-Smirnov test, and a small p-value means the
+    vectorized mode does not follow the same rule as core.assign_players.
+    """
+    machine_specs = list(machine_specs)
+    reference = reference_batch(machine_specs, player_count, runs, seed)
+    vectorized = simulate_batch([t for _, t in machine_specs], player_count,
+                                runs, seed)
+    return Comparison(
+        reference,
+        vectorized,
+        ks_2samp(reference.makespans, vectorized.makespans),
+        ks_2samp(reference.finish_times[:, 0],
+                 vectorized.finish_times[:, 0]))
+
+
+def run_vectorized(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Simulate many tournaments at once with NumPy.')
+    parser.add_argument('-m', '--machine', dest='machines', action='append',
+                        type=montecarlo.parse_machine_spec, required=True,
+                        help='A machine as NAME=EXPECTEDTIME (repeatable)')
+    parser.add_argument('-p', '--players', type=int, required=True,
+                        help='Number of players')
+    parser.add_argument('-n', '--runs', type=int, default=1000,
+                        help='Number of simulated tournaments')
+    parser.add_argument('-s', '--seed', type=int, default=0,
+                        help='Seed for the simulated tournaments')
+    parser.add_argument('--check', action='store_true',
+                        help='Compare the outcome distribution with the '
+                             'reference implementation')
+    args = parser.parse_args(argv)
+    if args.check:
+        comparison = compare_with_reference(
+            args.machines, args.players, args.runs, args.seed)
+        for label, result in (('Reference', comparison.reference),
+                              ('Vectorized', comparison.vectorized)):
+            print('{} mean makespan: {:.2f}, first player: {:.2f}'.format(
+                label, result.makespans.mean(),
+                result.finish_times[:, 0].mean()))
+        print('Makespan KS statistic: {:.4f} (p = {:.4f})'.format(
+            *comparison.makespan_test))
+        print('First player KS statistic: {:.4f} (p = {:.4f})'.format(
+            *comparison.first_player_test))
+        return
+    result = simulate_batch([t for _, t in args.machines], args.players,
+                            args.runs, args.seed)
+    makespans = np.sort(result.makespans)
+    print('Runs: {}'.format(args.runs))
+    print('Mean makespan: {:.2f}'.format(makespans.mean()))
+    for q in montecarlo.DEFAULT_PERCENTILES:
+        print('p{}: {:.2f}'.format(q, montecarlo.percentile(makespans, q)))
+
+if __name__ == '__main__':
+    run_vectorized()
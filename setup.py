@@ -33,5 +33,6 @@ setup(name='pinassign',
       license='MIT',
       packages=['pinassign'],
       install_requires=['tabulate>=0.7.5', 'while>=0.24.0'],
+      extras_require={'vectorized': ['numpy>=1.17']},
       zip_safe=False
 )
\ No newline at end of file
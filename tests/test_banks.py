@@ -0,0 +1,60 @@
+import json
+import random
+
+import pytest
+
+from pinassign import bulk
+from pinassign.estimation import TimeEstimator
+from pinassign.flights import Flights
+from pinassign.game import Game, UnknownMachineError
+
+
+def test_copies_share_one_estimate():
+    now = [0.0]
+    game = Game(random.Random(0), estimator=TimeEstimator(alpha=0.5),
+                clock=lambda: now[0])
+    game.add_machine('Xenon', 10, copies=2)
+    game.add_players(['A', 'B', 'C'])
+    playing = list(game.start())
+    now[0] = 4
+    for m, p in playing:
+        game.add_score(m.name, p.name)
+    times = {m.name: game.estimator.machine_time(m) for m in game.machines}
+    assert times == {'Xenon #1': 5.5, 'Xenon #2': 5.5}
+
+
+@pytest.mark.parametrize('filename, content', [
+    ('machines.csv', 'name,expected_time,copies\nXenon,10,2\nFirepower,6\n'),
+    ('machines.json', json.dumps([
+        {'name': 'Xenon', 'expected_time': 10, 'copies': 2},
+        ['Firepower', 6]])),
+])
+def test_load_machines_with_copies(tmp_path, filename, content):
+    path = tmp_path / filename
+    path.write_text(content)
+    assert bulk.load_machines(str(path)) == [('Xenon', 10, 2),
+                                             ('Firepower', 6)]
+
+
+def test_load_machines_rejects_invalid_copies(tmp_path):
+    path = tmp_path / 'machines.csv'
+    path.write_text('Xenon,10,none\n')
+    with pytest.raises(bulk.LoadError):
+        bulk.load_machines(str(path))
+
+
+def test_flights_route_banks_by_title_and_copy():
+    flights = Flights(random.Random(0))
+    flights.add_flight('A')
+    flights.add_machine('A', 'Xenon', 10, copies=2)
+    flights.add_player('A', 'MGB')
+    assert flights.flight_of_machine('Xenon') == 'A'
+    assert flights.flight_of_machine('Xenon #2') == 'A'
+    flights.start()
+    flights.add_score('Xenon', 'MGB')
+    assert flights.is_finished()
+    flights.flights['A'].reset_scores()
+    flights.remove_machine('Xenon')
+    for name in ('Xenon', 'Xenon #1', 'Xenon #2'):
+        with pytest.raises(UnknownMachineError):
+            flights.flight_of_machine(name)
@@ -0,0 +1,12 @@
+import random
+
+import pytest
+
+from pinassign import durations
+
+
+@pytest.mark.parametrize('fit', [durations.fit_gamma,
+                                 durations.fit_lognormal])
+def test_identical_durations_give_fixed_times(fit):
+    distribution = fit([6.0, 6.0, 6.0])
+    assert distribution.sample(10, 3, random.Random(0)) == [6.0, 6.0, 6.0]
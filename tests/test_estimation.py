@@ -0,0 +1,50 @@
+import random
+
+from pinassign.estimation import TimeEstimator
+from pinassign.game import Game
+
+
+def play_adaptive_game(seed, strategy='greedy', player_alpha=None):
+    r = random.Random(seed)
+    now = [0.0]
+    game = Game(random.Random(seed), strategy=strategy, clock=lambda: now[0],
+                estimator=TimeEstimator(0.3, player_alpha))
+    game.add_machines([('M{}'.format(i), r.randint(2, 12))
+                       for i in range(6)])
+    game.add_players(['P{}'.format(i) for i in range(12)])
+    playing = list(game.start())
+    while playing:
+        m, p = playing.pop(r.randrange(len(playing)))
+        now[0] += r.uniform(0.5, 4)
+        playing += game.add_score(m.name, p.name)
+    return game
+
+
+def test_players_who_played_the_same_machines_spent_the_same_time():
+    for seed in range(5):
+        game = play_adaptive_game(seed)
+        assert len({p.expected_time_spent for p in game.players}) == 1
+
+
+def test_restored_game_makes_the_same_next_assignments():
+    for seed in range(10):
+        r = random.Random(seed)
+        now = [0.0]
+        game = Game(random.Random(seed), strategy='remaining',
+                    clock=lambda: now[0],
+                    estimator=TimeEstimator(0.3, player_alpha=0.3))
+        game.add_machines([('M{}'.format(i), r.randint(2, 12))
+                           for i in range(6)])
+        game.add_players(['P{}'.format(i) for i in range(12)])
+        playing = list(game.start())
+        while playing:
+            m, p = playing.pop(r.randrange(len(playing)))
+            now[0] += r.uniform(0.5, 4)
+            restored = Game.from_snapshot(game.snapshot(),
+                                          clock=lambda: now[0])
+            assigned = list(game.add_score(m.name, p.name))
+            assert ([(a.name, b.name) for a, b in assigned] ==
+                    [(a.name, b.name)
+                     for a, b in restored.add_score(m.name, p.name)])
+            playing += assigned
+        assert all(game.scores.remaining_work(p) == 0 for p in game.players)
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from pinassign import core
+from pinassign.game import Game
+
+
+def new_game(strategy, player_count=300, machine_count=40, scored=500):
+    r = random.Random(1)
+    now = [0.0]
+    game = Game(random.Random(1), strategy=strategy, clock=lambda: now[0])
+    game.add_machines([('M{}'.format(i), r.randint(2, 12))
+                       for i in range(machine_count)])
+    game.add_players(['P{}'.format(i) for i in range(player_count)])
+    playing = list(game.start())
+    for _ in range(scored):
+        m, p = playing.pop(0)
+        now[0] += 0.1
+        playing += game.add_score(m.name, p.name)
+    return game
+
+
+def test_matching_is_not_solved_at_every_projected_step(monkeypatch):
+    calls = []
+    matching = core.STRATEGIES['matching']
+
+    def counted(*args, **kwargs):
+        calls.append(None)
+        return matching(*args, **kwargs)
+    monkeypatch.setitem(core.STRATEGIES, 'matching', counted)
+    game = new_game('matching', 30, 6, 20)
+    del calls[:]
+    game.forecast(horizon=None)
+    assert not calls
+
+
+@pytest.mark.parametrize('strategy', ['greedy', 'matching'])
+def test_forecast_of_large_game_simulates_only_the_horizon(
+        monkeypatch, strategy):
+    assigned = []
+    greedy = core.STRATEGIES['greedy']
+
+    def counted(*args, **kwargs):
+        for pair in greedy(*args, **kwargs):
+            assigned.append(pair)
+            yield pair
+    monkeypatch.setitem(core.STRATEGIES, 'greedy', counted)
+    game = new_game(strategy)
+    del assigned[:]
+    result = game.forecast(horizon=100)
+    assert not result.exact
+    assert 0 < len(assigned) <= 100
+    assert result.remaining_games == 300 * 40 - 500 - result.in_progress
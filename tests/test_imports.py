@@ -0,0 +1,8 @@
+import subprocess
+import sys
+
+
+def test_cli_does_not_import_numpy():
+    code = 'import sys, pinassign.cli; print("numpy" in sys.modules)'
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.strip() == b'False'
@@ -0,0 +1,56 @@
+import heapq
+import random
+
+import pytest
+
+from pinassign import core
+
+
+def new_state(seed, quota, track):
+    r = random.Random(seed)
+    machines = []
+    for i in range(r.randint(3, 8)):
+        title = 'T{}'.format(i // 2) if r.random() < 0.3 else None
+        machines.append(core.Machine('M{}'.format(i), r.randint(2, 12),
+                                     title=title))
+    players = [core.Player('P{}'.format(i))
+               for i in range(r.randint(2, 20))]
+    scores = core.ScoreIndex(machines, players, quota)
+    queue = core.PlayerQueue(players)
+    if track:
+        queue.track_machines(machines)
+    return machines, players, scores, queue, random.Random(seed)
+
+
+def pairs(assignments):
+    return [(m.id, p.id) for m, p in assignments]
+
+
+@pytest.mark.parametrize('strategy', ['greedy', 'remaining'])
+@pytest.mark.parametrize('quota', [None, 2])
+def test_dirty_machines_give_the_same_assignments_as_a_full_pass(
+        strategy, quota):
+    assign = core.STRATEGIES[strategy]
+    for seed in range(30):
+        tracked = new_state(seed, quota, True)
+        full = new_state(seed, quota, False)
+        assert not full[3].tracks_machines
+        durations = random.Random(seed)
+        steps = [pairs(assign(*state[:3], state[4], state[3]))
+                 for state in (tracked, full)]
+        pending = []
+        now = 0
+        while True:
+            assert steps[0] == steps[1]
+            for machine_id, player_id in steps[0]:
+                end = now + durations.randint(1, 20)
+                heapq.heappush(pending, (end, machine_id, player_id))
+            if not pending:
+                break
+            now, machine_id, player_id = heapq.heappop(pending)
+            steps = []
+            for machines, players, scores, queue, r in (tracked, full):
+                steps.append(pairs(core.player_finished_machine(
+                    machines[machine_id], players[player_id], machines,
+                    players, scores, r, queue, assign)))
+        assert tracked[2].is_complete()
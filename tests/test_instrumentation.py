@@ -0,0 +1,23 @@
+import random
+
+from pinassign import instrumentation
+from pinassign.game import Game
+
+
+def test_every_instrumented_core_function_is_called_by_a_game():
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        game = Game(random.Random(0))
+        game.add_machines([('Firepower', 5), ('Xenon', 7)])
+        game.add_players(['A', 'B', 'C'])
+        playing = list(game.start())
+        while playing:
+            m, p = playing.pop(0)
+            playing += game.add_score(m.name, p.name)
+    finally:
+        instrumentation.disable()
+    called = instrumentation.snapshot()
+    instrumentation.reset()
+    for name in instrumentation.CORE_FUNCTIONS:
+        assert 'core.' + name in called
@@ -0,0 +1,51 @@
+import random
+import shutil
+
+from pinassign import journal
+from pinassign.estimation import TimeEstimator
+
+
+def copy_journal(path, copy):
+    shutil.copy(path, copy)
+    shutil.copy(path + journal.SNAPSHOT_SUFFIX,
+                copy + journal.SNAPSHOT_SUFFIX)
+
+
+def pairs(assignments):
+    return [(m.name, p.name) for m, p in assignments]
+
+
+def test_recovered_game_continues_like_the_uninterrupted_one(tmp_path):
+    path = str(tmp_path / 'game.journal')
+    crashed = str(tmp_path / 'crashed.journal')
+    now = [0.0]
+    game = journal.open_game(path, random.Random(0), sync_every=3,
+                             snapshot_every=7,
+                             estimator=TimeEstimator(player_alpha=0.3))
+    game.clock = lambda: now[0]
+    game.add_machines([('M{}'.format(i), 4 + i) for i in range(4)])
+    game.add_players(['P{}'.format(i) for i in range(6)])
+    durations = random.Random(1)
+    playing = pairs(game.start())
+    for _ in range(10):
+        now[0] += durations.uniform(1, 5)
+        playing += pairs(game.add_score(*playing.pop(0)))
+    copy_journal(path, crashed)
+    with open(crashed, 'a') as f:
+        f.write('{"seq": 99, "op": "add_sc')
+    snapshot, entries = journal.load(crashed)
+    assert snapshot is not None and entries
+
+    recovered = journal.open_game(crashed)
+    recovered.clock = lambda: now[0]
+    assert recovered.snapshot() == game.snapshot()
+    while playing:
+        now[0] += durations.uniform(1, 5)
+        score = playing.pop(0)
+        assigned = pairs(game.add_score(*score))
+        assert pairs(recovered.add_score(*score)) == assigned
+        playing += assigned
+    assert recovered.is_finished()
+    assert recovered.snapshot() == game.snapshot()
+    game.journal.close()
+    recovered.journal.close()
@@ -0,0 +1,61 @@
+import collections
+import random
+
+from pinassign import planner
+from pinassign.game import Game
+
+
+def new_game(quota=2, machine_count=4, player_count=6, seed=0):
+    game = Game(random.Random(seed), quota=quota)
+    game.add_machines([('M{}'.format(i), 5) for i in range(machine_count)])
+    game.add_players(['P{}'.format(i) for i in range(player_count)])
+    return game
+
+
+def play(game, playing):
+    scored = []
+    while playing:
+        m, p = playing.pop(0)
+        scored.append((m.name, p.name))
+        playing += game.add_score(m.name, p.name)
+    return scored
+
+
+def test_every_player_plays_the_quota():
+    game = new_game()
+    scored = play(game, list(game.start()))
+    assert game.is_finished()
+    assert len(scored) == 12
+    assert len(set(scored)) == 12
+    per_player = collections.Counter(p for _, p in scored)
+    assert set(per_player.values()) == {2}
+
+
+def test_scores_are_spread_over_the_machines():
+    game = new_game(quota=3, machine_count=5, player_count=7, seed=3)
+    scored = play(game, list(game.start()))
+    per_machine = collections.Counter(m for m, _ in scored)
+    assert len(per_machine) == 5
+    assert max(per_machine.values()) - min(per_machine.values()) <= 1
+
+
+def test_snapshot_keeps_the_quota():
+    game = new_game()
+    playing = list(game.start())
+    for _ in range(3):
+        m, p = playing.pop(0)
+        playing += game.add_score(m.name, p.name)
+    restored = Game.from_snapshot(game.snapshot())
+    assert restored.quota == 2
+    assert play(restored, list(playing)) == play(game, list(playing))
+    assert restored.is_finished()
+
+
+def test_plan_plays_only_the_quota():
+    result = planner.plan_game(new_game(player_count=3), seconds=0.1)
+    assert len(result.assignments) == 6
+    per_player = collections.Counter(a.player for a in result.assignments)
+    assert set(per_player.values()) == {2}
+    per_machine = collections.Counter(a.machine for a in result.assignments)
+    assert max(per_machine.values()) - min(per_machine.values()) <= 1
+    assert result.makespan == result.lower_bound == 10
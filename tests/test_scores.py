@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from pinassign.estimation import TimeEstimator
+from pinassign.game import DuplicateScoreError, Game
+
+
+@pytest.fixture
+def game():
+    now = [0.0]
+    game = Game(random.Random(0), estimator=TimeEstimator(),
+                clock=lambda: now[0])
+    game.add_machines([('Firepower', 5), ('Xenon', 7)])
+    game.add_players(['A', 'B'])
+    game.start()
+    now[0] = 4
+    return game
+
+
+def state(game):
+    return (dict(game.started), [m.ready for m in game.machines],
+            [p.ready for p in game.players],
+            [p.expected_time_spent for p in game.players],
+            [m.expected_time for m in game.machines], len(game.scores))
+
+
+def test_duplicate_score_changes_nothing(game):
+    game.add_score('Firepower', 'A')
+    game.add_score('Xenon', 'B')
+    # A start time left behind for the pair must not be consumed either.
+    firepower, a = game.machines[0], game.players[0]
+    game.started[firepower.id, a.id] = 1
+    before = state(game)
+    with pytest.raises(DuplicateScoreError):
+        game.add_score('Firepower', 'A')
+    assert state(game) == before
+
+
+@pytest.mark.parametrize('batch', [
+    [('Xenon', 'B'), ('Firepower', 'A'), ('Xenon', 'B')],
+    [('Xenon', 'B'), ('Firepower', 'B')],
+])
+def test_batch_with_duplicate_changes_nothing(game, batch):
+    game.add_score('Firepower', 'B')
+    before = state(game)
+    with pytest.raises(DuplicateScoreError):
+        game.add_scores(batch)
+    assert state(game) == before
@@ -0,0 +1,90 @@
+import pytest
+
+from pinassign.server import GameServer, HttpError
+
+
+@pytest.fixture
+def server():
+    server = GameServer()
+    server.dispatch('PUT', '/games/g', {})
+    server.dispatch('POST', '/games/g/machines',
+                    {'name': 'Firepower', 'expected_time': 5})
+    server.dispatch('POST', '/games/g/players', {'name': 'MGB'})
+    return server
+
+
+def status_of(server, method, path, body):
+    with pytest.raises(HttpError) as info:
+        server.dispatch(method, path, body)
+    return info.value.status
+
+
+def test_removing_missing_score_is_not_found(server):
+    server.dispatch('POST', '/games/g/start', {})
+    assert status_of(server, 'DELETE', '/games/g/scores/Firepower/MGB',
+                     {}) == 404
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/games/g/players', {'name': 5}),
+    ('/games/g/machines', {'name': 5, 'expected_time': 5}),
+    ('/games/g/machines', {'name': ['Xenon'], 'expected_time': 5}),
+])
+def test_names_of_wrong_type_are_bad_requests(server, path, body):
+    assert status_of(server, 'POST', path, body) == 400
+
+
+@pytest.mark.parametrize('body', [
+    {'machine': ['Firepower'], 'player': 'MGB'},
+    {'machine': 'Firepower', 'player': 5},
+])
+def test_scores_of_wrong_type_are_bad_requests(server, body):
+    server.dispatch('POST', '/games/g/start', {})
+    assert status_of(server, 'POST', '/games/g/scores', body) == 400
+
+
+def test_unexpected_errors_are_internal_server_errors(server):
+    def fail(machine_name, player_name):
+        raise RuntimeError('broken')
+    server.games['g'].remove_score = fail
+    assert status_of(server, 'DELETE', '/games/g/scores/Firepower/MGB',
+                     {}) == 500
+
+
+def pairs(assignments):
+    return [(a['machine'], a['player']) for a in assignments]
+
+
+def test_interleaved_games_are_recovered_from_their_journals(tmp_path):
+    server = GameServer(str(tmp_path))
+    for name in ('x', 'y'):
+        server.dispatch('PUT', '/games/' + name, {})
+        for i in range(4):
+            server.dispatch('POST', '/games/{}/machines'.format(name),
+                            {'name': 'M{}'.format(i), 'expected_time': 5})
+        for i in range(8):
+            server.dispatch('POST', '/games/{}/players'.format(name),
+                            {'name': 'P{}'.format(i)})
+    playing = {name: server.dispatch('POST', '/games/{}/start'.format(name),
+                                     {})[1]['assignments']
+               for name in ('x', 'y')}
+    for _ in range(10):
+        for name in ('x', 'y'):
+            score = playing[name].pop(0)
+            playing[name] += server.dispatch(
+                'POST', '/games/{}/scores'.format(name),
+                score)[1]['assignments']
+    server.close()
+    for game in server.games.values():
+        game.set_journal(None)
+    recovered = GameServer(str(tmp_path))
+    for name in ('x', 'y'):
+        path = '/games/{}/assignments'.format(name)
+        assert (pairs(recovered.dispatch('GET', path, {})[1]) ==
+                pairs(server.dispatch('GET', path, {})[1]))
+        score = playing[name][0]
+        assert (recovered.dispatch('POST', '/games/{}/scores'.format(name),
+                                   score) ==
+                server.dispatch('POST', '/games/{}/scores'.format(name),
+                                score))
+    recovered.close()
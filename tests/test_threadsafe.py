@@ -0,0 +1,40 @@
+import random
+import sys
+import threading
+
+from pinassign.threadsafe import ThreadSafeGame
+
+
+def test_feed_can_be_read_while_scores_are_added():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    game = ThreadSafeGame(random.Random(0), feed_size=4096)
+    game.add_machines([('M{}'.format(i), 5) for i in range(20)])
+    game.add_players(['P{}'.format(i) for i in range(60)])
+    playing = list(game.start())
+    done = threading.Event()
+    errors = []
+
+    def read():
+        try:
+            while not done.is_set():
+                since = max(game.feed.seq - 5, 0)
+                changes = game.feed.since(since)
+                assert [c.seq for c in changes] == list(
+                    range(since + 1, since + len(changes) + 1))
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for t in readers:
+        t.start()
+    try:
+        while playing:
+            m, p = playing.pop(0)
+            playing += game.add_score(m.name, p.name)
+    finally:
+        done.set()
+        for t in readers:
+            t.join()
+        sys.setswitchinterval(interval)
+    assert not errors
@@ -0,0 +1,22 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pinassign import montecarlo, vectorized
+
+# A configuration where the makespan depends on how ties are broken.
+MACHINES = [('A', 13), ('B', 8), ('C', 13), ('D', 14), ('E', 8), ('F', 8),
+            ('G', 13)]
+PLAYERS = 9
+
+
+def test_vectorized_matches_event_simulation():
+    comparison = vectorized.compare_with_reference(MACHINES, PLAYERS, 300)
+    reference = sorted(comparison.reference.makespans.tolist())
+    batch = sorted(comparison.vectorized.makespans.tolist())
+    assert np.std(reference) > 0
+    assert np.mean(batch) == pytest.approx(np.mean(reference), rel=0.01)
+    assert montecarlo.percentile(batch, 95) == pytest.approx(
+        montecarlo.percentile(reference, 95), rel=0.02)
+    assert comparison.makespan_test[1] > 0.01
+    assert comparison.first_player_test[1] > 0.01